@@ -3,16 +3,20 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 ''' IMPORTS '''
+import codecs
 import csv
-import gzip
+import itertools
+import zlib
 import urllib3
-from typing import Optional, Pattern, Dict, Any, Tuple, Union, List
+from typing import Optional, Pattern, Dict, Any, Tuple, Union, List, Iterator
 
 # disable insecure warnings
 urllib3.disable_warnings()
 
 # Globals
 DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+CHUNK_SIZE = 1024 * 1024
+GZIP_WBITS = 16 + zlib.MAX_WBITS
 
 
 class Client(BaseClient):
@@ -186,7 +190,7 @@ class Client(BaseClient):
                 return_error('Exception in request: {} {}'.format(r.status_code, r.content))
                 raise
 
-            response = self.get_feed_content_divided_to_lines(url, r)
+            response = self.iter_feed_content_lines(url, r)
             if self.feed_url_to_config:
                 fieldnames = self.feed_url_to_config.get(url, {}).get('fieldnames', [])
                 skip_first_line = self.feed_url_to_config.get(url, {}).get('skip_first_line', False)
@@ -222,12 +226,51 @@ class Client(BaseClient):
         Returns:
             List. List of lines from the feed content.
         """
+        return list(self.iter_feed_content_lines(url, raw_response))
+
+    def iter_feed_content_lines(self, url, raw_response):
+        """Streams the feed data and divides its content to lines, without reading the whole content into memory
+
+        Args:
+            url: Current feed's url.
+            raw_response: The raw response from the feed's url.
+
+        Returns:
+            Iterator. The lines of the feed content, the same as splitting the decoded content by newlines.
+        """
+        chunks = raw_response.iter_content(chunk_size=CHUNK_SIZE)
         if self.feed_url_to_config and self.feed_url_to_config.get(url).get('is_zipped_file'):  # type: ignore
-            response_content = gzip.decompress(raw_response.content)
-        else:
-            response_content = raw_response.content
+            chunks = decompress_gzip_chunks(chunks)
+
+        decoder = codecs.getincrementaldecoder(self.encoding)()
+        pending_line = ''
+        for chunk in chunks:
+            lines = (pending_line + decoder.decode(chunk)).split('\n')
+            pending_line = lines.pop()
+            yield from lines
+
+        yield pending_line + decoder.decode(b'', final=True)
+
+
+def decompress_gzip_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """Decompresses a stream of gzip data chunk by chunk, supporting files made of several gzip members.
+
+    Args:
+        chunks: The compressed chunks.
 
-        return response_content.decode(self.encoding).split('\n')
+    Returns:
+        Iterator. The decompressed chunks.
+    """
+    decompressor = zlib.decompressobj(GZIP_WBITS)
+    for chunk in chunks:
+        while chunk:
+            yield decompressor.decompress(chunk)
+            if not decompressor.eof:
+                break
+            # the current gzip member has ended, the rest of the chunk belongs to the next one
+            chunk = decompressor.unused_data.lstrip(b'\x00')
+            decompressor = zlib.decompressobj(GZIP_WBITS)
+    yield decompressor.flush()
 
 
 def get_no_update_value(response: requests.models.Response, url: str) -> bool:
@@ -336,14 +379,34 @@ def create_fields_mapping(raw_json: Dict[str, Any], mapping: Dict[str, Union[Tup
 
 def fetch_indicators_command(client: Client, default_indicator_type: str, auto_detect: bool, limit: int = 0,
                              create_relationships: bool = False, **kwargs):
+    indicators, no_update = fetch_indicators_iterator(client, default_indicator_type, auto_detect,
+                                                      create_relationships, **kwargs)
+    if limit:
+        indicators = itertools.islice(indicators, limit)
+    return list(indicators), no_update
+
+
+def fetch_indicators_iterator(client: Client, default_indicator_type: str, auto_detect: bool,
+                              create_relationships: bool = False, **kwargs) -> Tuple[Iterator[dict], bool]:
+    """Sends the feed requests and returns a lazy iterator of the indicators, so the feed content is streamed
+    row by row instead of being held in memory.
+
+    Returns:
+        The indicators iterator and the noUpdate value.
+    """
     iterator = client.build_iterator(**kwargs)
-    relationships_of_indicator = []
-    indicators = []
-    config = client.feed_url_to_config or {}
 
     # set noUpdate flag in createIndicators command True only when all the results from all the urls are True.
     no_update = all([next(iter(item.values())).get('no_update', False) for item in iterator])
 
+    return iterate_indicators(client, iterator, default_indicator_type, auto_detect, create_relationships), no_update
+
+
+def iterate_indicators(client: Client, iterator: List[dict], default_indicator_type: str, auto_detect: bool,
+                       create_relationships: bool = False) -> Iterator[dict]:
+    relationships_of_indicator = []
+    config = client.feed_url_to_config or {}
+
     for url_to_reader in iterator:
         for url, reader in url_to_reader.items():
             mapping = config.get(url, {}).get('mapping', {})
@@ -384,12 +447,7 @@ def fetch_indicators_command(client: Client, default_indicator_type: str, auto_d
                     if client.tlp_color:
                         indicator['fields']['trafficlightprotocol'] = client.tlp_color
 
-                    indicators.append(indicator)
-                    # exit the loop if we have more indicators than the limit
-                    if limit and len(indicators) >= limit:
-                        return indicators, no_update
-
-    return indicators, no_update
+                    yield indicator
 
 
 def get_indicators_command(client, args: dict, tags: Optional[List[str]] = None):
@@ -425,17 +483,19 @@ def feed_main(feed_name, params=None, prefix=''):
     }
     try:
         if command == 'fetch-indicators':
-            indicators, no_update = fetch_indicators_command(
+            indicators, no_update = fetch_indicators_iterator(
                 client,
                 params.get('indicator_type'),
                 params.get('auto_detect_type'),
-                params.get('limit'),
                 params.get('create_relationships')
             )
+            limit = arg_to_number(params.get('limit'))
+            if limit:
+                indicators = itertools.islice(indicators, limit)
 
             # check if the version is higher than 6.5.0 so we can use noUpdate parameter
             if is_demisto_version_ge('6.5.0'):
-                # we submit the indicators in batches
+                # we submit the indicators in batches as they are parsed, so only one batch is held in memory
                 for b in batch(indicators, batch_size=2000):
                     demisto.createIndicators(b, noUpdate=no_update)  # type: ignore
             else:
@@ -441,3 +441,21 @@ def test_get_no_update_value_without_headers(mocker):
     assert not no_update
     assert demisto.debug.call_args[0][0] == 'Last-Modified and Etag headers are not exists,' \
                                             'createIndicators will be executed with noUpdate=False.'
+
+
+def test_decompress_gzip_chunks():
+    """
+    Given
+    - A gzip file made of two members, streamed in small chunks.
+
+    When
+    - Running decompress_gzip_chunks on the chunks.
+
+    Then
+    - Ensure the content of both members is decompressed.
+    """
+    import gzip
+    zipped = gzip.compress(b'1.1.1.1\n2.2.2.2\n') + gzip.compress(b'3.3.3.3\n')
+    chunks = (zipped[i:i + 7] for i in range(0, len(zipped), 7))
+
+    assert b''.join(decompress_gzip_chunks(chunks)) == b'1.1.1.1\n2.2.2.2\n3.3.3.3\n'
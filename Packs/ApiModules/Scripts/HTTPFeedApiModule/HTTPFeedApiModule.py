@@ -5,7 +5,9 @@ from CommonServerUserPython import *
 ''' IMPORTS '''
 import urllib3
 import requests
-from typing import Optional, Pattern, List
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, Pattern, List, Dict, Tuple, Callable, Match, Iterator
 
 # disable insecure warnings
 urllib3.disable_warnings()
@@ -14,6 +16,117 @@ urllib3.disable_warnings()
 TAGS = 'tags'
 TLP_COLOR = 'trafficlightprotocol'
 DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+DEFAULT_TRANSFORM = r'\g<0>'
+# the default connection pool size of a requests session, so every concurrent request gets its own connection.
+MAX_CONCURRENT_REQUESTS = 10
+SINGLE_GROUP_TRANSFORM = re.compile(r'\\(\d+)|\\g<(\d+)>')
+
+
+def get_transform_expander(transform: str) -> Callable[[Match], str]:
+    """
+    Builds a function which expands a regex match according to a transform template.
+    Templates which reference a single group (e.g. \\1 or \\g<0>) are resolved with ``Match.group``,
+    which is much cheaper than ``Match.expand``.
+    :param transform: The transform template.
+    :return: A function which gets a match and returns the transformed value.
+    """
+    single_group = SINGLE_GROUP_TRANSFORM.fullmatch(transform)
+    if single_group:
+        group_index = int(single_group.group(1) or single_group.group(2))
+        return lambda match: match.group(group_index) or ''
+    return lambda match: match.expand(transform)
+
+
+class ExtractionPlan:
+    def __init__(self, feed_config: dict, default_indicator_type: str = '', custom_fields_mapping: dict = None,
+                 feed_name: str = 'http'):
+        """
+        The extraction settings of a single feed URL, compiled once so they can be applied to every line of the feed.
+        :param feed_config: The feed configuration of the URL (see ``Client.feed_url_to_config``).
+        :param default_indicator_type: The indicator type to use when the feed configuration does not specify one.
+        :param custom_fields_mapping: Dict, the feed attributes to map into indicator fields in Demisto.
+        :param feed_name: The name of the feed.
+        """
+        self.indicator_regex: Optional[Pattern] = None
+        self.indicator_expander: Optional[Callable[[Match], str]] = None
+        indicator = feed_config.get('indicator')
+        if indicator:
+            if 'regex' not in indicator:
+                raise ValueError(f'{feed_name} - indicator stanza should have a regex')
+            self.indicator_regex = re.compile(indicator['regex'])
+            self.indicator_expander = get_transform_expander(indicator.get('transform', DEFAULT_TRANSFORM))
+
+        self.fields: List[Tuple[str, Pattern, Callable[[Match], str]]] = []
+        for field in feed_config.get('fields', []):
+            for f, fattrs in field.items():
+                if 'regex' not in fattrs:
+                    raise ValueError(f'{feed_name} - {f} field does not have a regex')
+                self.fields.append((f, re.compile(fattrs['regex']),
+                                    get_transform_expander(fattrs.get('transform', DEFAULT_TRANSFORM))))
+
+        self.indicator_type = feed_config.get('indicator_type')
+        self.raw_indicator_type = feed_config.get('indicator_type', default_indicator_type)
+        self.relationship_name = feed_config.get('relationship_name')
+        self.relationship_entity_b_type = feed_config.get('relationship_entity_b_type')
+
+        # tags and TLP color are always kept under their own names, even if they appear in the custom mapping.
+        self.custom_fields_mapping: Dict[str, str] = dict(custom_fields_mapping or {})
+        self.custom_fields_mapping.update({TAGS: TAGS, TLP_COLOR: TLP_COLOR})
+
+    def extract(self, line: str, feed_tags: list, tlp_color: Optional[str]):
+        """
+        Extract the indicator and its attributes from a single line of the feed.
+        :param line: The current line in the feed
+        :param feed_tags: The indicator tags.
+        :param tlp_color: Traffic Light Protocol color.
+        :return: The indicator attributes and value.
+        """
+        attributes = None
+        value: str = ''
+        line = line.strip()
+        if not line:
+            return attributes, value
+
+        if self.indicator_regex is not None:
+            match = self.indicator_regex.search(line)
+            if match is None:
+                return attributes, value
+            extracted_indicator = self.indicator_expander(match)  # type: ignore[misc]
+        else:
+            extracted_indicator = line.split()[0]
+
+        attributes = {}
+        for f, regex, expander in self.fields:
+            m = regex.search(line)
+            if m is None:
+                continue
+
+            attributes[f] = expander(m)
+
+            try:
+                i = int(attributes[f])
+            except Exception:
+                pass
+            else:
+                attributes[f] = i
+        attributes['value'] = value = extracted_indicator
+        attributes['type'] = self.raw_indicator_type
+        attributes['tags'] = feed_tags
+
+        if tlp_color:
+            attributes['trafficlightprotocol'] = tlp_color
+
+        return attributes, value
+
+    def create_custom_fields(self, attributes: dict) -> dict:
+        """
+        Map the extracted attributes into the indicator fields.
+        :param attributes: The extracted attributes of the indicator.
+        :return: The indicator custom fields.
+        """
+        mapping = self.custom_fields_mapping
+        return {mapping[attribute]: attribute_value for attribute, attribute_value in attributes.items()
+                if attribute in mapping}
 
 
 class Client(BaseClient):
@@ -138,6 +251,26 @@ class Client(BaseClient):
             custom_fields_mapping = {}
         self.custom_fields_mapping = custom_fields_mapping
 
+        self.feed_url_to_extraction_plan: Dict[str, ExtractionPlan] = {}
+        if isinstance(self.feed_url_to_config, dict):
+            for feed_url, feed_config in self.feed_url_to_config.items():
+                self.feed_url_to_extraction_plan[feed_url] = self.build_extraction_plan(feed_config)
+
+    def build_extraction_plan(self, feed_config: dict) -> ExtractionPlan:
+        return ExtractionPlan(feed_config, default_indicator_type=self.indicator_type,
+                              custom_fields_mapping=self.custom_fields_mapping, feed_name=self.feed_name)
+
+    def get_extraction_plan(self, url: str) -> ExtractionPlan:
+        """
+        Get the extraction plan of the given URL, URLs without a feed configuration get an empty plan.
+        :param url: The feed URL
+        :return: The extraction plan of the URL.
+        """
+        plan = self.feed_url_to_extraction_plan.get(url)
+        if plan is None:
+            plan = self.feed_url_to_extraction_plan[url] = self.build_extraction_plan({})
+        return plan
+
     def get_feed_config(self, fields_json: str = '', indicator_json: str = ''):
         """
         Get the feed configuration from the indicator and field JSON strings.
@@ -191,7 +324,9 @@ class Client(BaseClient):
 
     def build_iterator(self, **kwargs):
         """
-        For each URL (service), send an HTTP request to get indicators and return them after filtering by Regex
+        For each URL (service), send an HTTP request to get indicators and return them after filtering by Regex.
+        The requests of the different URLs are sent concurrently over the client session, and the results are
+        ordered by the time their responses arrived, so the fastest URL is parsed first.
         :param kwargs: Arguments to send to the HTTP API endpoint
         :return: List of indicators
         """
@@ -204,39 +339,85 @@ class Client(BaseClient):
 
         if self.username is not None and self.password is not None:
             kwargs['auth'] = (self.username, self.password)
+
+        urls = self._base_url
+        if not isinstance(urls, list):
+            urls = [urls]
+
+        # the etag and last_modified values of all the URLs are read once, before the requests are sent.
+        last_run = demisto.getLastRun()
+        url_to_response_list: List[dict] = []
+        with ThreadPoolExecutor(max_workers=min(len(urls), MAX_CONCURRENT_REQUESTS) or 1) as executor:
+            future_to_url = {
+                executor.submit(self.send_feed_request, url, last_run.get(url, {}), **kwargs): url for url in urls
+            }
+            try:
+                for future in as_completed(future_to_url):
+                    url = future_to_url[future]
+                    r = future.result()
+                    # the last run is updated here and not in the worker threads, to avoid concurrent updates.
+                    no_update = get_no_update_value(r, url)
+                    url_to_response_list.append({url: {'response': r, 'no_update': no_update}})
+            except Exception:
+                for future in future_to_url:
+                    future.cancel()
+                # the streamed responses which were already received are closed, to release their connections.
+                executor.shutdown(wait=True)
+                for future in future_to_url:
+                    if not future.cancelled() and future.exception() is None:
+                        future.result().close()
+                raise
+
+        results = []
+        for url_to_response in url_to_response_list:
+            for url, res_data in url_to_response.items():
+                lines = res_data.get('response')
+                result = lines.iter_lines()
+                if self.encoding is not None:
+                    result = map(
+                        lambda x: x.decode(self.encoding).encode('utf_8'),
+                        result
+                    )
+                else:
+                    result = map(
+                        lambda x: x.decode('utf_8'),
+                        result
+                    )
+                if self.ignore_regex is not None:
+                    result = filter(
+                        lambda x: self.ignore_regex.match(x) is None,  # type: ignore[union-attr]
+                        result
+                    )
+                results.append({url: {'result': result, 'no_update': res_data.get('no_update')}})
+        return results
+
+    def send_feed_request(self, url: str, url_last_run: dict, **kwargs) -> requests.Response:
+        """
+        Send the HTTP request of a single URL (service).
+        :param url: The feed URL
+        :param url_last_run: The etag and last_modified values of the URL from the last run.
+        :param kwargs: Arguments to send to the HTTP API endpoint
+        :return: The response
+        """
+        # Set the If-None-Match and If-Modified-Since headers if we have etag or
+        # last_modified values in the context.
+        headers = dict(kwargs.pop('headers', None) or {})
+        etag = url_last_run.get('etag')
+        last_modified = url_last_run.get('last_modified')
+        if etag:
+            headers['If-None-Match'] = etag
+
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+
+        if headers:
+            kwargs['headers'] = headers
+
         try:
-            urls = self._base_url
-            url_to_response_list: List[dict] = []
-            if not isinstance(urls, list):
-                urls = [urls]
-            for url in urls:
-                # Set the If-None-Match and If-Modified-Since headers if we have etag or
-                # last_modified values in the context.
-                last_run = demisto.getLastRun()
-                etag = last_run.get(url, {}).get('etag')
-                last_modified = last_run.get(url, {}).get('last_modified')
-                if etag:
-                    if not kwargs.get('headers'):
-                        kwargs['headers'] = {}
-                    kwargs['headers']['If-None-Match'] = etag
-
-                if last_modified:
-                    if not kwargs.get('headers'):
-                        kwargs['headers'] = {}
-                    kwargs['headers']['If-Modified-Since'] = last_modified
-
-                r = requests.get(
-                    url,
-                    **kwargs
-                )
-                try:
-                    r.raise_for_status()
-                except Exception:
-                    LOG(f'{self.feed_name!r} - exception in request:'
-                        f' {r.status_code!r} {r.content!r}')
-                    raise
-                no_update = get_no_update_value(r, url)
-                url_to_response_list.append({url: {'response': r, 'no_update': no_update}})
+            r = self._session.get(
+                url,
+                **kwargs
+            )
         except requests.exceptions.ConnectTimeout as exception:
             err_msg = 'Connection Timeout Error - potential reasons might be that the Server URL parameter' \
                       ' is incorrect or that the Server is not accessible from your host.'
@@ -262,28 +443,13 @@ class Client(BaseClient):
                 .format(err_type, exception.errno, exception.strerror)
             raise DemistoException(err_msg, exception)
 
-        results = []
-        for url_to_response in url_to_response_list:
-            for url, res_data in url_to_response.items():
-                lines = res_data.get('response')
-                result = lines.iter_lines()
-                if self.encoding is not None:
-                    result = map(
-                        lambda x: x.decode(self.encoding).encode('utf_8'),
-                        result
-                    )
-                else:
-                    result = map(
-                        lambda x: x.decode('utf_8'),
-                        result
-                    )
-                if self.ignore_regex is not None:
-                    result = filter(
-                        lambda x: self.ignore_regex.match(x) is None,  # type: ignore[union-attr]
-                        result
-                    )
-                results.append({url: {'result': result, 'no_update': res_data.get('no_update')}})
-        return results
+        try:
+            r.raise_for_status()
+        except Exception:
+            LOG(f'{self.feed_name!r} - exception in request to {url!r}:'
+                f' {r.status_code!r} {r.content!r}')
+            raise
+        return r
 
     def custom_fields_creator(self, attributes: dict):
         created_custom_fields = {}
@@ -351,110 +517,69 @@ def get_indicator_fields(line, url, feed_tags: list, tlp_color: Optional[str], c
     :param tlp_color: Traffic Light Protocol color.
     :return: The indicator
     """
-    attributes = None
-    value: str = ''
-    indicator = None
-    fields_to_extract = []
-    feed_config = client.feed_url_to_config.get(url, {})
-    if feed_config:
-        if 'indicator' in feed_config:
-            indicator = feed_config['indicator']
-            if 'regex' in indicator:
-                indicator['regex'] = re.compile(indicator['regex'])
-            if 'transform' not in indicator:
-                indicator['transform'] = r'\g<0>'
-
-    if 'fields' in feed_config:
-        fields = feed_config['fields']
-        for field in fields:
-            for f, fattrs in field.items():
-                field = {f: {}}
-                if 'regex' in fattrs:
-                    field[f]['regex'] = re.compile(fattrs['regex'])
-                if 'transform' not in fattrs:
-                    field[f]['transform'] = r'\g<0>'
-                else:
-                    field[f]['transform'] = fattrs['transform']
-                fields_to_extract.append(field)
-
-    line = line.strip()
-    if line:
-        extracted_indicator = line.split()[0]
-        if indicator:
-            extracted_indicator = indicator['regex'].search(line)
-            if extracted_indicator is None:
-                return attributes, value
-            if 'transform' in indicator:
-                extracted_indicator = extracted_indicator.expand(indicator['transform'])
-        attributes = {}
-        for field in fields_to_extract:
-            for f, fattrs in field.items():
-                m = fattrs['regex'].search(line)
+    return client.get_extraction_plan(url).extract(line, feed_tags, tlp_color)
 
-                if m is None:
-                    continue
 
-                attributes[f] = m.expand(fattrs['transform'])
-
-                try:
-                    i = int(attributes[f])
-                except Exception:
-                    pass
-                else:
-                    attributes[f] = i
-        attributes['value'] = value = extracted_indicator
-        attributes['type'] = feed_config.get('indicator_type', client.indicator_type)
-        attributes['tags'] = feed_tags
-
-        if tlp_color:
-            attributes['trafficlightprotocol'] = tlp_color
-
-    return attributes, value
+def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, create_relationships=False, **kwargs):
+    indicators, no_update = fetch_indicators_iterator(client, feed_tags, tlp_color, itype, auto_detect,
+                                                      create_relationships, **kwargs)
+    return list(indicators), no_update
 
 
-def fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, create_relationships=False, **kwargs):
+def fetch_indicators_iterator(client, feed_tags, tlp_color, itype, auto_detect, create_relationships=False,
+                              **kwargs) -> Tuple[Iterator[dict], bool]:
+    """
+    Sends the feed requests and returns a lazy iterator of the indicators, so the feed content is streamed
+    line by line instead of being held in memory.
+    :return: The indicators iterator and the noUpdate value.
+    """
     iterators = client.build_iterator(**kwargs)
-    indicators = []
 
     # set noUpdate flag in createIndicators command True only when all the results from all the urls are True.
     no_update = all([next(iter(iterator.values())).get('no_update', False) for iterator in iterators])
 
+    return iterate_indicators(client, iterators, feed_tags, tlp_color, itype, auto_detect,
+                              create_relationships), no_update
+
+
+def iterate_indicators(client, iterators, feed_tags, tlp_color, itype, auto_detect,
+                       create_relationships=False) -> Iterator[dict]:
     for iterator in iterators:
         for url, lines in iterator.items():
+            plan = client.get_extraction_plan(url)
+            create_plan_relationships = create_relationships and plan.relationship_name
+            if create_plan_relationships:
+                relationship_entity_b_type = FeedIndicatorType.indicator_type_by_server_version(
+                    plan.relationship_entity_b_type)
+
             for line in lines.get('result', []):
-                attributes, value = get_indicator_fields(line, url, feed_tags, tlp_color, client)
+                attributes, value = plan.extract(line, feed_tags, tlp_color)
                 if value:
-                    if 'lastseenbysource' in attributes.keys():
+                    if 'lastseenbysource' in attributes:
                         attributes['lastseenbysource'] = datestring_to_server_format(attributes['lastseenbysource'])
 
-                    if 'firstseenbysource' in attributes.keys():
+                    if 'firstseenbysource' in attributes:
                         attributes['firstseenbysource'] = datestring_to_server_format(attributes['firstseenbysource'])
-                    indicator_type = determine_indicator_type(
-                        client.feed_url_to_config.get(url, {}).get('indicator_type'), itype, auto_detect, value)
+                    indicator_type = determine_indicator_type(plan.indicator_type, itype, auto_detect, value)
                     indicator_data = {
                         "value": value,
                         "type": indicator_type,
                         "rawJSON": attributes,
                     }
-                    if create_relationships and client.feed_url_to_config.get(url, {}).get('relationship_name'):
-                        if attributes.get('relationship_entity_b'):
-                            relationships_lst = EntityRelationship(
-                                name=client.feed_url_to_config.get(url, {}).get('relationship_name'),
-                                entity_a=value,
-                                entity_a_type=indicator_type,
-                                entity_b=attributes.get('relationship_entity_b'),
-                                entity_b_type=FeedIndicatorType.indicator_type_by_server_version(
-                                    client.feed_url_to_config.get(url, {}).get('relationship_entity_b_type')),
-                            )
-                            relationships_of_indicator = [relationships_lst.to_indicator()]
-                            indicator_data['relationships'] = relationships_of_indicator
-
-                    if len(client.custom_fields_mapping.keys()) > 0 or TAGS in attributes.keys():
-                        custom_fields = client.custom_fields_creator(attributes)
-                        indicator_data["fields"] = custom_fields
-
-                    indicators.append(indicator_data)
-    return indicators, no_update
+                    if create_plan_relationships and attributes.get('relationship_entity_b'):
+                        relationships_lst = EntityRelationship(
+                            name=plan.relationship_name,
+                            entity_a=value,
+                            entity_a_type=indicator_type,
+                            entity_b=attributes.get('relationship_entity_b'),
+                            entity_b_type=relationship_entity_b_type,
+                        )
+                        relationships_of_indicator = [relationships_lst.to_indicator()]
+                        indicator_data['relationships'] = relationships_of_indicator
+
+                    indicator_data["fields"] = plan.create_custom_fields(attributes)
+
+                    yield indicator_data
 
 
 def determine_indicator_type(indicator_type, default_indicator_type, auto_detect, value):
@@ -482,7 +607,8 @@ def get_indicators_command(client: Client, args):
     tlp_color = args.get('tlp_color')
     auto_detect = demisto.params().get('auto_detect_type')
     create_relationships = demisto.params().get('create_relationships')
-    indicators_list, _ = fetch_indicators_command(client, feed_tags, tlp_color, itype, auto_detect, create_relationships)[:limit]
+    indicators, _ = fetch_indicators_iterator(client, feed_tags, tlp_color, itype, auto_detect, create_relationships)
+    indicators_list = list(itertools.islice(indicators, limit))
     entry_result = camelize(indicators_list)
     hr = tableToMarkdown('Indicators', entry_result, headers=['Value', 'Type', 'Rawjson'])
     return hr, {}, indicators_list
@@ -523,14 +649,14 @@ def feed_main(feed_name, params=None, prefix=''):
     }
     try:
         if command == 'fetch-indicators':
-            indicators, no_update = fetch_indicators_command(client, feed_tags, tlp_color,
-                                                             params.get('indicator_type'),
-                                                             params.get('auto_detect_type'),
-                                                             params.get('create_relationships'))
+            indicators, no_update = fetch_indicators_iterator(client, feed_tags, tlp_color,
+                                                              params.get('indicator_type'),
+                                                              params.get('auto_detect_type'),
+                                                              params.get('create_relationships'))
 
             # check if the version is higher than 6.5.0 so we can use noUpdate parameter
             if is_demisto_version_ge('6.5.0'):
-                # we submit the indicators in batches
+                # we submit the indicators in batches as they are parsed, so only one batch is held in memory
                 for b in batch(indicators, batch_size=2000):
                     demisto.createIndicators(b, noUpdate=no_update)
             else:
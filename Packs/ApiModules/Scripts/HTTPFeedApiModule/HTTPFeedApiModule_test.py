@@ -1,7 +1,10 @@
 from HTTPFeedApiModule import get_indicators_command, Client, datestring_to_server_format, feed_main,\
     fetch_indicators_command, get_no_update_value
+import pytest
+import requests
 import requests_mock
 import demistomock as demisto
+from CommonServerPython import DemistoException
 
 
 def test_get_indicators():
@@ -513,3 +516,83 @@ def test_get_no_update_value_without_headers(mocker):
     assert not no_update
     assert demisto.debug.call_args[0][0] == 'Last-Modified and Etag headers are not exists,' \
                                             'createIndicators will be executed with noUpdate=False.'
+
+
+def test_feed_main_fetch_indicators_in_batches(mocker, requests_mock):
+    """
+    Given
+    - A plain text feed with 4500 indicators.
+
+    When
+    - Fetching indicators.
+
+    Then
+    - Ensure the indicators are streamed into createIndicators in batches of 2000.
+    """
+    feed_url = 'https://www.test.com/iplist.txt'
+    mocker.patch.object(demisto, 'params', return_value={'url': feed_url, 'indicator_type': 'IP'})
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(demisto, 'createIndicators')
+
+    feed_content = '\n'.join(f'1.1.{i // 256}.{i % 256}' for i in range(4500))
+    requests_mock.get(feed_url, content=feed_content.encode('utf8'))
+    feed_main('great_feed_name')
+
+    assert [len(call[0][0]) for call in demisto.createIndicators.call_args_list] == [2000, 2000, 500]
+    assert demisto.createIndicators.call_args_list[-1][0][0][-1]['value'] == '1.1.17.147'
+
+
+def test_build_iterator_multiple_urls(mocker):
+    """
+    Given
+    - Two feed URLs, only the first one has an etag from the last run.
+
+    When
+    - Running build_iterator method.
+
+    Then
+    - Ensure the last run is read once and each request gets only its own conditional headers.
+    - Ensure the results of both URLs are returned.
+    """
+    urls = ['https://www.test.com/first.txt', 'https://www.test.com/second.txt']
+    mocker.patch.object(demisto, 'getLastRun', return_value={urls[0]: {'etag': 'first-etag'}})
+    mocker.patch.object(demisto, 'setLastRun')
+    with requests_mock.Mocker() as m:
+        first = m.get(urls[0], status_code=304)
+        second = m.get(urls[1], content=b'1.1.1.1\n2.2.2.2')
+
+        client = Client(url=urls, feed_url_to_config={url: {'indicator_type': 'IP'} for url in urls})
+        result = client.build_iterator()
+
+    assert demisto.getLastRun.call_count == 1
+    assert first.last_request.headers['If-None-Match'] == 'first-etag'
+    assert 'If-None-Match' not in second.last_request.headers
+    url_to_result = {url: res for item in result for url, res in item.items()}
+    assert url_to_result[urls[0]]['no_update']
+    assert list(url_to_result[urls[1]]['result']) == ['1.1.1.1', '2.2.2.2']
+
+
+def test_build_iterator_multiple_urls_error(mocker):
+    """
+    Given
+    - Two feed URLs, the request of the second one fails.
+
+    When
+    - Running build_iterator method.
+
+    Then
+    - Ensure the error is raised.
+    - Ensure the response of the first URL is closed.
+    """
+    urls = ['https://www.test.com/first.txt', 'https://www.test.com/second.txt']
+    mocker.patch.object(demisto, 'getLastRun', return_value={})
+    close = mocker.spy(requests.Response, 'close')
+    with requests_mock.Mocker() as m:
+        m.get(urls[0], content=b'1.1.1.1')
+        m.get(urls[1], exc=requests.exceptions.ConnectTimeout)
+
+        client = Client(url=urls, feed_url_to_config={url: {'indicator_type': 'IP'} for url in urls})
+        with pytest.raises(DemistoException, match='Connection Timeout Error'):
+            client.build_iterator()
+
+    assert close.call_count == 1
@@ -3,7 +3,7 @@ from CommonServerPython import *
 ''' IMPORTS '''
 import urllib3
 import jmespath
-from typing import List, Dict, Union, Optional, Callable, Tuple
+from typing import List, Dict, Union, Optional, Callable, Tuple, Iterator
 
 # disable insecure warnings
 urllib3.disable_warnings()
@@ -213,7 +213,20 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
     :param limit: given only when get-indicators command is running. function will return number indicators as the limit
     :param create_relationships: whether to add connected indicators
     """
-    indicators: List[dict] = []
+    indicators, no_update = fetch_indicators_iterator(client, indicator_type, feedTags, auto_detect,
+                                                      create_relationships, limit, **kwargs)
+    return list(indicators), no_update
+
+
+def fetch_indicators_iterator(client: Client, indicator_type: str, feedTags: list, auto_detect: bool,
+                              create_relationships: bool = False, limit: int = 0,
+                              **kwargs) -> Tuple[Iterator[dict], bool]:
+    """
+    Fetches the feeds from client and returns a lazy iterator of the indicators, so the indicators are built
+    only when they are consumed (e.g. batch by batch by createIndicators).
+    The arguments are the same as in fetch_indicators_command.
+    :return: The indicators iterator and the noUpdate value.
+    """
     feeds_results = {}
     no_update = False
     for feed_name, feed in client.feed_name_to_config.items():
@@ -226,6 +239,13 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
         else:
             feeds_results[feed_name], no_update = client.build_iterator(feed, feed_name, **kwargs)
 
+    return iterate_indicators(client, feeds_results, indicator_type, feedTags, auto_detect, create_relationships,
+                              limit), no_update
+
+
+def iterate_indicators(client: Client, feeds_results: Dict[str, list], indicator_type: str, feedTags: list,
+                       auto_detect: bool, create_relationships: bool = False, limit: int = 0) -> Iterator[dict]:
+    indicators_count = 0
     for service_name, items in feeds_results.items():
         feed_config = client.feed_name_to_config.get(service_name, {})
         indicator_field = str(feed_config.get('indicator') if feed_config.get('indicator') else 'indicator')
@@ -239,15 +259,16 @@ def fetch_indicators_command(client: Client, indicator_type: str, feedTags: list
             if isinstance(item, str):
                 item = {indicator_field: item}
 
-            indicators.extend(
-                handle_indicator_function(client, item, feed_config, service_name, indicator_type, indicator_field,
-                                          use_prefix_flat, feedTags, auto_detect, mapping_function,
-                                          create_relationships, create_relationships_function))
+            item_indicators = handle_indicator_function(client, item, feed_config, service_name, indicator_type,
+                                                        indicator_field, use_prefix_flat, feedTags, auto_detect,
+                                                        mapping_function, create_relationships,
+                                                        create_relationships_function)
+            indicators_count += len(item_indicators)
+            yield from item_indicators
 
-            if limit and len(indicators) >= limit:  # We have a limitation only when get-indicators command is
+            if limit and indicators_count >= limit:  # We have a limitation only when get-indicators command is
                 # called, and then we return for each service_name "limit" of indicators
                 break
-    return indicators, no_update
 
 
 def indicator_mapping(mapping: Dict, indicator: Dict, attributes: Dict):
@@ -372,6 +393,15 @@ def extract_all_fields_from_indicator(indicator: Dict, indicator_key: str, flat_
     return fields
 
 
+def submit_indicators(indicators: List[dict], no_update: bool):
+    # check if the version is higher than 6.5.0 so we can use noUpdate parameter
+    if is_demisto_version_ge('6.5.0'):
+        demisto.createIndicators(indicators, noUpdate=no_update)
+    else:
+        # call createIndicators without noUpdate arg
+        demisto.createIndicators(indicators)
+
+
 def feed_main(params, feed_name, prefix):
     handle_proxy()
     client = Client(**params)
@@ -390,24 +420,17 @@ def feed_main(params, feed_name, prefix):
 
         elif command == 'fetch-indicators':
             create_relationships = params.get('create_relationships')
-            indicators, no_update = fetch_indicators_command(client, indicator_type, feedTags, auto_detect,
-                                                             create_relationships)
+            indicators, no_update = fetch_indicators_iterator(client, indicator_type, feedTags, auto_detect,
+                                                              create_relationships)
 
-            # check if the version is higher than 6.5.0 so we can use noUpdate parameter
-            if is_demisto_version_ge('6.5.0'):
-                if not indicators:
-                    demisto.createIndicators(indicators, noUpdate=no_update)
-                else:
-                    for b in batch(indicators, batch_size=2000):
-                        demisto.createIndicators(b, noUpdate=no_update)
+            # the indicators are built and submitted batch by batch, so only one batch is held in memory
+            indicators_submitted = False
+            for b in batch(indicators, batch_size=2000):
+                indicators_submitted = True
+                submit_indicators(b, no_update)
 
-            else:
-                # call createIndicators without noUpdate arg
-                if not indicators:
-                    demisto.createIndicators(indicators)
-                else:
-                    for b in batch(indicators, batch_size=2000):
-                        demisto.createIndicators(b)
+            if not indicators_submitted:
+                submit_indicators([], no_update)
 
         elif command == f'{prefix}get-indicators':
             # dummy command for testing
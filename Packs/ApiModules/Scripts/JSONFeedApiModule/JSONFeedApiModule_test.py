@@ -1,4 +1,4 @@
-from JSONFeedApiModule import Client, fetch_indicators_command, jmespath, get_no_update_value
+from JSONFeedApiModule import Client, fetch_indicators_command, jmespath, get_no_update_value, feed_main
 from CommonServerPython import *
 import requests_mock
 import demistomock as demisto
@@ -249,3 +249,59 @@ def test_get_no_update_value_without_headers(mocker):
     assert not no_update
     assert demisto.debug.call_args[0][0] == 'Last-Modified and Etag headers are not exists,' \
                                             'createIndicators will be executed with noUpdate=False.'
+
+
+def test_feed_main_fetch_indicators_in_batches(mocker):
+    """
+    Given
+    - A JSON feed with 1117 indicators.
+
+    When
+    - Fetching indicators with a batch size smaller than the feed.
+
+    Then
+    - Ensure createIndicators is called per batch with all the indicators.
+    """
+    import JSONFeedApiModule
+    with open('test_data/amazon_ip_ranges.json') as ip_ranges_json:
+        ip_ranges = json.load(ip_ranges_json)
+
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(demisto, 'createIndicators')
+    original_batch = JSONFeedApiModule.batch
+    mocker.patch.object(JSONFeedApiModule, 'batch', side_effect=lambda iterable, batch_size: original_batch(iterable, 500))
+    params = {
+        'url': 'https://ip-ranges.amazonaws.com/ip-ranges.json',
+        'extractor': "prefixes[?service=='AMAZON']",
+        'indicator': 'ip_prefix',
+        'indicator_type': 'CIDR'
+    }
+
+    with requests_mock.Mocker() as m:
+        m.get('https://ip-ranges.amazonaws.com/ip-ranges.json', json=ip_ranges)
+        feed_main(params, 'JSON Feed', 'json')
+
+    assert [len(call[0][0]) for call in demisto.createIndicators.call_args_list] == [500, 500, 117]
+
+
+def test_feed_main_fetch_no_indicators(mocker):
+    """
+    Given
+    - A JSON feed which returns no indicators.
+
+    When
+    - Fetching indicators.
+
+    Then
+    - Ensure createIndicators is still called once with an empty list.
+    """
+    mocker.patch.object(demisto, 'command', return_value='fetch-indicators')
+    mocker.patch.object(demisto, 'createIndicators')
+    params = {'url': 'https://api.github.com/meta', 'indicator_type': 'IP'}
+
+    with requests_mock.Mocker() as m:
+        m.get('https://api.github.com/meta', json=[])
+        feed_main(params, 'JSON Feed', 'json')
+
+    assert demisto.createIndicators.call_count == 1
+    assert demisto.createIndicators.call_args[0][0] == []
@@ -6,8 +6,10 @@ from CommonServerUserPython import *
 import requests
 import re
 import base64
+import threading
+import time
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-from typing import Dict, Tuple, List, Optional
+from typing import Dict, Iterator, Tuple, List, Optional
 
 
 class Scopes:
@@ -28,6 +30,10 @@ REFRESH_TOKEN = 'refresh_token'  # guardrails-disable-line
 DEVICE_CODE = 'urn:ietf:params:oauth:grant-type:device_code'
 REGEX_SEARCH_URL = r'(?P<url>https?://[^\s]+)'
 SESSION_STATE = 'session_state'
+# seconds before expiration in which a cached access token is proactively refreshed
+TOKEN_REFRESH_WINDOW = 60
+# maximal number of requests in a JSON batch request
+MAX_BATCH_REQUESTS = 20
 
 
 class MicrosoftClient(BaseClient):
@@ -100,6 +106,11 @@ class MicrosoftClient(BaseClient):
             self.resources = resources if resources else []
             self.resource_to_access_token: Dict[str, str] = {}
 
+        # In-process cache of (access token, valid until) by resource and scope, so requests don't read the
+        # integration context while the token is valid. The lock prevents concurrent threads from refreshing together.
+        self._access_token_cache: Dict[Tuple[str, str], Tuple[str, int]] = {}
+        self._access_token_lock = threading.Lock()
+
     def http_request(
             self, *args, resp_type='json', headers=None,
             return_empty_response=False, scope: Optional[str] = None,
@@ -163,6 +174,101 @@ class MicrosoftClient(BaseClient):
         except ValueError as exception:
             raise DemistoException('Failed to parse json object from response: {}'.format(response.content), exception)
 
+    def batch_request(self, requests_list: List[dict], url_suffix: str = '$batch', max_retries: int = 3,
+                      max_retry_after: int = 60, **kwargs) -> List[dict]:
+        """
+        Sends independent requests in JSON batch requests of up to MAX_BATCH_REQUESTS requests each.
+        Requests throttled by the API (status 429) are sent again in a later batch, after the longest Retry-After
+        period of the throttled requests.
+
+        Args:
+            requests_list: The requests to send. Each request is a dict with the request 'method' and 'url' (relative
+                to the API version, e.g. '/users/{user_id}'), and optionally its 'body' and 'headers'.
+            url_suffix: The suffix of the batch endpoint.
+            max_retries: The maximal number of times to send again a throttled request.
+            max_retry_after: The maximal number of seconds to wait before sending again throttled requests.
+            kwargs: Additional arguments for http_request.
+
+        Returns:
+            list: The response of each request, in the order of requests_list. Each response is a dict with the
+             'status', 'headers' and 'body' of the response.
+        """
+        responses: List[dict] = [{}] * len(requests_list)
+        pending_indexes = list(range(len(requests_list)))
+        retries = 0
+
+        while pending_indexes:
+            throttled_indexes: List[int] = []
+            retry_after = 0
+            for batch_start in range(0, len(pending_indexes), MAX_BATCH_REQUESTS):
+                batch_indexes = pending_indexes[batch_start:batch_start + MAX_BATCH_REQUESTS]
+                batch = {'requests': [self._build_batch_request_item(str(index), requests_list[index])
+                                      for index in batch_indexes]}
+                batch_response = self.http_request('POST', url_suffix=url_suffix, json_data=batch, **kwargs)
+                for item in batch_response.get('responses', []):
+                    index = int(item.get('id'))
+                    responses[index] = item
+                    if item.get('status') == 429 and retries < max_retries:
+                        throttled_indexes.append(index)
+                        retry_after = max(retry_after, self._get_batch_item_retry_after(item))
+
+            pending_indexes = sorted(throttled_indexes)
+            if pending_indexes:
+                retries += 1
+                demisto.debug(f'{len(pending_indexes)} batched requests were throttled, sending them again in '
+                              f'{min(retry_after, max_retry_after)} seconds.')
+                time.sleep(min(retry_after, max_retry_after))
+
+        return responses
+
+    @staticmethod
+    def _build_batch_request_item(request_id: str, request: dict) -> dict:
+        item = {
+            'id': request_id,
+            'method': request.get('method', 'GET').upper(),
+            'url': request['url']
+        }
+        headers = dict(request.get('headers') or {})
+        if request.get('body') is not None:
+            item['body'] = request['body']
+            headers.setdefault('Content-Type', 'application/json')
+        if headers:
+            item['headers'] = headers
+        return item
+
+    @staticmethod
+    def _get_batch_item_retry_after(item: dict) -> int:
+        for header, value in (item.get('headers') or {}).items():
+            if header.lower() == 'retry-after':
+                try:
+                    return int(value)
+                except (TypeError, ValueError):
+                    break
+        return 1
+
+    def paginate(self, url_suffix: str = '', full_url: Optional[str] = None, params: Optional[dict] = None,
+                 **kwargs) -> Iterator[dict]:
+        """
+        Yields the items of a collection, following the '@odata.nextLink' of each page.
+        The next page is requested only once the items of the current page were consumed.
+
+        Args:
+            url_suffix: The suffix of the collection URL.
+            full_url: The full collection URL, instead of url_suffix.
+            params: The query parameters of the first request. The next links already contain them.
+            kwargs: Additional arguments for http_request.
+
+        Returns:
+            Iterator[dict]: The items of the collection.
+        """
+        response = self.http_request('GET', url_suffix=url_suffix, full_url=full_url, params=params, **kwargs)
+        while True:
+            yield from response.get('value', [])
+            next_link = response.get('@odata.nextLink')
+            if not next_link:
+                return
+            response = self.http_request('GET', full_url=next_link, **kwargs)
+
     def get_access_token(self, resource: str = '', scope: Optional[str] = None) -> str:
         """
         Obtains access and refresh token from oproxy server or just a token from a self deployed app.
@@ -170,6 +276,10 @@ class MicrosoftClient(BaseClient):
         until expiration time. After expiration, new refresh token and access token are obtained and stored in the
         integration context.
 
+        The access token is also cached in the client, which serves it without reading the integration context until
+        TOKEN_REFRESH_WINDOW seconds before it expires. Then a single thread refreshes it while the other threads keep
+        using the still valid token.
+
         Args:
             resource (str): The resource identifier for which the generated token will have access to.
             scope (str): A scope to get instead of the default on the API.
@@ -177,6 +287,37 @@ class MicrosoftClient(BaseClient):
         Returns:
             str: Access token that will be added to authorization header.
         """
+        cache_key = (resource, scope or '')
+        cached_token = self._access_token_cache.get(cache_key)
+        if cached_token:
+            access_token, valid_until = cached_token
+            now = self.epoch_seconds()
+            if now < valid_until - TOKEN_REFRESH_WINDOW:
+                return access_token
+            if now < valid_until and self._access_token_lock.locked():
+                # another thread is already refreshing the token
+                return access_token
+
+        with self._access_token_lock:
+            cached_token = self._access_token_cache.get(cache_key)
+            if cached_token and self.epoch_seconds() < cached_token[1] - TOKEN_REFRESH_WINDOW:
+                # refreshed by another thread while waiting for the lock
+                return cached_token[0]
+            # a token that is about to expire is refreshed rather than taken again from the integration context
+            min_validity = TOKEN_REFRESH_WINDOW if cached_token else 0
+            access_token, valid_until = self._get_access_token_from_integration_context(resource, scope, min_validity)
+            self._access_token_cache[cache_key] = (access_token, valid_until)
+            return access_token
+
+    def _get_access_token_from_integration_context(self, resource: str = '', scope: Optional[str] = None,
+                                                   min_validity: int = 0) -> Tuple[str, int]:
+        """
+        Gets the access token stored in the integration context if it is valid for at least min_validity seconds,
+        otherwise obtains a new one and stores it in the integration context.
+
+        Returns:
+            tuple: The access token and the epoch time it is valid until.
+        """
         integration_context = get_integration_context()
         refresh_token = integration_context.get('current_refresh_token', '')
         # Set keywords. Default without the scope prefix.
@@ -191,8 +332,8 @@ class MicrosoftClient(BaseClient):
         valid_until = integration_context.get(valid_until_keyword)
 
         if access_token and valid_until:
-            if self.epoch_seconds() < valid_until:
-                return access_token
+            if self.epoch_seconds() < valid_until - min_validity:
+                return access_token, valid_until
 
         if self.auth_type == OPROXY_AUTH_TYPE:
             if self.multi_resource:
@@ -225,9 +366,9 @@ class MicrosoftClient(BaseClient):
         set_integration_context(integration_context)
 
         if self.multi_resource:
-            return self.resource_to_access_token[resource]
+            return self.resource_to_access_token[resource], valid_until
 
-        return access_token
+        return access_token, valid_until
 
     def _oproxy_authorize(self, resource: str = '', scope: Optional[str] = None) -> Tuple[str, int, str]:
         """
@@ -296,3 +296,157 @@ def test_oproxy_use_resource(mocker):
 
     client._oproxy_authorize(resource)
     assert resource == mocked_post.call_args_list[0][1]['json']['resource']
+
+
+def test_get_access_token_cached(mocker):
+    """
+    Given:
+        A valid access token in the integration context.
+    When:
+        Requesting an access token several times.
+    Then:
+        The integration context is read only once and the token is served from the client's cache.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(demisto, 'getIntegrationContext',
+                        return_value={'access_token': TOKEN, 'valid_until': 3605, 'current_refresh_token': ''})
+    mocker.patch.object(client, 'epoch_seconds', return_value=100)
+
+    assert [client.get_access_token() for _ in range(3)] == [TOKEN] * 3
+    assert demisto.getIntegrationContext.call_count == 1
+
+
+def test_get_access_token_proactive_refresh(mocker):
+    """
+    Given:
+        A cached access token that is about to expire, and is still valid in the integration context.
+    When:
+        Requesting an access token.
+    Then:
+        A new token is obtained and cached, instead of taking the expiring token from the integration context again.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(demisto, 'getIntegrationContext',
+                        return_value={'access_token': TOKEN, 'valid_until': 3605, 'current_refresh_token': ''})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(client, '_get_self_deployed_token', return_value=('new_token', 3600, ''))
+    client._access_token_cache[('', '')] = (TOKEN, 3605)
+    mocker.patch.object(client, 'epoch_seconds', return_value=3605 - TOKEN_REFRESH_WINDOW + 1)
+
+    assert client.get_access_token() == 'new_token'
+    assert client._get_self_deployed_token.call_count == 1
+    assert client.get_access_token() == 'new_token'
+    assert client._get_self_deployed_token.call_count == 1
+
+
+def test_get_access_token_concurrent_refresh(mocker):
+    """
+    Given:
+        No valid access token.
+    When:
+        Requesting an access token from several threads at the same time.
+    Then:
+        Only one token request is sent.
+    """
+    import threading
+    import time
+
+    def get_token(*args, **kwargs):
+        time.sleep(0.1)
+        return TOKEN, 3600, ''
+
+    client = self_deployed_client()
+    mocker.patch.object(demisto, 'getIntegrationContext', return_value={})
+    mocker.patch.object(demisto, 'setIntegrationContext')
+    mocker.patch.object(client, '_get_self_deployed_token', side_effect=get_token)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(client.get_access_token())) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert tokens == [TOKEN] * 5
+    assert client._get_self_deployed_token.call_count == 1
+
+
+def test_batch_request(mocker, requests_mock):
+    """
+    Given:
+        25 requests, where one of them is throttled in the first attempt.
+    When:
+        Sending the requests with batch_request.
+    Then:
+        The requests are sent in two batch requests, the throttled request is sent again after its Retry-After period,
+        and the responses are returned in the order of the requests.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(client, 'get_access_token', return_value=TOKEN)
+    sleep_mock = mocker.patch('time.sleep')
+    throttled = {'3': True}
+
+    def batch_response(request, context):
+        responses = []
+        for item in request.json()['requests']:
+            if throttled.pop(item['id'], False):
+                responses.append({'id': item['id'], 'status': 429, 'headers': {'Retry-After': '7'}, 'body': {}})
+            else:
+                responses.append({'id': item['id'], 'status': 200, 'headers': {}, 'body': {'url': item['url']}})
+        return {'responses': list(reversed(responses))}
+
+    batch_mock = requests_mock.post(f'{BASE_URL}$batch', json=batch_response)
+    requests_list = [{'method': 'get', 'url': f'/users/{i}'} for i in range(25)]
+
+    responses = client.batch_request(requests_list)
+
+    assert [len(request.json()['requests']) for request in batch_mock.request_history] == [20, 5, 1]
+    assert batch_mock.request_history[0].json()['requests'][0] == {'id': '0', 'method': 'GET', 'url': '/users/0'}
+    sleep_mock.assert_called_once_with(7)
+    assert [response['body']['url'] for response in responses] == [f'/users/{i}' for i in range(25)]
+
+
+def test_batch_request_max_retries(mocker, requests_mock):
+    """
+    Given:
+        A request that is always throttled.
+    When:
+        Sending the request with batch_request.
+    Then:
+        The request is sent again max_retries times, and its throttled response is returned.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(client, 'get_access_token', return_value=TOKEN)
+    sleep_mock = mocker.patch('time.sleep')
+    batch_mock = requests_mock.post(f'{BASE_URL}$batch', json={
+        'responses': [{'id': '0', 'status': 429, 'headers': {'Retry-After': '120'}, 'body': {}}]})
+
+    responses = client.batch_request([{'method': 'POST', 'url': '/users', 'body': {'a': 1}}], max_retries=2)
+
+    assert batch_mock.call_count == 3
+    assert batch_mock.last_request.json()['requests'][0]['headers'] == {'Content-Type': 'application/json'}
+    assert sleep_mock.call_args_list == [mocker.call(60), mocker.call(60)]
+    assert responses[0]['status'] == 429
+
+
+def test_paginate(mocker, requests_mock):
+    """
+    Given:
+        A collection of two pages.
+    When:
+        Iterating the collection with paginate.
+    Then:
+        The items of both pages are returned, and the second page is requested only when it is needed.
+    """
+    client = self_deployed_client()
+    mocker.patch.object(client, 'get_access_token', return_value=TOKEN)
+    next_link = f'{BASE_URL}users?$skiptoken=abc'
+    first_page = requests_mock.get(f'{BASE_URL}users?$top=2', complete_qs=True,
+                                   json={'value': [{'id': 1}, {'id': 2}], '@odata.nextLink': next_link})
+    second_page = requests_mock.get(next_link, complete_qs=True, json={'value': [{'id': 3}]})
+
+    items = client.paginate('users', params={'$top': 2})
+    assert next(items) == {'id': 1}
+    assert first_page.call_count == 1
+    assert second_page.call_count == 0
+    assert list(items) == [{'id': 2}, {'id': 3}]
+    assert second_page.call_count == 1
@@ -6,6 +6,7 @@ Note that adding code to CommonServerUserPython can override functions in Common
 from __future__ import print_function
 
 import base64
+import itertools
 import json
 import logging
 import os
@@ -21,6 +22,8 @@ from collections import OrderedDict
 from datetime import datetime, timedelta
 from abc import abstractmethod
 from distutils.version import LooseVersion
+from email.utils import mktime_tz, parsedate_tz
+import threading
 from threading import Lock
 
 import demistomock as demisto
@@ -529,72 +532,158 @@ def get_schedule_metadata(context):
     return schedule_metadata
 
 
-def auto_detect_indicator_type(indicator_value):
+class IndicatorTypeClassifier(object):
+    """
+      Infers the types of indicators, the same way as ``auto_detect_indicator_type``.
+      The indicator regexes are combined into a single regex, and the tldextract extractor is built only once, so
+      a classifier should be reused for many indicators. Use ``get_indicator_type_classifier`` to get the shared one.
     """
-      Infer the type of the indicator.
 
-      :type indicator_value: ``str``
-      :param indicator_value: The indicator whose type we want to check. (required)
+    def __init__(self):
+        try:
+            import tldextract
+        except Exception:
+            raise Exception("Missing tldextract module, In order to use the auto detect function please use a docker"
+                            " image with it installed such as: demisto/jmespath")
+
+        self._tldextract = tldextract
+        self._no_cache_extract = None
+        # Ordered as the types are checked by auto_detect_indicator_type, the first matching regex sets the type.
+        # The CVE regex is case insensitive by an inline global flag, which can't be used in a combined regex,
+        # so its letters are matched by explicit character classes instead.
+        type_regexes = [
+            (FeedIndicatorType.CIDR, ipv4cidrRegex),
+            (FeedIndicatorType.IPv6CIDR, ipv6cidrRegex),
+            (FeedIndicatorType.IP, ipv4Regex),
+            (FeedIndicatorType.IPv6, ipv6Regex),
+            (FeedIndicatorType.File, sha256Regex.pattern),
+            (FeedIndicatorType.URL, urlRegex),
+            (FeedIndicatorType.File, md5Regex.pattern),
+            (FeedIndicatorType.File, sha1Regex.pattern),
+            (FeedIndicatorType.Email, emailRegex),
+            (FeedIndicatorType.CVE, self._case_insensitive_pattern(cveRegex)),
+            (FeedIndicatorType.File, sha512Regex.pattern),
+        ]
+        self._group_types = {}
+        groups = []
+        for i, (indicator_type, regex) in enumerate(type_regexes):
+            group_name = 'type{}'.format(i)
+            self._group_types[group_name] = indicator_type
+            groups.append('(?P<{}>{})'.format(group_name, regex))
+        self._types_regex = re.compile('|'.join(groups))
 
-      :return: The type of the indicator.
-      :rtype: ``str``
-    """
-    try:
-        import tldextract
-    except Exception:
-        raise Exception("Missing tldextract module, In order to use the auto detect function please use a docker"
-                        " image with it installed such as: demisto/jmespath")
+    @staticmethod
+    def _case_insensitive_pattern(regex):
+        """
+          Rewrite a regex with a leading ``(?i)`` flag to match case insensitively without the flag, by replacing
+          each letter outside of escapes and character classes with a class of its lower and upper case.
 
-    if re.match(ipv4cidrRegex, indicator_value):
-        return FeedIndicatorType.CIDR
+          :type regex: ``str``
+          :param regex: The regex to rewrite.
 
-    if re.match(ipv6cidrRegex, indicator_value):
-        return FeedIndicatorType.IPv6CIDR
+          :return: The rewritten regex.
+          :rtype: ``str``
+        """
+        if regex.startswith('(?i)'):
+            regex = regex[len('(?i)'):]
+        chars = []
+        i = 0
+        in_class = False
+        while i < len(regex):
+            char = regex[i]
+            if char == '\\':
+                chars.append(regex[i:i + 2])
+                i += 2
+                continue
+            if char == '[':
+                in_class = True
+            elif char == ']':
+                in_class = False
+            elif char.isalpha() and not in_class:
+                char = '[{}{}]'.format(char.lower(), char.upper())
+            chars.append(char)
+            i += 1
+        return ''.join(chars)
+
+    def _extract_suffix(self, indicator_value):
+        if self._no_cache_extract is None:
+            if LooseVersion(self._tldextract.__version__) < '3.0.0':
+                self._no_cache_extract = self._tldextract.TLDExtract(cache_file=False, suffix_list_urls=None)
+            else:
+                self._no_cache_extract = self._tldextract.TLDExtract(cache_dir=False, suffix_list_urls=None)
 
-    if re.match(ipv4Regex, indicator_value):
-        return FeedIndicatorType.IP
+        return self._no_cache_extract(indicator_value).suffix
 
-    if re.match(ipv6Regex, indicator_value):
-        return FeedIndicatorType.IPv6
+    def classify(self, indicator_value):
+        """
+          Infer the type of the indicator.
 
-    if re.match(sha256Regex, indicator_value):
-        return FeedIndicatorType.File
+          :type indicator_value: ``str``
+          :param indicator_value: The indicator whose type we want to check. (required)
 
-    if re.match(urlRegex, indicator_value):
-        return FeedIndicatorType.URL
+          :return: The type of the indicator.
+          :rtype: ``str``
+        """
+        match = self._types_regex.match(indicator_value)
+        if match:
+            return self._group_types[match.lastgroup]
 
-    if re.match(md5Regex, indicator_value):
-        return FeedIndicatorType.File
+        try:
+            if self._extract_suffix(indicator_value):
+                if '*' in indicator_value:
+                    return FeedIndicatorType.DomainGlob
+                return FeedIndicatorType.Domain
 
-    if re.match(sha1Regex, indicator_value):
-        return FeedIndicatorType.File
+        except Exception:
+            demisto.debug('tldextract failed to detect indicator type. indicator value: {}'.format(indicator_value))
 
-    if re.match(emailRegex, indicator_value):
-        return FeedIndicatorType.Email
+        demisto.debug('Failed to detect indicator type. Indicator value: {}'.format(indicator_value))
+        return None
 
-    if re.match(cveRegex, indicator_value):
-        return FeedIndicatorType.CVE
+    def classify_many(self, indicator_values):
+        """
+          Infer the types of the indicators.
 
-    if re.match(sha512Regex, indicator_value):
-        return FeedIndicatorType.File
+          :type indicator_values: ``list``
+          :param indicator_values: The indicators whose types we want to check. (required)
+
+          :return: The types of the indicators, in the order of the indicators.
+          :rtype: ``list``
+        """
+        types = {}
+        for indicator_value in indicator_values:
+            if indicator_value not in types:
+                types[indicator_value] = self.classify(indicator_value)
+        return [types[indicator_value] for indicator_value in indicator_values]
+
+
+_indicator_type_classifier = None
+
+
+def get_indicator_type_classifier():
+    """
+      Get the indicator type classifier shared by the process.
+
+      :return: The indicator type classifier.
+      :rtype: ``IndicatorTypeClassifier``
+    """
+    global _indicator_type_classifier
+    if _indicator_type_classifier is None:
+        _indicator_type_classifier = IndicatorTypeClassifier()
+    return _indicator_type_classifier
 
-    try:
-        tldextract_version = tldextract.__version__
-        if LooseVersion(tldextract_version) < '3.0.0':
-            no_cache_extract = tldextract.TLDExtract(cache_file=False, suffix_list_urls=None)
-        else:
-            no_cache_extract = tldextract.TLDExtract(cache_dir=False, suffix_list_urls=None)
 
-        if no_cache_extract(indicator_value).suffix:
-            if '*' in indicator_value:
-                return FeedIndicatorType.DomainGlob
-            return FeedIndicatorType.Domain
+def auto_detect_indicator_type(indicator_value):
+    """
+      Infer the type of the indicator.
 
-    except Exception:
-        demisto.debug('tldextract failed to detect indicator type. indicator value: {}'.format(indicator_value))
+      :type indicator_value: ``str``
+      :param indicator_value: The indicator whose type we want to check. (required)
 
-    demisto.debug('Failed to detect indicator type. Indicator value: {}'.format(indicator_value))
-    return None
+      :return: The type of the indicator.
+      :rtype: ``str``
+    """
+    return get_indicator_type_classifier().classify(indicator_value)
 
 
 def add_http_prefix_if_missing(address=''):
@@ -1328,6 +1417,44 @@ def stringUnEscape(st):
     return st.replace('\\r', '\r').replace('\\n', '\n').replace('\\t', '\t')
 
 
+# from this number of replace strings, the logger replaces them by a single regex scan instead of a scan per string
+REPLACE_STRS_REGEX_THRESHOLD = 500
+
+
+def strings_to_trie_regex(strings):
+    """
+    Build a regex pattern matching any of the given strings, by a trie of the strings.
+    The longest string is matched when one string is a prefix of another.
+
+    :type strings: ``list``
+    :param strings: The strings to match.
+
+    :return: The regex pattern.
+    :rtype: ``str``
+    """
+    trie = {}  # type: dict
+    for string in strings:
+        node = trie
+        for char in string:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def node_to_regex(node):
+        prefix = ''
+        while len(node) == 1 and '' not in node:
+            char, node = next(iter(node.items()))
+            prefix += re.escape(char)
+        alternatives = [re.escape(char) + node_to_regex(child) for char, child in sorted(node.items()) if char]
+        if not alternatives:
+            return prefix
+        is_optional = '' in node
+        if len(alternatives) == 1 and not is_optional:
+            return prefix + alternatives[0]
+        return prefix + '(?:' + '|'.join(alternatives) + ')' + ('?' if is_optional else '')
+
+    return node_to_regex(trie) if strings else '(?!)'
+
+
 class IntegrationLogger(object):
     """
       a logger for python integrations:
@@ -1346,6 +1473,8 @@ class IntegrationLogger(object):
         self.messages = []  # type: list
         self.write_buf = []  # type: list
         self.replace_strs = []  # type: list
+        self._replace_strs_cache = None  # type: Optional[tuple]
+        self._replace_regex = None
         self.curl = []  # type: list
         self.buffering = True
         self.debug_logging = debug_logging
@@ -1383,10 +1512,32 @@ class IntegrationLogger(object):
                 res = message.encode('utf-8', 'replace')  # type: ignore
             else:
                 res = "Failed encoding message with error: {}".format(exception)
-        for s in self.replace_strs:
-            res = res.replace(s, '<XX_REPLACED>')
+        if self.replace_strs:
+            replace_strs = self._get_replace_strs()
+            if self._replace_regex is not None:
+                res = self._replace_regex.sub('<XX_REPLACED>', res)
+            else:
+                for s in replace_strs:
+                    res = res.replace(s, '<XX_REPLACED>')
         return res
 
+    def _get_replace_strs(self):
+        """
+        Get the unique, non empty replace strings, longest first (then alphabetically), so a replace string which
+        contains another one is replaced as a whole. Built again only after replace strings were added.
+        When there are many replace strings, they are also compiled into a single regex (a trie of the strings),
+        so each message is replaced in a single scan instead of one scan per string.
+
+        :return: The replace strings.
+        :rtype: ``tuple``
+        """
+        if self._replace_strs_cache is None:
+            self._replace_strs_cache = tuple(sorted(set(s for s in self.replace_strs if s), key=lambda s: (-len(s), s)))
+            self._replace_regex = None
+            if len(self._replace_strs_cache) >= REPLACE_STRS_REGEX_THRESHOLD:
+                self._replace_regex = re.compile(strings_to_trie_regex(self._replace_strs_cache))
+        return self._replace_strs_cache
+
     def __call__(self, message):
         text = self.encode(message)
         if self.buffering:
@@ -1420,6 +1571,7 @@ class IntegrationLogger(object):
                     to_add.append(urllib.quote_plus(a))
 
         self.replace_strs.extend(to_add)
+        self._replace_strs_cache = None
 
     def set_buffering(self, state):
         """
@@ -1781,7 +1933,7 @@ def create_clickable_url(url):
 
 
 def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=False, metadata=None, url_keys=None,
-                    date_fields=None):
+                    date_fields=None, max_rows=None):
     """
        Converts a demisto table in JSON form to a Markdown table
 
@@ -1810,9 +1962,16 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
        :type date_fields: ``list``
        :param date_fields: A list of date fields to format the value to human-readable output.
 
+       :type max_rows: ``int``
+       :param max_rows: The maximal number of rows to present, a positive number. If there are more, a truncation
+        footer is added.
+
        :return: A string representation of the markdown table
        :rtype: ``str``
     """
+    if max_rows is not None and max_rows < 1:
+        raise ValueError('max_rows must be a positive number, got {}'.format(max_rows))
+
     # Turning the urls in the table to clickable
     if url_keys:
         t = url_to_clickable_markdown(t, url_keys)
@@ -1853,47 +2012,74 @@ def tableToMarkdown(name, t, headers=None, headerTransform=None, removeNull=Fals
         headers = list(t[0].keys())
         headers.sort()
 
+    total_rows = len(t)
+    if max_rows is not None and total_rows > max_rows:
+        t = t[:max_rows]
+
     if removeNull:
-        headers_aux = headers[:]
-        for header in headers:
-            if all(obj.get(header) in ('', None, [], {}) for obj in t):
-                headers_aux.remove(header)
-        headers = headers_aux
+        non_null_headers = set()  # type: set
+        remaining_headers = set(headers)
+        for obj in t:
+            for header in remaining_headers:
+                if obj.get(header) not in ('', None, [], {}):
+                    non_null_headers.add(header)
+            remaining_headers -= non_null_headers
+            if not remaining_headers:
+                break
+        headers = [header for header in headers if header in non_null_headers]
 
     if t and len(headers) > 0:
-        newHeaders = []
         if headerTransform is None:  # noqa
             def headerTransform(s): return stringEscapeMD(s, True, True)  # noqa
-        for header in headers:
-            newHeaders.append(headerTransform(header))
-        mdResult += '|'
-        if len(newHeaders) == 1:
-            mdResult += newHeaders[0]
-        else:
-            mdResult += '|'.join(newHeaders)
-        mdResult += '|\n'
-        sep = '---'
-        mdResult += '|' + '|'.join([sep] * len(headers)) + '|\n'
+        md_lines = [mdResult, '|', '|'.join([headerTransform(header) for header in headers]), '|\n',
+                    '|' + '|'.join(['---'] * len(headers)) + '|\n']
+        # the escaped strings and floats, by their type, as the same values tend to repeat across the rows
+        escaped_cells = {str: {}, float: {}}  # type: dict
+        if not IS_PY3:
+            escaped_cells[unicode] = {}  # type: ignore # noqa: F821 # pylint: disable=undefined-variable
         for entry in t:
-            entry_copy = entry.copy()
             if date_fields:
+                entry = entry.copy()
                 for field in date_fields:
                     try:
-                        entry_copy[field] = datetime.fromtimestamp(int(entry_copy[field]) / 1000).strftime('%Y-%m-%d %H:%M:%S')
+                        entry[field] = datetime.fromtimestamp(int(entry[field]) / 1000).strftime('%Y-%m-%d %H:%M:%S')
                     except Exception:
                         pass
 
-            vals = [stringEscapeMD((formatCell(entry_copy.get(h, ''), False) if entry_copy.get(h) is not None else ''),
-                                   True, True) for h in headers]
+            vals = []
+            for h in headers:
+                value = entry.get(h)
+                if value is None:
+                    vals.append('')
+                    continue
+                value_type = type(value)
+                if value_type is int:
+                    # same as its JSON, with nothing to escape
+                    vals.append(str(value))
+                    continue
+                type_escaped_cells = escaped_cells.get(value_type)
+                if type_escaped_cells is None:
+                    vals.append(stringEscapeMD(formatCell(value, False), True, True))
+                    continue
+                escaped = type_escaped_cells.get(value)
+                if escaped is None:
+                    escaped = type_escaped_cells[value] = stringEscapeMD(formatCell(value, False), True, True)
+                vals.append(escaped)
 
             # this pipe is optional
-            mdResult += '| '
             try:
-                mdResult += ' | '.join(vals)
+                md_lines.append('| ' + ' | '.join(vals) + ' |\n')
             except UnicodeDecodeError:
-                vals = [str(v) for v in vals]
-                mdResult += ' | '.join(vals)
-            mdResult += ' |\n'
+                md_lines.append('| ' + ' | '.join([str(v) for v in vals]) + ' |\n')
+
+        if total_rows > len(t):
+            md_lines.append('\n**Showing {} out of {} entries.**\n'.format(len(t), total_rows))
+        try:
+            mdResult = ''.join(md_lines)
+        except UnicodeDecodeError:
+            # python 2, the lines mix unicode and non ascii str, so the unicode lines are encoded as well
+            unicode_type = unicode  # type: ignore # noqa: F821 # pylint: disable=undefined-variable
+            mdResult = ''.join([line.encode('utf-8') if isinstance(line, unicode_type) else line for line in md_lines])
 
     else:
         mdResult += '**No entries.**\n'
@@ -6920,6 +7106,64 @@ H || val.SSDeep && val.SSDeep == obj.SSDeep)': {'Malicious': {'Vendor': 'Vendor'
                                .format(indicator_type, INDICATOR_TYPE_TO_CONTEXT_KEY.keys()))
 
 
+class TokenBucket(object):
+    """
+    A thread safe token bucket rate limiter.
+    Tokens are added at a constant rate, up to the capacity of the bucket, and each action takes a token.
+
+    :type rate: ``float``
+    :param rate: The number of tokens added per second.
+
+    :type capacity: ``int``
+    :param capacity: The maximal number of tokens in the bucket, which is the size of a burst. Default is 1.
+
+    :return: No data returned
+    :rtype: ``None``
+    """
+
+    def __init__(self, rate, capacity=1):
+        if rate <= 0:
+            raise ValueError('The rate of a token bucket must be positive, got {}'.format(rate))
+        self.rate = float(rate)
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._last_time = time.time()
+        self._paused_until = 0.0
+        self._lock = Lock()
+
+    def acquire(self):
+        """
+        Takes a token from the bucket, waiting until there is one.
+
+        :return: No data returned
+        :rtype: ``None``
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last_time) * self.rate)
+                self._last_time = now
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait_time)
+
+    def pause(self, seconds):
+        """
+        Stops giving tokens for the given time, for example when the server asked to retry after it.
+
+        :type seconds: ``float``
+        :param seconds: The number of seconds to pause.
+
+        :return: No data returned
+        :rtype: ``None``
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.time() + seconds)
+            self._tokens = 0.0
+
+
 # Will add only if 'requests' module imported
 if 'requests' in sys.modules:
     class BaseClient(object):
@@ -6948,17 +7192,40 @@ if 'requests' in sys.modules:
             The request authorization, for example: (username, password).
             Can be None.
 
+        :type pool_connections: ``int``
+        :param pool_connections: The number of hosts to keep connection pools for (default 10, as requests).
+
+        :type pool_maxsize: ``int``
+        :param pool_maxsize: The maximal number of connections to keep in each connection pool
+            (default 10, as requests). Set it to the number of concurrent requests to the same host.
+
+        :type pool_block: ``bool``
+        :param pool_block: Whether to wait for a free connection when all the connections of the pool are in use,
+            instead of opening a connection which is not kept in the pool (default False, as requests).
+
+        :type keep_alive: ``bool``
+        :param keep_alive: Whether to keep connections open to be reused by the next requests. Default is True.
+
         :return: No data returned
         :rtype: ``None``
         """
 
-        def __init__(self, base_url, verify=True, proxy=False, ok_codes=tuple(), headers=None, auth=None):
+        def __init__(self, base_url, verify=True, proxy=False, ok_codes=tuple(), headers=None, auth=None,
+                     pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True):
             self._base_url = base_url
             self._verify = verify
             self._ok_codes = ok_codes
             self._headers = headers
             self._auth = auth
             self._session = requests.Session()
+            self._pool_connections = pool_connections
+            self._pool_maxsize = pool_maxsize
+            self._pool_block = pool_block
+            # the adapters of the session by their retry policy, None is the policy of no retries
+            self._adapters = {}  # type: dict
+            self._mount_adapter(None)
+            if not keep_alive:
+                self._session.headers['Connection'] = 'close'
             if proxy:
                 ensure_proxy_has_http_prefix()
             else:
@@ -6976,6 +7243,55 @@ if 'requests' in sys.modules:
             except Exception:  # noqa
                 demisto.debug('failed to close BaseClient session with the following error:\n{}'.format(traceback.format_exc()))
 
+        def _mount_adapter(self, retry_policy, max_retries=0):
+            """
+            Mounts the adapter of the retry policy on the session, creating it only the first time.
+            Each adapter keeps its own connection pools, so reusing it keeps their connections open.
+
+            :type retry_policy: ``tuple``
+            :param retry_policy: The key of the retry policy, None for no retries.
+
+            :type max_retries: ``Retry`` or ``int``
+            :param max_retries: The retry configuration of a new adapter.
+            """
+            adapter = self._adapters.get(retry_policy)
+            if adapter is None:
+                adapter = self._adapters[retry_policy] = HTTPAdapter(
+                    pool_connections=self._pool_connections,
+                    pool_maxsize=self._pool_maxsize,
+                    max_retries=max_retries,
+                    pool_block=self._pool_block,
+                )
+            if self._session.adapters.get('https://') is not adapter:
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+
+        def _get_connection_stats(self):
+            """
+            Gets counters of the connections of the client, for troubleshooting.
+            The counters are of the connection pools the client currently holds. A pool, with its counters, is
+            dropped when more than ``pool_connections`` hosts are accessed.
+            ``reused_connections`` is an approximation: the requests sent minus the connections opened, so it
+            also counts retries and does not tell which connection was reused.
+
+            :return: The number of connections opened, requests sent and requests sent on a reused connection.
+            :rtype: ``dict``
+            """
+            connections_opened = 0
+            requests_sent = 0
+            for adapter in self._adapters.values():
+                for pool_manager in [adapter.poolmanager] + list(adapter.proxy_manager.values()):
+                    for pool_key in pool_manager.pools.keys():
+                        pool = pool_manager.pools.get(pool_key)
+                        if pool is not None:
+                            connections_opened += pool.num_connections
+                            requests_sent += pool.num_requests
+            return {
+                'connections_opened': connections_opened,
+                'requests': requests_sent,
+                'reused_connections': max(requests_sent - connections_opened, 0),
+            }
+
         def _implement_retry(self, retries=0,
                              status_list_to_retry=None,
                              backoff_factor=5,
@@ -7018,6 +7334,11 @@ if 'requests' in sys.modules:
                 if status falls in ``status_forcelist`` range and retries have
                 been exhausted.
             """
+            retry_policy = (retries, frozenset(status_list_to_retry or ()), backoff_factor, raise_on_redirect,
+                            raise_on_status)
+            if retry_policy in self._adapters:
+                self._mount_adapter(retry_policy)
+                return
             try:
                 method_whitelist = "allowed_methods" if hasattr(Retry.DEFAULT, "allowed_methods") else "method_whitelist"
                 whitelist_kawargs = {
@@ -7034,9 +7355,7 @@ if 'requests' in sys.modules:
                     raise_on_redirect=raise_on_redirect,
                     **whitelist_kawargs
                 )
-                adapter = HTTPAdapter(max_retries=retry)
-                self._session.mount('http://', adapter)
-                self._session.mount('https://', adapter)
+                self._mount_adapter(retry_policy, retry)
             except NameError:
                 pass
 
@@ -7232,6 +7551,103 @@ if 'requests' in sys.modules:
                 err_msg = 'Max Retries Error- Request attempts with {} retries failed. \n{}'.format(retries, reason)
                 raise DemistoException(err_msg, exception)
 
+        def _http_request_many(self, requests_kwargs, max_concurrency=5, rate_limit=None, max_rate_limit_retries=3,
+                               max_retry_after=60):
+            """
+            Sends many requests concurrently with _http_request, on the session of the client.
+            When a request is answered with 429 or 503 and a Retry-After header, the requests are paused for that
+            time and the request is sent again.
+            Set the ``pool_maxsize`` of the client to at least ``max_concurrency``, so all the connections are pooled.
+
+            :type requests_kwargs: ``list``
+            :param requests_kwargs: The keyword arguments of _http_request of each request,
+                for example: [{'method': 'GET', 'url_suffix': '/ip/1.1.1.1'}].
+
+            :type max_concurrency: ``int``
+            :param max_concurrency: The maximal number of requests to send at the same time. Default is 5.
+
+            :type rate_limit: ``float``
+            :param rate_limit: The maximal number of requests to send per second. Default is no limit.
+
+            :type max_rate_limit_retries: ``int``
+            :param max_rate_limit_retries: How many times to send a request again after a Retry-After. Default is 3.
+
+            :type max_retry_after: ``float``
+            :param max_retry_after: The maximal number of seconds to wait for a Retry-After. Default is 60.
+
+            :return: A (result, error) tuple per request, in the order of the requests. error is None on success,
+                otherwise it is the exception raised and result is None.
+            :rtype: ``list``
+            """
+            results = [(None, None)] * len(requests_kwargs)  # type: list
+            if not requests_kwargs:
+                return results
+            token_bucket = TokenBucket(rate_limit, capacity=max_concurrency) if rate_limit else None
+            pending = iter(enumerate(requests_kwargs))
+            pending_lock = Lock()
+
+            def send(request_kwargs):
+                rate_limit_retries = 0
+                while True:
+                    if token_bucket:
+                        token_bucket.acquire()
+                    try:
+                        return self._http_request(**request_kwargs)
+                    except DemistoException as exception:
+                        retry_after = self._get_retry_after(exception.res)
+                        if retry_after is None or rate_limit_retries >= max_rate_limit_retries:
+                            raise
+                        rate_limit_retries += 1
+                        retry_after = min(retry_after, max_retry_after)
+                        demisto.debug('Request was rate limited, sending it again in {} seconds'.format(retry_after))
+                        if token_bucket:
+                            token_bucket.pause(retry_after)
+                        else:
+                            time.sleep(retry_after)
+
+            def worker():
+                while True:
+                    with pending_lock:
+                        index, request_kwargs = next(pending, (None, None))
+                    if index is None:
+                        return
+                    try:
+                        results[index] = (send(request_kwargs), None)
+                    except Exception as exception:  # noqa: disable=broad-except
+                        results[index] = (None, exception)
+
+            workers = [threading.Thread(target=worker) for _ in range(min(max_concurrency, len(requests_kwargs)))]
+            for worker_thread in workers:
+                worker_thread.start()
+            for worker_thread in workers:
+                worker_thread.join()
+            return results
+
+        @staticmethod
+        def _get_retry_after(response):
+            """
+            Gets the number of seconds to wait before sending a request again, from a response
+            with status 429 (Too Many Requests) or 503 (Service Unavailable).
+
+            :type response: ``requests.Response``
+            :param response: The response of the request.
+
+            :return: The number of seconds to wait, None if the response does not ask to send the request again.
+            :rtype: ``float``
+            """
+            if response is None or response.status_code not in (429, 503):
+                return None
+            retry_after = response.headers.get('Retry-After')
+            if not retry_after:
+                return None
+            try:
+                return max(float(retry_after), 0)
+            except ValueError:
+                retry_after_date = parsedate_tz(retry_after)
+                if not retry_after_date:
+                    return None
+                return max(mktime_tz(retry_after_date) - time.time(), 0)
+
         def _is_status_code_valid(self, response, ok_codes=None):
             """If the status code is OK, return 'True'.
 
@@ -7255,6 +7671,7 @@ if 'requests' in sys.modules:
 
 def batch(iterable, batch_size=1):
     """Gets an iterable and yields slices of it.
+    Iterables which do not support slicing (e.g. generators) are consumed lazily, one batch at a time.
 
     :type iterable: ``list``
     :param iterable: list or other iterable object.
@@ -7265,6 +7682,14 @@ def batch(iterable, batch_size=1):
     :rtype: ``list``
     :return:: Iterable slices of given
     """
+    if not hasattr(iterable, '__getitem__'):
+        iterator = iter(iterable)
+        current_batch = list(itertools.islice(iterator, batch_size))
+        while current_batch:
+            yield current_batch
+            current_batch = list(itertools.islice(iterator, batch_size))
+        return
+
     current_batch = iterable[:batch_size]
     not_batched = iterable[batch_size:]
     while current_batch:
@@ -699,6 +699,48 @@ class TestTableToMarkdown:
 '''
         assert table == expected_md_table
 
+    @staticmethod
+    def test_max_rows():
+        """
+        Given:
+          - list of objects, where a column has values only after the first rows.
+        When:
+          - calling tableToMarkdown with max_rows smaller and bigger than the number of objects.
+        Then:
+          - return a table of the first max_rows objects, with a truncation footer.
+          - the column with no values in the presented rows is removed.
+          - return the full table when there are no more objects than max_rows.
+          - raise an error when max_rows is not positive.
+        """
+        data = [{'id': 1, 'name': 'a|b'}, {'id': 2, 'name': 'a|b'}, {'id': 3, 'name': 'c', 'extra': 'x'}]
+        table = tableToMarkdown('tableToMarkdown test', data, headers=['id', 'name', 'extra'], removeNull=True,
+                                max_rows=2)
+        assert table == '''### tableToMarkdown test
+|id|name|
+|---|---|
+| 1 | a\\|b |
+| 2 | a\\|b |
+
+**Showing 2 out of 3 entries.**
+'''
+        assert tableToMarkdown('tableToMarkdown test', data, max_rows=3) == tableToMarkdown('tableToMarkdown test', data)
+        with pytest.raises(ValueError):
+            tableToMarkdown('tableToMarkdown test', data, max_rows=0)
+
+    @staticmethod
+    def test_repeated_values():
+        """
+        Given:
+          - list of objects with values that repeat, of different types which are equal (1, 1.0 and True).
+        When:
+          - calling tableToMarkdown.
+        Then:
+          - return a table where each value is formatted by its own type.
+        """
+        data = [{'a': 1, 'b': 1.0, 'c': True, 'd': 'x\n|'}] * 2
+        table = tableToMarkdown('tableToMarkdown test', data)
+        assert table.endswith('|a|b|c|d|\n|---|---|---|---|\n' + '| 1 | 1.0 | true | x<br>\\| |\n' * 2)
+
 
 @pytest.mark.parametrize('data, expected_data', COMPLEX_DATA_WITH_URLS)
 def test_url_to_clickable_markdown(data, expected_data):
@@ -1112,6 +1154,79 @@ def test_debug_logger_replace_strs(mocker):
         assert s not in msg
 
 
+def test_logger_replace_strs_longest_first():
+    """
+    Given:
+       - Replace strings where one contains the other
+    When
+       - Encoding messages with the logger
+    Then
+       - Ensure the longer string is replaced as a whole
+       - Ensure the replace strings are prepared again only when replace strings are added
+       - Ensure replace strings of the same length are ordered alphabetically
+    """
+    ilog = IntegrationLogger()
+    ilog.add_replace_strs('pass', 'password123')
+    assert ilog.encode('password123 and pass') == '<XX_REPLACED> and <XX_REPLACED>'
+    replace_strs = ilog._get_replace_strs()
+    assert replace_strs == ('password123', 'pass')
+    assert ilog._get_replace_strs() is replace_strs
+    ilog.add_replace_strs('and')
+    assert ilog.encode('password123 and pass') == '<XX_REPLACED> <XX_REPLACED> <XX_REPLACED>'
+    ilog.add_replace_strs('plain', 'crate')
+    assert ilog.encode('plain text') == '<XX_REPLACED> text'
+    assert ilog._get_replace_strs() == ('password123', 'crate', 'plain', 'pass', 'and')
+
+
+@pytest.mark.parametrize('strings, text, expected', [
+    (['pass', 'password', 'pa'], 'password pass pa p', 'X X X p'),
+    (['a.b', 'a*b'], 'a.b a*b axb', 'X X axb'),
+    ([], 'text', 'text'),
+])
+def test_strings_to_trie_regex(strings, text, expected):
+    """
+    Given:
+       - Strings, some are prefixes of others or contain regex special characters
+    When
+       - Replacing them in a text by the trie regex of the strings
+    Then
+       - Ensure the longest string is replaced and special characters are matched literally
+    """
+    from CommonServerPython import strings_to_trie_regex
+    assert re.sub(strings_to_trie_regex(strings), 'X', text) == expected
+
+
+def test_logger_replace_strs_many(mocker):
+    """
+    Given:
+       - Many secrets, so their replace strings are compiled into a single regex
+    When
+       - Encoding many log messages
+    Then
+       - Ensure the messages are the same as when replacing the strings one by one
+    """
+    import random
+    import string
+    rand = random.Random(1)
+    secrets = [''.join(rand.choice(string.ascii_letters + string.digits + '"%/\\') for _ in range(rand.randint(8, 40)))
+               for _ in range(100)]
+    messages = [' '.join(rand.choice(secrets) if rand.random() < 0.05 else 'word{}'.format(i) for i in range(60))
+                for _ in range(200)]
+    sequential_logger = IntegrationLogger()
+    sequential_logger.add_replace_strs(*secrets)
+    sequential_res = [sequential_logger.encode(message) for message in messages]
+    mocker.patch('CommonServerPython.REPLACE_STRS_REGEX_THRESHOLD', 1)
+    regex_logger = IntegrationLogger()
+    regex_logger.add_replace_strs(*secrets)
+
+    regex_res = [regex_logger.encode(message) for message in messages]
+
+    assert regex_logger._replace_regex is not None
+    assert sequential_logger._replace_regex is None
+    assert regex_res == sequential_res
+    assert all(secret not in message for secret in secrets for message in regex_res)
+
+
 def test_build_curl_post_noproxy():
     """
     Given:
@@ -2274,6 +2389,30 @@ class TestCommandResults:
         assert results.to_context().get('Note') is True
 
 
+def test_token_bucket(mocker):
+    """
+    Given:
+       - A token bucket of 2 tokens per second with a capacity of 2
+    When
+       - Acquiring tokens, and pausing the bucket
+    Then
+       - Ensure a burst of the capacity is not delayed, then tokens are given at the rate, and not during a pause
+    """
+    from CommonServerPython import TokenBucket
+    clock = [1000.0]
+    mocker.patch('time.time', side_effect=lambda: clock[0])
+    mocker.patch('time.sleep', side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds))
+    bucket = TokenBucket(2, capacity=2)
+    for _ in range(4):
+        bucket.acquire()
+    assert clock[0] == 1001.0
+    bucket.pause(10)
+    bucket.acquire()
+    assert clock[0] == 1011.0
+    with raises(ValueError):
+        TokenBucket(0)
+
+
 class TestBaseClient:
     from CommonServerPython import BaseClient
     text = {"status": "ok"}
@@ -2525,6 +2664,159 @@ class TestBaseClient:
         with raises(requests.exceptions.SSLError, match="^test ssl$"):
             client._http_request('get', 'event', resp_type='response')
 
+    def test_implement_retry_reuses_adapter(self):
+        """
+            Given
+            - A base client with pool settings
+
+            When
+            - Implementing the retry mechanism with the same retry policy more than once, and with another policy
+
+            Then
+            - Ensure the adapter of each retry policy is created once, with the pool settings of the client
+        """
+        from CommonServerPython import BaseClient
+        client = BaseClient('http://example.com/api/v2/', pool_connections=2, pool_maxsize=20, pool_block=True)
+        default_adapter = client._session.adapters['https://']
+        client._implement_retry(retries=3, status_list_to_retry=[429, 500])
+        retry_adapter = client._session.adapters['https://']
+        assert retry_adapter is not default_adapter
+        assert retry_adapter.max_retries.total == 3
+        client._implement_retry(retries=4)
+        assert client._session.adapters['https://'] is not retry_adapter
+        client._implement_retry(retries=3, status_list_to_retry=[500, 429])
+        assert client._session.adapters['https://'] is retry_adapter
+        assert client._session.adapters['http://'] is retry_adapter
+        assert len(client._adapters) == 3
+        for adapter in client._adapters.values():
+            assert (adapter._pool_connections, adapter._pool_maxsize, adapter._pool_block) == (2, 20, True)
+
+    def test_keep_alive_disabled(self, requests_mock):
+        """
+            Given
+            - A base client with keep alive disabled
+
+            When
+            - Making an http request
+
+            Then
+            - Ensure the request asks to close the connection
+        """
+        from CommonServerPython import BaseClient
+        requests_mock.get('http://example.com/api/v2/event', json=self.text)
+        client = BaseClient('http://example.com/api/v2/', keep_alive=False)
+        client._http_request('get', 'event')
+        assert requests_mock.last_request.headers['Connection'] == 'close'
+
+    def test_connection_stats(self):
+        """
+            Given
+            - A base client and a local HTTP server which keeps connections alive
+
+            When
+            - Making several http requests
+
+            Then
+            - Ensure the client reports a single connection opened and reused by the next requests
+        """
+        import threading
+        try:
+            from http.server import BaseHTTPRequestHandler, HTTPServer
+        except ImportError:
+            from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer  # type: ignore
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'{}')
+
+            def log_message(self, *args):
+                pass
+
+        from CommonServerPython import BaseClient
+        server = HTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            client = BaseClient('http://127.0.0.1:{}/'.format(server.server_port))
+            for _ in range(3):
+                assert client._http_request('get', 'event', proxies={'http': '', 'https': ''}) == {}
+            assert client._get_connection_stats() == {'connections_opened': 1, 'requests': 3,
+                                                      'reused_connections': 2}
+            # closes the kept alive connection, so the server can shut down
+            client._session.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_http_request_many(self, requests_mock):
+        """
+            Given
+            - A base client and requests where one fails and one is rate limited with Retry-After
+
+            When
+            - Sending the requests concurrently
+
+            Then
+            - Ensure the results are in the order of the requests, with the error of the failed request
+            - Ensure the rate limited request is sent again after the Retry-After
+        """
+        from CommonServerPython import DemistoException
+        for i in range(10):
+            requests_mock.get('http://example.com/api/v2/ip/{}'.format(i), json={'ip': i})
+        requests_mock.get('http://example.com/api/v2/ip/4', status_code=404, json={})
+        requests_mock.get('http://example.com/api/v2/ip/7', [
+            {'status_code': 429, 'headers': {'Retry-After': '0'}, 'json': {}},
+            {'status_code': 200, 'json': {'ip': 7}},
+        ])
+
+        results = self.client._http_request_many(
+            [{'method': 'GET', 'url_suffix': 'ip/{}'.format(i)} for i in range(10)], max_concurrency=3, rate_limit=1000)
+
+        assert [result for result, _ in results] == [{'ip': i} if i != 4 else None for i in range(10)]
+        assert [i for i, (_, error) in enumerate(results) if error] == [4]
+        assert isinstance(results[4][1], DemistoException)
+        assert requests_mock.call_count == 11
+
+    def test_http_request_many_max_rate_limit_retries(self, requests_mock):
+        """
+            Given
+            - A base client and a request which is always rate limited
+
+            When
+            - Sending the request with _http_request_many
+
+            Then
+            - Ensure the request is sent again up to max_rate_limit_retries times, and its error is returned
+        """
+        requests_mock.get('http://example.com/api/v2/event', status_code=429, headers={'Retry-After': '0'}, json={})
+        results = self.client._http_request_many([{'method': 'GET', 'url_suffix': 'event'}], max_rate_limit_retries=2)
+        assert results[0][0] is None
+        assert results[0][1].res.status_code == 429
+        assert requests_mock.call_count == 3
+
+    @pytest.mark.parametrize('status_code, retry_after, expected', [
+        (429, '5', 5),
+        (503, '2.5', 2.5),
+        (429, 'Thu, 01 Jan 1970 00:00:00 GMT', 0),
+        (429, None, None),
+        (500, '5', None),
+        (429, 'not a date', None),
+    ])
+    def test_get_retry_after(self, status_code, retry_after, expected):
+        from requests import Response
+        response = Response()
+        response.status_code = status_code
+        if retry_after:
+            response.headers['Retry-After'] = retry_after
+        assert self.client._get_retry_after(response) == expected
+
     def test_http_request_proxy_error(self, requests_mock):
         from CommonServerPython import DemistoException
         requests_mock.get('http://example.com/api/v2/event', exc=requests.exceptions.ProxyError)
@@ -2926,6 +3218,21 @@ def test_batch(iterable, sz, expected):
         assert expected[i] == item
 
 
+@pytest.mark.parametrize('iterable, sz, expected', batch_params)
+def test_batch_generator(iterable, sz, expected):
+    """
+    Given
+    - A generator of items.
+
+    When
+    - Running batch on the generator.
+
+    Then
+    - Ensure the batches are the same as the batches of the equivalent list.
+    """
+    assert list(batch((item for item in iterable), sz)) == expected
+
+
 regexes_test = [
     (ipv4Regex, '192.168.1.1', True),
     (ipv4Regex, '192.168.1.1/24', False),
@@ -3168,9 +3475,10 @@ def test_auto_detect_indicator_type_tldextract(mocker):
     """
     if sys.version_info.major == 3 and sys.version_info.minor >= 8:
         import tldextract as tlde
-        tlde.__version__ = '2.2.7'
+        mocker.patch.object(tlde, '__version__', '2.2.7')
 
         mocker.patch.object(tlde, 'TLDExtract')
+        mocker.patch.object(CommonServerPython, '_indicator_type_classifier', None)
 
         auto_detect_indicator_type('8')
 
@@ -3178,6 +3486,51 @@ def test_auto_detect_indicator_type_tldextract(mocker):
         assert 'cache_file' in res[1].keys()
 
 
+def test_indicator_type_classifier_classify_many(mocker):
+    """
+        Given
+            Indicator values, some of them repeating.
+
+        When
+            Classifying the indicators with the shared indicator type classifier.
+
+        Then
+            Validate the types are the same as the types returned by auto_detect_indicator_type.
+            Validate the tldextract extractor is built only once.
+    """
+    if sys.version_info.major == 3 and sys.version_info.minor >= 8:
+        import tldextract as tlde
+        mocker.patch.object(CommonServerPython, '_indicator_type_classifier', None)
+        tld_extract = mocker.spy(tlde, 'TLDExtract')
+        indicator_values = [indicator_value for indicator_value, _ in INDICATOR_VALUE_AND_TYPE] * 2
+
+        classifier = CommonServerPython.get_indicator_type_classifier()
+        indicator_types = classifier.classify_many(indicator_values)
+
+        assert indicator_types == [auto_detect_indicator_type(indicator_value) for indicator_value in indicator_values]
+        assert CommonServerPython.get_indicator_type_classifier() is classifier
+        assert tld_extract.call_count == 1
+
+
+@pytest.mark.parametrize('indicator_value', ['CVE-2021-44228', 'cve-2021-1234', 'CvE-2021-0123', 'CVE-2021-012',
+                                             'CVE-2021-01234', 'cve_2021-1234'])
+def test_indicator_type_classifier_cve_regex(indicator_value):
+    """
+        Given
+            Indicator values, valid and invalid CVE IDs in different cases.
+
+        When
+            Building the CVE pattern of the indicator type classifier from cveRegex.
+
+        Then
+            Validate the pattern matches the same values as cveRegex.
+    """
+    pattern = CommonServerPython.IndicatorTypeClassifier._case_insensitive_pattern(CommonServerPython.cveRegex)
+
+    assert '(?i)' not in pattern
+    assert bool(re.match(pattern, indicator_value)) == bool(re.match(CommonServerPython.cveRegex, indicator_value))
+
+
 def test_handle_proxy(mocker):
     os.environ['REQUESTS_CA_BUNDLE'] = '/test1.pem'
     mocker.patch.object(demisto, 'params', return_value={'insecure': True})
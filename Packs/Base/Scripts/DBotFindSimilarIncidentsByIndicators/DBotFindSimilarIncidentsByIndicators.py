@@ -3,12 +3,13 @@ from CommonServerPython import *
 from CommonServerUserPython import *
 
 from sklearn.base import BaseEstimator, TransformerMixin
+from scipy.sparse import csr_matrix
 import pandas as pd
 import numpy as np
 from collections import Counter
 import re
 import math
-from typing import List, Dict
+from typing import List, Dict, Tuple
 
 STATUS_DICT = {
     0: "Pending",
@@ -21,8 +22,8 @@ ROUND_SCORING = 2
 PLAYGROUND_PATTERN = '[a-z0-9]{8}-[a-z0-9]{4}-[a-z0-9]{4}-[a-z0-9]{4}-[a-z0-9]{12}'
 FIRST_COLUMNS_INCIDENTS_DISPLAY = ['incident ID', 'created', 'name']
 FIELDS_TO_REMOVE_TO_DISPLAY = ['id']
-INCIDENT_FIELDS_TO_USE = ['indicators']
 FIELD_INDICATOR_TYPE = 'indicator_type'
+SIMILARITY_METHODS = ['frequency', 'jaccard', 'weighted_jaccard']
 
 
 def normalize(x: List[str]) -> str:
@@ -91,92 +92,6 @@ class FrequencyIndicators(BaseEstimator, TransformerMixin):
             [self.frequency[word] for word in self.vocabulary])
 
 
-TRANSFORMATION = {
-    'frequency_indicators': {'transformer': FrequencyIndicators,
-                             'normalize': None,
-                             'scoring_function': identity_score
-                             }
-}
-
-
-class Transformer():
-    def __init__(self, p_transformer_type, incident_field, p_incidents_df, p_current_incident, p_params):
-        """
-        :param p_transformer_type: One of the key value of TRANSFORMATION dict
-        :param incident_field: incident field used in this transformation
-        :param p_incidents_df: DataFrame of incident (should contains one columns which same name than incident_field)
-        :param p_current_incident: DataFrame of the current incident
-        :param p_params: Dictionary of all the transformation - TRANSFORMATION
-        """
-        self.transformer_type = p_transformer_type
-        self.incident_field = incident_field
-        self.current_incident = p_current_incident
-        self.incidents_df = p_incidents_df
-        self.params = p_params
-
-    def fit_transform(self):
-        transformation = self.params[self.transformer_type]
-        transformer = transformation['transformer'](self.incident_field, transformation['normalize'],
-                                                    self.current_incident)
-        X_vect = transformer.fit_transform(self.incidents_df)
-        incident_vect = transformer.transform(self.current_incident)
-        return X_vect, incident_vect
-
-    def get_score(self):
-        scoring_function = self.params[self.transformer_type]['scoring_function']
-        X_vect, incident_vect = self.fit_transform()
-        distance = scoring_function(X_vect)
-        self.incidents_df['similarity %s' % self.incident_field] = np.round(distance, ROUND_SCORING)
-        return self.incidents_df
-
-
-class Model:
-    def __init__(self, p_transformation):
-        """
-        :param p_transformation: Dict with the transformers parameters - TRANSFORMATION
-        """
-        self.transformation = p_transformation
-
-    def init_prediction(self, p_incident_to_match, p_incidents_df, p_fields_for_frequencyIndicators=[]):
-        """
-        :param p_incident_to_match: Dataframe with one incident
-        :param p_incidents_df: Dataframe with all the incidents
-        :param p_fields_indicators_transformation: list of incident fields that for the transformer 'indicators'
-        :return:
-        """
-        self.incident_to_match = p_incident_to_match
-        self.incidents_df = p_incidents_df
-        self.fields_for_frequencyIndicators = p_fields_for_frequencyIndicators
-
-    def predict(self):
-        self.remove_empty_field()
-        self.get_score()
-        self.prepare_for_display()
-        return self.incidents_df
-
-    def remove_empty_field(self):
-        remove_list = []
-        for field in self.fields_for_frequencyIndicators:
-            if field not in self.incident_to_match.columns or not self.incident_to_match[field].values[
-                0] or not isinstance(self.incident_to_match[field].values[0], str) or \
-                    self.incident_to_match[field].values[0] == 'None' or \
-                    self.incident_to_match[field].values[0] == 'N/A':
-                remove_list.append(field)
-        self.fields_for_frequencyIndicators = [x for x in self.fields_for_frequencyIndicators if
-                                               x not in remove_list]
-
-    def get_score(self):
-        for field in self.fields_for_frequencyIndicators:
-            t = Transformer('frequency_indicators', field, self.incidents_df, self.incident_to_match,
-                            self.transformation)
-            t.get_score()
-
-    def prepare_for_display(self):
-        vocabulary = self.incident_to_match['indicators'].iloc[0].split(' ')
-        self.incidents_df['Identical indicators'] = self.incidents_df['indicators'].apply(
-            lambda x: ','.join([id for id in x.split(' ') if id in vocabulary]))
-
-
 def get_all_indicators_for_incident(incident_id: str) -> List[Dict]:
     """
     Get indicators for one incident
@@ -234,11 +149,98 @@ def match_indicators_incident(indicators: List[Dict], incident_ids: List[str]) -
         inv_ids = indicator.get('investigationIDs', None)
         if inv_ids:
             for inv_id in inv_ids:
-                if inv_id in d.keys():
-                    d[inv_id] = d[inv_id] + [indicator['id']]
+                if inv_id in d:
+                    d[inv_id].append(indicator['id'])
     return d
 
 
+def build_incidents_indicators_matrix(incidents_with_indicators: Dict[str, List], current_indicators: List[str]) \
+        -> Tuple[csr_matrix, List[str], List[str]]:
+    """
+    Build the binary incident x indicator sparse matrix in one pass
+    :param incidents_with_indicators: dict of {incident id : list of indicators ids related to this incident)
+    :param current_indicators: list of indicators ids of the current incident, they are the first columns
+    :return: the matrix, the incident ids of its rows and the indicators ids of its columns
+    """
+    columns = {indicator_id: i for i, indicator_id in enumerate(dict.fromkeys(current_indicators))}
+    incident_ids = list(incidents_with_indicators.keys())
+    indptr = [0]
+    indices = []  # type: List[int]
+    for inc_id in incident_ids:
+        row = {columns.setdefault(indicator_id, len(columns)) for indicator_id in incidents_with_indicators[inc_id]}
+        indices.extend(sorted(row))
+        indptr.append(len(indices))
+    matrix = csr_matrix((np.ones(len(indices)), np.array(indices, dtype=int), np.array(indptr)),
+                        shape=(len(incident_ids), len(columns)))
+    return matrix, incident_ids, list(columns)
+
+
+def compute_similarity_scores(matrix: csr_matrix, nb_current_indicators: int, method: str) -> np.ndarray:
+    """
+    Score all the incidents of the matrix against the current incident
+    frequency: weight of the mutual indicators / weight of the current incident indicators
+    jaccard: number of mutual indicators / number of indicators of both incidents
+    weighted_jaccard: weight of the mutual indicators / weight of the indicators of both incidents
+    Indicators are weighted by their scarcity among the incidents
+    :param matrix: incident x indicator matrix, the current incident indicators are the first columns
+    :param nb_current_indicators: number of indicators of the current incident
+    :param method: one of SIMILARITY_METHODS
+    :return: array of the scores of the matrix rows
+    """
+    current_incident = np.zeros(matrix.shape[1])
+    current_incident[:nb_current_indicators] = 1
+    if method == 'jaccard':
+        weights = np.ones(matrix.shape[1])
+    else:
+        document_frequency = np.asarray(matrix.sum(axis=0)).ravel() + current_incident
+        weights = np.log(1 + (matrix.shape[0] + 1) / document_frequency)
+    weighted_current_incident = weights * current_incident
+    intersection = matrix @ weighted_current_incident
+    current_incident_weight = weighted_current_incident.sum()
+    if method == 'frequency':
+        return intersection / current_incident_weight
+    union = current_incident_weight + matrix @ weights - intersection
+    return intersection / union
+
+
+def get_top_scores_rows(scores: np.ndarray, threshold: float, max_rows: int) -> np.ndarray:
+    """
+    :param scores: array of scores
+    :param threshold: threshold for similarity score
+    :param max_rows: max number of rows to return
+    :return: indexes of the rows with the highest scores above the threshold, sorted by decreasing score
+    """
+    rows = np.flatnonzero(scores > threshold)
+    if len(rows) > max_rows:
+        rows = rows[np.argpartition(-scores[rows], max_rows)[:max_rows]]
+    return rows[np.argsort(-scores[rows], kind='stable')]
+
+
+def get_similar_incidents(incidents_with_indicators: Dict[str, List], current_indicators: List[str], method: str,
+                          threshold: float, max_incidents_to_display: int) -> pd.DataFrame:
+    """
+    Find the incidents most similar to the current incident
+    :param incidents_with_indicators: dict of {incident id : list of indicators ids related to this incident)
+    :param current_indicators: list of indicators ids of the current incident
+    :param method: one of SIMILARITY_METHODS
+    :param threshold: threshold for similarity score
+    :param max_incidents_to_display: Max number of incidents we want to display
+    :return: DataFrame of the similar incidents indexed by incident id
+    """
+    matrix, incident_ids, indicators_ids = build_incidents_indicators_matrix(incidents_with_indicators,
+                                                                             current_indicators)
+    nb_current_indicators = len(set(current_indicators))
+    scores = np.round(compute_similarity_scores(matrix, nb_current_indicators, method), ROUND_SCORING)
+    rows = get_top_scores_rows(scores, threshold, max_incidents_to_display)
+    identical_indicators = [
+        ','.join(indicators_ids[col] for col in matrix.indices[matrix.indptr[row]:matrix.indptr[row + 1]]
+                 if col < nb_current_indicators)
+        for row in rows
+    ]
+    return pd.DataFrame({'Identical indicators': identical_indicators, 'similarity indicators': scores[rows]},
+                        index=[incident_ids[row] for row in rows])
+
+
 def enriched_incidents(df, fields_incident_to_display, from_date: str):
     """
     Enriched incidents with data
@@ -354,10 +356,6 @@ def get_indicators_map(indicators: List[Dict]) -> Dict[str, Dict]:
     return {ind['id']: ind for ind in indicators}
 
 
-def join(my_list: List) -> str:
-    return ' '.join(my_list)
-
-
 def organize_data(similar_incidents: pd.DataFrame, indicators_map: Dict[str, Dict], threshold: float,
                   max_incidents_to_display: int) \
         -> pd.DataFrame:
@@ -476,32 +474,29 @@ def get_incidents_ids_related_to_indicators(indicators):
 
 
 def get_related_incidents_with_indicators(incident_ids: List[str], indicators_types: List[str],
-                                          incident_id: str) -> pd.DataFrame:
+                                          incident_id: str) -> Tuple[Dict[str, List], bool]:
     """
-    Create dataframe of incident with indicators from incidents ids list
+    Get the indicators of the incidents from incidents ids list
     :param incident_ids: List if incident id
     :param indicators_types: List of indicators type
     :param incident_id: current incident (in order to remove it)
-    :return: dataframe of incident with indicators
+    :return: dict of {incident id : list of indicators ids related to this incident)
     """
     indicators_related = get_indicators_from_incident_ids(incident_ids)
     if not indicators_related:
         return_no_similar_incident_found_entry()
-        return pd.DataFrame(), True
+        return {}, True
     if indicators_types:
         indicators_related = [x for x in indicators_related if x.get(FIELD_INDICATOR_TYPE) in indicators_types]
         if not indicators_related:
             return_no_similar_incident_found_entry()
-            return pd.DataFrame(), True
+            return {}, True
     incidents_with_indicators = match_indicators_incident(indicators_related, incident_ids)
-    incidents_with_indicators_join = {k: join(v) for k, v in incidents_with_indicators.items()}
-    incidents_with_indicators_join.pop(incident_id, None)
-    if not bool(incidents_with_indicators_join):
+    incidents_with_indicators.pop(incident_id, None)
+    if not bool(incidents_with_indicators):
         return_no_similar_incident_found_entry()
-        return pd.DataFrame(), True
-    incidents_df = pd.DataFrame.from_dict(incidents_with_indicators_join, orient='index')
-    incidents_df.columns = ['indicators']
-    return incidents_df, False
+        return {}, True
+    return incidents_with_indicators, False
 
 
 def organize_current_incident(current_incident_df, indicators_map):
@@ -545,6 +540,9 @@ def main():
     fields_incident_to_display = [x.strip() for x in fields_incident_to_display if x]
     fields_incident_to_display = list(set(['created', 'name'] + fields_incident_to_display))
     from_date = demisto.args().get('fromDate')
+    similarity_method = demisto.args().get('similarityMethod') or 'frequency'
+    if similarity_method not in SIMILARITY_METHODS:
+        return_error('similarityMethod must be one of: {}'.format(', '.join(SIMILARITY_METHODS)))
 
     # load the Dcurrent incident
     incident_id = demisto.args().get('incidentId')
@@ -568,7 +566,8 @@ def main():
     _ = return_indicator_entry(incident_ids, indicators_types, indicators)
 
     # Get related incidents with indicators
-    incidents_df, early_exit = get_related_incidents_with_indicators(incident_ids, indicators_types, incident_id)
+    incidents_with_indicators, early_exit = get_related_incidents_with_indicators(incident_ids, indicators_types,
+                                                                                  incident_id)
     if early_exit:
         return
 
@@ -577,9 +576,8 @@ def main():
     current_incident_df = pd.DataFrame(indicators_for_incident, columns=['indicators'])
 
     # Prediction
-    model = Model(p_transformation=TRANSFORMATION)
-    model.init_prediction(current_incident_df, incidents_df, INCIDENT_FIELDS_TO_USE)
-    similar_incidents = model.predict()
+    similar_incidents = get_similar_incidents(incidents_with_indicators, [x.get('id') for x in indicators],
+                                              similarity_method, threshold, max_incidents_to_display)
 
     # Display and enriched incidents data
     current_incident_df = organize_current_incident(current_incident_df, indicators_map)
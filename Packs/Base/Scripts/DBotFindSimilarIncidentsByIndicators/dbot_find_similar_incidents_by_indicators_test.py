@@ -1,8 +1,8 @@
 import pandas as pd
 # from CommonServerPython import *
-# import pytest
+import pytest
 from DBotFindSimilarIncidentsByIndicators import identity_score, match_indicators_incident, get_indicators_map, \
-    FrequencyIndicators, \
+    FrequencyIndicators, build_incidents_indicators_matrix, compute_similarity_scores, get_similar_incidents, \
     get_number_of_invs_for_indicators
 
 TRANSFORMATION = {
@@ -92,3 +92,39 @@ def test_score(mocker):
     scores = res.values.tolist()
     assert (all(scores[i] >= scores[i + 1] for i in range(len(scores) - 1)))
     assert (all(scores[i] >= 0 for i in range(len(scores) - 1)))
+
+
+def test_build_incidents_indicators_matrix():
+    matrix, incident_ids, indicators_ids = build_incidents_indicators_matrix(
+        {'1': ['a', 'd', 'a'], '2': ['c', 'b'], '3': []}, ['b', 'a'])
+    assert incident_ids == ['1', '2', '3']
+    assert indicators_ids == ['b', 'a', 'd', 'c']
+    assert matrix.toarray().tolist() == [[0, 1, 1, 0], [1, 0, 0, 1], [0, 0, 0, 0]]
+
+
+def test_frequency_similarity_same_as_frequency_indicators():
+    incident = pd.DataFrame({'indicators': ['1 2 3 4 5 6']})
+    incidents = pd.DataFrame({'indicators': ['1 2', '1 3', '1 3', '4 7 8', '9']})
+    tfidf = FrequencyIndicators('indicators', None, incident)
+    tfidf.fit(incidents)
+    expected = tfidf.transform(incidents).values.tolist()
+    matrix, _, _ = build_incidents_indicators_matrix(
+        {str(i): x.split(' ') for i, x in enumerate(incidents['indicators'])}, '1 2 3 4 5 6'.split(' '))
+    assert compute_similarity_scores(matrix, 6, 'frequency') == pytest.approx(expected)
+
+
+def test_jaccard_similarity():
+    matrix, _, _ = build_incidents_indicators_matrix({'1': ['a', 'b'], '2': ['a', 'c', 'd'], '3': ['e']},
+                                                     ['a', 'b', 'c'])
+    assert compute_similarity_scores(matrix, 3, 'jaccard').tolist() == [2 / 3, 2 / 4, 0]
+    weighted_scores = compute_similarity_scores(matrix, 3, 'weighted_jaccard')
+    assert weighted_scores[0] > weighted_scores[1] > weighted_scores[2] == 0
+
+
+def test_get_similar_incidents():
+    incidents_with_indicators = {'1': ['a'], '2': ['a', 'b', 'c'], '3': ['a', 'b'], '4': ['d'], '5': ['c', 'b']}
+    similar_incidents = get_similar_incidents(incidents_with_indicators, ['a', 'b', 'c'], 'jaccard', 0, 3)
+    assert similar_incidents.index.tolist() == ['2', '3', '5']
+    assert similar_incidents['similarity indicators'].tolist() == [1, 0.67, 0.67]
+    assert similar_incidents['Identical indicators'].tolist() == ['a,b,c', 'a,b', 'b,c']
+    assert get_similar_incidents(incidents_with_indicators, ['a', 'b', 'c'], 'jaccard', 0.9, 3).index.tolist() == ['2']
@@ -7,11 +7,13 @@ import re
 from base64 import b64decode
 from flask import Flask, Response, request
 from netaddr import IPSet
-from typing import Any, Dict, cast, Iterable
+from typing import Any, Dict, cast, Iterable, IO, Iterator, Tuple, Union
 from math import ceil
 import urllib3
 import dateparser
 import hashlib
+import uuid
+from threading import Lock
 
 # Disable insecure warnings
 urllib3.disable_warnings()
@@ -31,6 +33,9 @@ EDL_MISSING_REFRESH_ERR_MSG: str = 'Refresh Rate must be "number date_range_unit
 EDL_FILTER_FIELDS: Optional[str] = "name,type"
 EDL_ON_DEMAND_KEY: str = 'UpdateEDL'
 EDL_ON_DEMAND_CACHE_PATH: str = ''
+EDL_ON_DEMAND_SNAPSHOT: Optional['EDLSnapshot'] = None
+EDL_ON_DEMAND_SNAPSHOT_LOCK: Lock = Lock()
+EDL_CHUNK_SIZE: int = 64 * 1024
 
 ''' REFORMATTING REGEXES '''
 _PROTOCOL_REMOVAL = re.compile('^(?:[a-z]+:)*//')
@@ -131,18 +136,20 @@ def create_new_edl(request_args: RequestArguments) -> str:
         size=PAGE_SIZE,
         limit=limit
     )
-    iocs = []
-    formatted_iocs: set = set()
+    # only the newly fetched indicators of each round are formatted, the IPs are collapsed once at the end,
+    # so the rounds are bounded by the number of IPs before they are collapsed
+    formatter = IndicatorsFormatter(request_args)
+    formatted_count = 0
     while True:
-        current_limit = limit + (limit - len(formatted_iocs))
+        current_limit = limit + (limit - formatted_count)
         indicator_searcher.limit = current_limit
         new_iocs = find_indicators_to_limit(indicator_searcher)
-        iocs.extend(new_iocs)
-        formatted_iocs = format_indicators(iocs, request_args)
+        formatter.add(new_iocs)
+        formatted_count = formatter.formatted_count()
         # continue searching iocs if 1) iocs was truncated or 2) got all available iocs
-        if len(formatted_iocs) >= len(iocs) or indicator_searcher.total <= current_limit:
+        if formatted_count >= formatter.iocs_count or indicator_searcher.total <= current_limit:
             break
-    return iterable_to_str(list(formatted_iocs)[request_args.offset:limit])
+    return iterable_to_str(list(formatter.formatted_indicators())[request_args.offset:limit])
 
 
 def find_indicators_to_limit(indicator_searcher: IndicatorsSearcher) -> List[dict]:
@@ -227,6 +234,99 @@ def ips_to_ranges(ips: Iterable, collapse_ips: str):
         return ip_groups_to_cidrs(cidrs)
 
 
+class IndicatorsFormatter:
+    """
+    Formats indicators incrementally, so indicators which were already formatted are not processed again when
+    more indicators are fetched.
+    The IPs to collapse are kept in running sets and are collapsed to ranges/CIDRs once, when all the indicators
+    were added.
+    """
+
+    def __init__(self, request_args: RequestArguments):
+        self.request_args = request_args
+        self.iocs_count = 0
+        self._formatted_indicators: set = set()
+        self._ipv4_indicators: set = set()
+        self._ipv6_indicators: set = set()
+
+    def add(self, iocs: list):
+        """
+        Formats the given indicators and adds them to the running formatted set
+         * IP / CIDR:
+             1) if collapse_ips, collapse IPs/CIDRs
+         * URL:
+             1) if drop_invalids, drop invalids (length > 254 or has invalid chars)
+        * Other indicator types:
+            1) if drop_invalids, drop invalids (has invalid chars)
+            2) if port_stripping, strip ports
+        """
+        self.iocs_count += len(iocs)
+        request_args = self.request_args
+        formatted_indicators = self._formatted_indicators
+        for ioc in iocs:
+            indicator = ioc.get('value')
+            if not indicator:
+                continue
+            ioc_type = ioc.get('indicator_type')
+            # protocol stripping
+            indicator = _PROTOCOL_REMOVAL.sub('', indicator)
+
+            if ioc_type not in [FeedIndicatorType.IP, FeedIndicatorType.IPv6,
+                                FeedIndicatorType.CIDR, FeedIndicatorType.IPv6CIDR]:
+                # Port stripping
+                indicator_with_port = indicator
+                # remove port from indicator - from demisto.com:369/rest/of/path -> demisto.com/rest/of/path
+                indicator = _PORT_REMOVAL.sub(_URL_WITHOUT_PORT, indicator)
+                # check if removing the port changed something about the indicator
+                if indicator != indicator_with_port and not request_args.url_port_stripping:
+                    # if port was in the indicator and url_port_stripping param not set - ignore the indicator
+                    continue
+                # Reformatting to PAN-OS URL format
+                with_invalid_tokens_indicator = indicator
+                # mix of text and wildcard in domain field handling
+                indicator = _INVALID_TOKEN_REMOVAL.sub('*', indicator)
+                # check if the indicator held invalid tokens
+                if request_args.drop_invalids:
+                    if with_invalid_tokens_indicator != indicator:
+                        # invalid tokens in indicator - ignore the indicator
+                        continue
+                    if ioc_type == FeedIndicatorType.URL and len(indicator) >= PAN_OS_MAX_URL_LEN:
+                        # URL indicator exceeds allowed length - ignore the indicator
+                        continue
+
+                # for PAN-OS *.domain.com does not match domain.com
+                # we should provide both
+                # this could generate more than num entries according to PAGE_SIZE
+                if indicator.startswith('*.'):
+                    formatted_indicators.add(indicator.lstrip('*.'))
+
+            if request_args.collapse_ips != DONT_COLLAPSE and ioc_type in (FeedIndicatorType.IP,
+                                                                           FeedIndicatorType.CIDR):
+                self._ipv4_indicators.add(indicator)
+
+            elif request_args.collapse_ips != DONT_COLLAPSE and ioc_type == FeedIndicatorType.IPv6:
+                self._ipv6_indicators.add(indicator)
+
+            else:
+                formatted_indicators.add(indicator)
+
+    def formatted_count(self) -> int:
+        """
+        Returns the number of formatted indicators, counting the IPs to collapse before they are collapsed.
+        """
+        return len(self._formatted_indicators) + len(self._ipv4_indicators) + len(self._ipv6_indicators)
+
+    def formatted_indicators(self) -> set:
+        """
+        Returns the formatted indicators, with the IPs collapsed to ranges/CIDRs.
+        Should be called once all the indicators were added, as the collapsed IPs are added to the running set.
+        """
+        for ips in (self._ipv4_indicators, self._ipv6_indicators):
+            if ips:
+                self._formatted_indicators.update(ips_to_ranges(ips, self.request_args.collapse_ips))
+        return self._formatted_indicators
+
+
 def format_indicators(iocs: list, request_args: RequestArguments) -> set:
     """
     Create a list result of formatted_indicators
@@ -240,82 +340,96 @@ def format_indicators(iocs: list, request_args: RequestArguments) -> set:
         1) if drop_invalids, drop invalids (has invalid chars)
         2) if port_stripping, strip ports
     """
-    formatted_indicators = set()
-    ipv4_formatted_indicators = set()
-    ipv6_formatted_indicators = set()
-    for ioc in iocs:
-        indicator = ioc.get('value')
-        if not indicator:
-            continue
-        ioc_type = ioc.get('indicator_type')
-        # protocol stripping
-        indicator = _PROTOCOL_REMOVAL.sub('', indicator)
-
-        if ioc_type not in [FeedIndicatorType.IP, FeedIndicatorType.IPv6,
-                            FeedIndicatorType.CIDR, FeedIndicatorType.IPv6CIDR]:
-            # Port stripping
-            indicator_with_port = indicator
-            # remove port from indicator - from demisto.com:369/rest/of/path -> demisto.com/rest/of/path
-            indicator = _PORT_REMOVAL.sub(_URL_WITHOUT_PORT, indicator)
-            # check if removing the port changed something about the indicator
-            if indicator != indicator_with_port and not request_args.url_port_stripping:
-                # if port was in the indicator and url_port_stripping param not set - ignore the indicator
-                continue
-            # Reformatting to PAN-OS URL format
-            with_invalid_tokens_indicator = indicator
-            # mix of text and wildcard in domain field handling
-            indicator = _INVALID_TOKEN_REMOVAL.sub('*', indicator)
-            # check if the indicator held invalid tokens
-            if request_args.drop_invalids:
-                if with_invalid_tokens_indicator != indicator:
-                    # invalid tokens in indicator - ignore the indicator
-                    continue
-                if ioc_type == FeedIndicatorType.URL and len(indicator) >= PAN_OS_MAX_URL_LEN:
-                    # URL indicator exceeds allowed length - ignore the indicator
-                    continue
+    formatter = IndicatorsFormatter(request_args)
+    formatter.add(iocs)
+    return formatter.formatted_indicators()
 
-            # for PAN-OS *.domain.com does not match domain.com
-            # we should provide both
-            # this could generate more than num entries according to PAGE_SIZE
-            if indicator.startswith('*.'):
-                formatted_indicators.add(indicator.lstrip('*.'))
 
-        if request_args.collapse_ips != DONT_COLLAPSE and ioc_type in (FeedIndicatorType.IP, FeedIndicatorType.CIDR):
-            ipv4_formatted_indicators.add(indicator)
+class EDLSnapshot:
+    """
+    An EDL stored in a file, with the metadata served with it, so the EDL can be served without reading or hashing
+    its content on every request.
+    """
 
-        elif request_args.collapse_ips != DONT_COLLAPSE and ioc_type == FeedIndicatorType.IPv6:
-            ipv6_formatted_indicators.add(indicator)
+    def __init__(self, path: str, etag: str, edl_size: int, content_length: int, created: datetime):
+        self.path = path
+        self.etag = etag
+        self.edl_size = edl_size
+        self.content_length = content_length
+        self.created = created
 
-        else:
-            formatted_indicators.add(indicator)
+    @classmethod
+    def from_edl(cls, path: str, edl: str, created: datetime):
+        """Returns the snapshot of an EDL which is stored in the given path"""
+        return cls(path=path, etag=get_edl_etag(edl), edl_size=get_edl_size(edl), content_length=len(edl.encode()),
+                   created=created)
 
-    if len(ipv4_formatted_indicators) > 0:
-        ipv4_formatted_indicators = ips_to_ranges(ipv4_formatted_indicators, request_args.collapse_ips)
-        formatted_indicators.update(ipv4_formatted_indicators)
 
-    if len(ipv6_formatted_indicators) > 0:
-        ipv6_formatted_indicators = ips_to_ranges(ipv6_formatted_indicators, request_args.collapse_ips)
-        formatted_indicators.update(ipv6_formatted_indicators)
-    return formatted_indicators
+def get_edl_etag(edl: str) -> str:
+    return hashlib.sha1(edl.encode()).hexdigest()  # guardrails-disable-line
+
+
+def get_edl_size(edl: str) -> int:
+    edl_size = 0
+    if edl.strip():
+        edl_size = edl.count('\n') + 1  # add 1 as last line doesn't have a \n
+    return edl_size
 
 
-def get_edl_on_demand():
+def store_edl_snapshot(edl: str) -> EDLSnapshot:
     """
-    Use the local file system to store the on-demand result, using a lock to
-    limit access to the file from multiple threads.
+    Writes the EDL to a new file and atomically swaps it with the current snapshot.
+    Requests which already opened the previous snapshot keep reading its (unlinked) file.
+    """
+    global EDL_ON_DEMAND_SNAPSHOT
+    snapshot = EDLSnapshot.from_edl(EDL_ON_DEMAND_CACHE_PATH, edl, datetime.now(timezone.utc))
+    tmp_path = f'{EDL_ON_DEMAND_CACHE_PATH}.{uuid.uuid4().hex}'
+    with open(tmp_path, 'wb') as file:
+        file.write(edl.encode())
+    with EDL_ON_DEMAND_SNAPSHOT_LOCK:
+        os.replace(tmp_path, EDL_ON_DEMAND_CACHE_PATH)
+        EDL_ON_DEMAND_SNAPSHOT = snapshot
+    return snapshot
+
+
+def open_edl_snapshot() -> Tuple[EDLSnapshot, IO[bytes]]:
+    """
+    Opens the current snapshot file, the snapshot and the file are taken together so they always match.
+    """
+    global EDL_ON_DEMAND_SNAPSHOT
+    with EDL_ON_DEMAND_SNAPSHOT_LOCK:
+        if EDL_ON_DEMAND_SNAPSHOT is None or EDL_ON_DEMAND_SNAPSHOT.path != EDL_ON_DEMAND_CACHE_PATH:
+            # the EDL was stored by a previous process - compute its metadata once
+            with open(EDL_ON_DEMAND_CACHE_PATH, 'r') as file:
+                EDL_ON_DEMAND_SNAPSHOT = EDLSnapshot.from_edl(EDL_ON_DEMAND_CACHE_PATH, file.read(),
+                                                              datetime.now(timezone.utc))
+        return EDL_ON_DEMAND_SNAPSHOT, open(EDL_ON_DEMAND_SNAPSHOT.path, 'rb')
+
+
+def iterate_file(file: IO[bytes], chunk_size: int = EDL_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Streams the file content in chunks and closes it when done.
+    """
+    with file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            yield chunk
+
+
+def get_edl_on_demand() -> Tuple[EDLSnapshot, IO[bytes]]:
+    """
+    Use the local file system to store the on-demand result, the EDL is refreshed into a new snapshot
+    when the refresh signal is in the context.
+
+    Returns: The current EDL snapshot and its opened file.
     """
     ctx = get_integration_context()
     if EDL_ON_DEMAND_KEY in ctx:
         ctx.pop(EDL_ON_DEMAND_KEY, None)
         request_args = RequestArguments.from_context_json(ctx)
         edl = create_new_edl(request_args)
-        with open(EDL_ON_DEMAND_CACHE_PATH, 'w') as file:
-            file.write(edl)
+        store_edl_snapshot(edl)
         set_integration_context(ctx)
-    else:
-        with open(EDL_ON_DEMAND_CACHE_PATH, 'r') as file:
-            edl = file.read()
-    return edl
+    return open_edl_snapshot()
 
 
 def validate_basic_authentication(headers: dict, username: str, password: str) -> bool:
@@ -370,24 +484,44 @@ def route_edl() -> Response:
 
     request_args = get_request_args(request.args, params)
     on_demand = params.get('on_demand')
-    created = datetime.now(timezone.utc)
-    edl = get_edl_on_demand() if on_demand else create_new_edl(request_args)
-    etag = f'"{hashlib.sha1(edl.encode()).hexdigest()}"'  # guardrails-disable-line
-    query_time = (datetime.now(timezone.utc) - created).total_seconds()
-    edl_size = 0
-    if edl.strip():
-        edl_size = edl.count('\n') + 1  # add 1 as last line doesn't have a \n
-    if len(edl) == 0 and request_args.add_comment_if_empty:
-        edl = '# Empty EDL'
+    request_time = datetime.now(timezone.utc)
+    edl_file: Optional[IO[bytes]] = None
+    if on_demand:
+        # the snapshot ETag and size were computed when it was stored, its content is streamed from the file
+        snapshot, edl_file = get_edl_on_demand()
+        edl: Union[str, Iterator[bytes]] = ''
+    else:
+        edl = create_new_edl(request_args)
+        snapshot = EDLSnapshot.from_edl('', edl, request_time)
+    created = snapshot.created
+    etag = f'"{snapshot.etag}"'
+    edl_size = snapshot.edl_size
+    query_time = (datetime.now(timezone.utc) - request_time).total_seconds()
     max_age = ceil((datetime.now() - dateparser.parse(cache_refresh_rate)).total_seconds())  # type: ignore[operator]
-    demisto.debug(f'Returning edl of size: [{edl_size}], created: [{created}], query time seconds: [{query_time}],'
-                  f' max age: [{max_age}], etag: [{etag}]')
-    resp = Response(edl, status=200, mimetype='text/plain', headers=[
-        ('X-EDL-Created', created.isoformat()),
-        ('X-EDL-Query-Time-Secs', "{:.3f}".format(query_time)),
-        ('X-EDL-Size', str(edl_size)),
-        ('ETag', etag),
-    ])
+
+    headers = [('ETag', etag)]
+    if request.if_none_match.contains(snapshot.etag):
+        demisto.debug(f'Returning not modified edl, etag: [{etag}]')
+        if edl_file:
+            edl_file.close()
+        status = 304
+    else:
+        status = 200
+        if snapshot.content_length == 0 and request_args.add_comment_if_empty:
+            if edl_file:
+                edl_file.close()
+            edl = '# Empty EDL'
+        elif edl_file:
+            edl = iterate_file(edl_file)
+            headers.append(('Content-Length', str(snapshot.content_length)))
+        demisto.debug(f'Returning edl of size: [{edl_size}], created: [{created}], query time seconds: [{query_time}],'
+                      f' max age: [{max_age}], etag: [{etag}]')
+        headers.extend([
+            ('X-EDL-Created', created.isoformat()),
+            ('X-EDL-Query-Time-Secs', "{:.3f}".format(query_time)),
+            ('X-EDL-Size', str(edl_size)),
+        ])
+    resp = Response(edl if status == 200 else None, status=status, mimetype='text/plain', headers=headers)
     resp.cache_control.max_age = max_age
     resp.cache_control[
         'stale-if-error'] = '600'  # number of seconds we are willing to serve stale content when there is an error
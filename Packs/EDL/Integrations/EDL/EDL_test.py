@@ -72,10 +72,14 @@ class TestHelperFunctions:
         import EDL as edl
         edl.EDL_ON_DEMAND_CACHE_PATH = 'EDL_test/TestHelperFunctions/iocs_cache_values_text.txt'
         mocker.patch.object(edl, 'get_integration_context', return_value={})
-        actual_edl = edl.get_edl_on_demand()
+        snapshot, edl_file = edl.get_edl_on_demand()
+        with edl_file:
+            actual_edl = edl_file.read().decode()
         with open(edl.EDL_ON_DEMAND_CACHE_PATH, 'r') as f:
             expected_edl = f.read()
             assert actual_edl == expected_edl
+            assert snapshot.etag == edl.get_edl_etag(expected_edl)
+            assert snapshot.edl_size == edl.get_edl_size(expected_edl)
 
     def test_get_edl_on_demand__with_refresh_signal(self, mocker):
         """
@@ -94,10 +98,46 @@ class TestHelperFunctions:
         edl.EDL_ON_DEMAND_CACHE_PATH = os.path.join(tmp_dir, 'cache')
         mocker.patch.object(edl, 'get_integration_context', return_value=ctx)
         mocker.patch.object(edl, 'create_new_edl', return_value=expected_edl)
-        actual_edl = edl.get_edl_on_demand()
+        snapshot, edl_file = edl.get_edl_on_demand()
+        with edl_file:
+            actual_edl = edl_file.read().decode()
         with open(edl.EDL_ON_DEMAND_CACHE_PATH, 'r') as f:
             cached_edl = f.read()
             assert actual_edl == expected_edl == cached_edl
+        assert snapshot.etag == edl.get_edl_etag(expected_edl)
+        assert snapshot.edl_size == 1
+        assert snapshot.content_length == len(expected_edl)
+        assert os.listdir(tmp_dir) == ['cache']
+
+    def test_route_edl__on_demand_snapshot(self, mocker):
+        """
+        Test the on demand EDL is served from the stored snapshot
+        Given:
+            - A stored EDL snapshot
+        When:
+            - Requesting the EDL, with and without the snapshot ETag in If-None-Match
+        Then:
+            - Return the snapshot content with its precomputed ETag and size
+            - Return 304 without a body when the ETag matches
+        """
+        import EDL as edl
+        tmp_dir = mkdtemp()
+        edl.EDL_ON_DEMAND_CACHE_PATH = os.path.join(tmp_dir, 'cache')
+        snapshot = edl.store_edl_snapshot('1.1.1.1\n8.8.8.8')
+        mocker.patch.object(edl.demisto, 'params', return_value={'on_demand': True, 'cache_refresh_rate': '5 minutes'})
+        mocker.patch.object(edl, 'get_integration_context', return_value={})
+
+        with edl.APP.test_client() as client:
+            response = client.get('/')
+            assert response.status_code == 200
+            assert response.data == b'1.1.1.1\n8.8.8.8'
+            assert response.headers['ETag'] == f'"{snapshot.etag}"'
+            assert response.headers['X-EDL-Size'] == '2'
+            assert response.headers['X-EDL-Created'] == snapshot.created.isoformat()
+
+            response = client.get('/', headers={'If-None-Match': f'"{snapshot.etag}"'})
+            assert response.status_code == 304
+            assert response.data == b''
 
     def test_iterable_to_str_1(self):
         """Test invalid"""
@@ -224,6 +264,43 @@ class TestHelperFunctions:
         assert 'domain.com' in returned_output  # PAN-OS URLs
         assert len(returned_output) == 6
 
+    def test_indicators_formatter__incremental(self):
+        """
+        Given
+        - IP, IPv6, CIDR and URL indicators, split into several search rounds.
+
+        When
+        - Adding the rounds one by one to an IndicatorsFormatter.
+
+        Then
+        - Ensure the formatted count counts the IPs before they are collapsed after each round.
+        - Ensure the result is the same as formatting all the indicators at once.
+        """
+        from EDL import IndicatorsFormatter, format_indicators, RequestArguments, COLLAPSE_TO_CIDR
+        iocs = [
+            {'value': '1.1.1.1', 'indicator_type': 'IP'},
+            {'value': 'demisto.com:369/rest/of/path', 'indicator_type': 'URL'},
+            {'value': '1.1.1.2', 'indicator_type': 'IP'},
+            {'value': '*.domain.com', 'indicator_type': 'URL'},
+            {'value': '1.1.1.3', 'indicator_type': 'IP'},
+            {'value': '1:1:1:1:1:1:1:1', 'indicator_type': 'IPv6'},
+            {'value': '1.1.1.0/30', 'indicator_type': 'CIDR'},
+        ]
+        request_args = RequestArguments(query='', url_port_stripping=True, collapse_ips=COLLAPSE_TO_CIDR)
+        formatter = IndicatorsFormatter(request_args)
+
+        formatter.add(iocs[:3])
+        assert formatter.formatted_count() == 3
+        formatter.add(iocs[3:5])
+        assert formatter.formatted_count() == 6
+        formatter.add(iocs[5:])
+        assert formatter.formatted_count() == 8
+        assert formatter.iocs_count == len(iocs)
+
+        assert formatter.formatted_indicators() == format_indicators(iocs, request_args) == {
+            'demisto.com/rest/of/path', '*.domain.com', 'domain.com', '1.1.1.0/30', '1:1:1:1:1:1:1:1'
+        }
+
     def test_validate_basic_authentication(self):
         """Test Authentication"""
         from EDL import validate_basic_authentication
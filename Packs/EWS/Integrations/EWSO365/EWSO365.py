@@ -21,6 +21,7 @@ import email
 from requests.exceptions import ConnectionError
 
 from multiprocessing import Process
+from concurrent.futures import ThreadPoolExecutor
 import exchangelib
 from exchangelib.errors import (
     ErrorItemNotFound,
@@ -65,6 +66,9 @@ warnings.filterwarnings("ignore")
 APP_NAME = "ms-ews-o365"
 FOLDER_ID_LEN = 120
 MAX_INCIDENTS_PER_FETCH = 50
+MAX_CONCURRENT_ATTACHMENT_DOWNLOADS = 5
+# message fields which are not used when creating incidents, and are not loaded when fetching
+FETCH_EXCLUDED_FIELDS = {"mime_content"}
 FETCH_TIME = demisto.params().get('fetch_time') or '10 minutes'
 
 # move results
@@ -222,6 +226,8 @@ class EWSClient:
             "auth_type": OAUTH2,
             "version": Version(EXCHANGE_O365),
             "service_endpoint": "https://outlook.office365.com/EWS/Exchange.asmx",
+            # allow the fetch attachments downloads to run in parallel
+            "max_connections": MAX_CONCURRENT_ATTACHMENT_DOWNLOADS,
         }
 
         return Configuration(**config_args)
@@ -2161,6 +2167,7 @@ def fetch_emails_as_incidents(client: EWSClient, last_run):
         incidents = []
         incident: Dict[str, str] = {}
         demisto.debug(f'{APP_NAME} - Started fetch with {len(last_emails)} at {last_run.get(LAST_RUN_TIME)}')
+        load_attachments(last_emails)
         current_fetch_ids = set()
         for item in last_emails:
             if item.message_id:
@@ -2221,22 +2228,24 @@ def fetch_last_emails(
         client: EWSClient, folder_name="Inbox", since_datetime=None, exclude_ids=None
 ):
     """
-    Fetches last emails
+    Fetches last emails.
+    The folder is first queried for the ids and receive times only, and then the selected emails are loaded
+    in bulk with the fields needed to create the incidents.
     :param client: EWS client
     :param (Optional) folder_name: folder name to pull from
     :param (Optional) since_datetime: items will be searched after this datetime
     :param (Optional) exclude_ids: exclude ids from fetch
     :return: list of exchangelib.Items
     """
-    qs = client.get_folder_by_path(folder_name, is_public=client.is_public_folder)
+    folder = client.get_folder_by_path(folder_name, is_public=client.is_public_folder)
     if since_datetime:
-        qs = qs.filter(datetime_received__gte=since_datetime)
+        qs = folder.filter(datetime_received__gte=since_datetime)
     else:
         tz = EWSTimeZone('UTC')
         first_fetch_datetime = dateparser.parse(FETCH_TIME)
         first_fetch_ews_datetime = EWSDateTime.from_datetime(first_fetch_datetime.replace(tzinfo=tz))
-        qs = qs.filter(last_modified_time__gte=first_fetch_ews_datetime)
-    qs = qs.filter().only(*[x.name for x in Message.FIELDS])
+        qs = folder.filter(last_modified_time__gte=first_fetch_ews_datetime)
+    qs = qs.filter().only("message_id", "datetime_received")
     qs = qs.filter().order_by("datetime_received")
 
     result = []
@@ -2251,7 +2260,43 @@ def fetch_last_emails(
             demisto.debug(f'message_id {item.message_id} was excluded. IsMessage: {isinstance(item, Message)}')
 
     demisto.debug(f'{APP_NAME} - Got total of {len(result)} from ews query.')
-    return result
+    if not result:
+        return result
+
+    fields = [x.name for x in Message.FIELDS if x.name not in FETCH_EXCLUDED_FIELDS]
+    # items deleted since they were listed are returned as errors
+    return [
+        item for item in folder.account.fetch(ids=result, folder=folder, only_fields=fields)
+        if isinstance(item, Message)
+    ]
+
+
+def load_attachments(items, max_workers=MAX_CONCURRENT_ATTACHMENT_DOWNLOADS):
+    """
+    Downloads the attachments of the given items in parallel
+    Attachments which failed to download are loaded again when they are accessed
+    :param items: list of exchangelib.Items
+    :param max_workers: max number of attachments downloaded at the same time
+    :return: None
+    """
+    attachments = [
+        attachment for item in items for attachment in (item.attachments or [])
+        if isinstance(attachment, (FileAttachment, ItemAttachment))
+    ]
+    if not attachments:
+        return
+
+    def load_attachment(attachment):
+        try:
+            if isinstance(attachment, FileAttachment):
+                attachment.content
+            else:
+                attachment.item
+        except Exception as e:
+            demisto.debug(f'{APP_NAME} - Failed to download attachment {attachment.name}: {e}')
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(attachments))) as executor:
+        list(executor.map(load_attachment, attachments))
 
 
 def test_module(client: EWSClient, max_fetch):
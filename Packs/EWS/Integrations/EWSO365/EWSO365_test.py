@@ -4,14 +4,14 @@ import demistomock as demisto
 
 import pytest
 from exchangelib import EWSDate, EWSDateTime, EWSTimeZone
-from exchangelib.attachments import AttachmentId, ItemAttachment
+from exchangelib.attachments import AttachmentId, FileAttachment, ItemAttachment
 from exchangelib.items import Item, Message
 from freezegun import freeze_time
 
 from EWSO365 import (ExpandGroup, GetSearchableMailboxes, fetch_emails_as_incidents,
                      add_additional_headers, fetch_last_emails, find_folders,
                      get_expanded_group, get_searchable_mailboxes, handle_html,
-                     handle_transient_files, parse_incident_from_item)
+                     handle_transient_files, load_attachments, parse_incident_from_item)
 
 with open("test_data/commands_outputs.json", "r") as f:
     COMMAND_OUTPUTS = json.load(f)
@@ -45,6 +45,9 @@ class TestNormalCommands:
             def all(self):
                 return self.all_res
 
+            def fetch(self, ids, folder=None, only_fields=None):
+                return ids
+
         def __init__(self):
             self.default_target_mailbox = ""
             self.client_id = ""
@@ -229,6 +232,9 @@ def test_last_run(mocker, current_last_run, messages, expected_last_run):
     """
 
     class MockObject:
+        def __init__(self):
+            self.account = TestNormalCommands.MockClient.MockAccount()
+
         def filter(self, last_modified_time__gte='', datetime_received__gte=''):
             return MockObject2()
 
@@ -380,6 +386,9 @@ def test_fetch_last_emails(mocker, since_datetime, filter_arg, expected_result):
         - Verify datetime_received__gte according to the datetime received
     """
     class MockObject:
+        def __init__(self):
+            self.account = TestNormalCommands.MockClient.MockAccount()
+
         def filter(self, last_modified_time__gte='', datetime_received__gte=''):
             return MockObject2()
 
@@ -425,6 +434,9 @@ def test_fetch_last_emails_max_fetch(max_fetch, expected_result):
         - Return 5 emails
     """
     class MockObject:
+        def __init__(self):
+            self.account = TestNormalCommands.MockClient.MockAccount()
+
         def filter(self, last_modified_time__gte='', datetime_received__gte=''):
             return MockObject2()
 
@@ -505,3 +517,83 @@ def test_parse_incident_from_item_with_attachments():
     )
     incident = parse_incident_from_item(message)
     assert incident['attachment']
+
+
+def test_fetch_last_emails_two_phase(mocker):
+    """
+    Given:
+        - A folder with 5 emails, one of them already fetched
+        - Max fetch is 2
+
+    When:
+        - Fetching last emails
+
+    Then:
+        - Verify the folder is queried for the message ids and receive times only
+        - Verify only the selected emails are loaded, without their mime content
+    """
+    messages = [Message(message_id=f'message{i}') for i in range(5)]
+
+    class MockObject:
+        def __init__(self):
+            self.account = TestNormalCommands.MockClient.MockAccount()
+
+        def filter(self, last_modified_time__gte='', datetime_received__gte=''):
+            return MockObject2()
+
+    class MockObject2:
+        def filter(self):
+            return self
+
+        def only(self, *args):
+            return self
+
+        def order_by(self, *args):
+            return messages
+
+    folder = MockObject()
+    client = TestNormalCommands.MockClient()
+    client.max_fetch = 2
+    client.get_folder_by_path = lambda path, account=None, is_public=False: folder
+    only = mocker.spy(MockObject2, 'only')
+    fetch = mocker.spy(folder.account, 'fetch')
+
+    emails = fetch_last_emails(client, since_datetime='2021-05-23 21:28:14.901293+00:00', exclude_ids={'message0'})
+
+    assert only.call_args[0][1:] == ('message_id', 'datetime_received')
+    assert fetch.call_args[1]['ids'] == messages[1:3]
+    assert 'mime_content' not in fetch.call_args[1]['only_fields']
+    assert 'attachments' in fetch.call_args[1]['only_fields']
+    assert emails == messages[1:3]
+
+
+def test_load_attachments(mocker):
+    """
+    Given:
+        - Messages with file attachments, one of them fails to download
+
+    When:
+        - Loading the attachments of the fetched messages
+
+    Then:
+        - Verify every attachment is downloaded once
+        - Verify the failure does not stop the other downloads
+    """
+    loaded = []
+
+    def get_content(attachment):
+        if attachment.name == 'bad':
+            raise Exception('download failed')
+        loaded.append(attachment.name)
+        return b'content'
+
+    mocker.patch.object(FileAttachment, 'content', new=property(get_content))
+    messages = [
+        Message(attachments=[FileAttachment(name='file1'), FileAttachment(name='bad')]),
+        Message(attachments=[FileAttachment(name='file2'), FileAttachment(name='file3')]),
+        Message(),
+    ]
+
+    load_attachments(messages, max_workers=2)
+
+    assert sorted(loaded) == ['file1', 'file2', 'file3']
@@ -7,13 +7,14 @@ import re
 from base64 import b64decode
 from flask import Flask, Response, request
 from netaddr import IPAddress, IPSet
-from typing import Callable, Any, cast, Dict, Tuple
+from typing import Callable, Any, cast, Dict, Iterator, Tuple
 from math import ceil
 import dateparser
 
 ''' GLOBAL VARIABLES '''
 INTEGRATION_NAME: str = 'Export Indicators Service'
 PAGE_SIZE: int = 200
+IDS_QUERY_SIZE: int = 500
 APP: Flask = Flask('demisto-export_iocs')
 CTX_VALUES_KEY: str = 'dmst_export_iocs_values'
 CTX_MIMETYPE_KEY: str = 'dmst_export_iocs_mimetype'
@@ -177,34 +178,38 @@ def refresh_outbound_context(request_args: RequestArguments, on_demand: bool = F
     """
     Refresh the values and format using an indicator_query to call demisto.searchIndicators
     Update integration cache only in case of running on demand
+    The IoCs are kept in the integration cache by their IDs, along with the formatted output and the request arguments
+    it was created by
     Returns: List(IoCs in output format)
     """
     now = datetime.now()
     # poll indicators into list from demisto
-    iocs = []
-    out_dict: dict = {}
-    limit = request_args.offset + request_args.limit
     indicator_searcher = IndicatorsSearcher(
         query=request_args.query,
         size=PAGE_SIZE
     )
-    while True:
-        indicator_searcher.limit = limit + 100  # fetch more indicators to reduce chances of search after truncation
-        new_iocs = find_indicators_with_limit(indicator_searcher)[request_args.offset:limit]
-        if not new_iocs:
-            break
-        iocs += new_iocs
-        iocs = sort_iocs(request_args, iocs)
-        # reformat the output
-        out_dict, actual_indicator_amount = create_values_for_returned_dict(iocs, request_args)
-        if request_args.out_format in [FORMAT_CSV, FORMAT_XSOAR_CSV]:
-            actual_indicator_amount = actual_indicator_amount - 1
-        if actual_indicator_amount >= len(iocs) or (indicator_searcher.total and indicator_searcher.total <= limit):
-            # continue searching iocs if 1) iocs was truncated or 2) got all available iocs
-            break
-        # advance search window with gap size
-        limit += (limit - actual_indicator_amount)
+    iocs = find_indicators_to_format(indicator_searcher, request_args)
+    iocs = sort_iocs(request_args, iocs)
+    out_dict: dict = {}
+    if iocs:
+        out_dict, _ = create_values_for_returned_dict(iocs, request_args)
+    set_output_mimetype(out_dict, request_args)
 
+    if on_demand:
+        set_integration_context({
+            "last_output": out_dict,
+            'last_run': date_to_timestamp(now),
+            'last_query': request_args.query,
+            'current_ioc_ids': [ioc.get('id') for ioc in iocs],
+            **get_request_args_context(request_args),
+        })
+    return out_dict[CTX_VALUES_KEY] if CTX_VALUES_KEY in out_dict else []
+
+
+def set_output_mimetype(out_dict: dict, request_args: RequestArguments):
+    """
+    Sets the mimetype of the output format in the output dict
+    """
     if request_args.out_format == FORMAT_JSON:
         out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_JSON
 
@@ -221,26 +226,25 @@ def refresh_outbound_context(request_args: RequestArguments, on_demand: bool = F
     else:
         out_dict[CTX_MIMETYPE_KEY] = MIMETYPE_TEXT
 
-    if on_demand:
-        set_integration_context({
-            "last_output": out_dict,
-            'last_run': date_to_timestamp(now),
-            'last_limit': request_args.limit,
-            'last_offset': request_args.offset,
-            'last_format': request_args.out_format,
-            'last_query': request_args.query,
-            'current_iocs': iocs,
-            'mwg_type': request_args.mwg_type,
-            'drop_invalids': request_args.drop_invalids,
-            'strip_port': request_args.strip_port,
-            'category_default': request_args.category_default,
-            'category_attribute': request_args.category_attribute,
-            'collapse_ips': request_args.collapse_ips,
-            'csv_text': request_args.csv_text,
-            'sort_field': request_args.sort_field,
-            'sort_order': request_args.sort_order,
-        })
-    return out_dict[CTX_VALUES_KEY] if CTX_VALUES_KEY in out_dict else []
+
+def get_request_args_context(request_args: RequestArguments) -> dict:
+    """
+    Returns: The request arguments the output is created by, as kept in the integration cache
+    """
+    return {
+        'last_limit': request_args.limit,
+        'last_offset': request_args.offset,
+        'last_format': request_args.out_format,
+        'mwg_type': request_args.mwg_type,
+        'drop_invalids': request_args.drop_invalids,
+        'strip_port': request_args.strip_port,
+        'category_default': request_args.category_default,
+        'category_attribute': request_args.category_attribute,
+        'collapse_ips': request_args.collapse_ips,
+        'csv_text': request_args.csv_text,
+        'sort_field': request_args.sort_field,
+        'sort_order': request_args.sort_order,
+    }
 
 
 def find_indicators_with_limit(indicator_searcher: IndicatorsSearcher) -> list:
@@ -248,12 +252,95 @@ def find_indicators_with_limit(indicator_searcher: IndicatorsSearcher) -> list:
     Finds indicators using demisto.searchIndicators
     """
     iocs: List[dict] = []
-    for ioc_res in indicator_searcher:
-        fetched_iocs = ioc_res.get('iocs') or []
+    for fetched_iocs in find_indicators_pages(indicator_searcher):
         iocs.extend(fetched_iocs)
     return iocs
 
 
+def find_indicators_by_ids(ioc_ids: list) -> list:
+    """
+    Finds indicators by their IDs using demisto.searchIndicators
+    Returns: List of the found IoCs, in the order of the given IDs.
+    """
+    iocs_by_id = {}
+    for i in range(0, len(ioc_ids), IDS_QUERY_SIZE):
+        indicator_searcher = IndicatorsSearcher(
+            query='id:({})'.format(' '.join(ioc_ids[i:i + IDS_QUERY_SIZE])),
+            size=PAGE_SIZE
+        )
+        for ioc in find_indicators_with_limit(indicator_searcher):
+            iocs_by_id.setdefault(ioc.get('id'), ioc)
+    return [iocs_by_id[ioc_id] for ioc_id in ioc_ids if ioc_id in iocs_by_id]
+
+
+def find_indicators_pages(indicator_searcher: IndicatorsSearcher) -> Iterator[list]:
+    """
+    Finds indicators using demisto.searchIndicators, yielding the indicators of each searched page
+    """
+    for ioc_res in indicator_searcher:
+        yield ioc_res.get('iocs') or []
+
+
+def find_indicators_to_format(indicator_searcher: IndicatorsSearcher, request_args: RequestArguments) -> list:
+    """
+    Finds the indicators to format in a single pass over the search pages.
+    The first `offset` indicators are skipped, and indicators are then taken until the values they add to the output
+    reach the list size. Each round only takes as many indicators as values are still missing, so the output is not
+    larger than the list size unless an indicator adds more than a single value.
+    Returns: List of the IoCs to format, in search order.
+    """
+    iocs: List[dict] = []
+    to_skip = request_args.offset
+    values_count = 0
+    for fetched_iocs in find_indicators_pages(indicator_searcher):
+        if to_skip:
+            skipped = min(to_skip, len(fetched_iocs))
+            fetched_iocs = fetched_iocs[skipped:]
+            to_skip -= skipped
+
+        while fetched_iocs and values_count < request_args.limit:
+            new_iocs = fetched_iocs[:request_args.limit - values_count]
+            fetched_iocs = fetched_iocs[len(new_iocs):]
+            iocs.extend(new_iocs)
+            values_count += count_formatted_values(new_iocs, request_args)
+            if values_count >= request_args.limit and is_collapsing_ips(request_args):
+                # collapsed IPs are counted as single values, so the output is formatted to get the actual count
+                _, values_count = create_values_for_returned_dict(iocs, request_args)
+                if request_args.out_format == FORMAT_CSV:
+                    values_count -= 1  # the csv header
+
+        if values_count >= request_args.limit:
+            break
+
+    return iocs
+
+
+def is_collapsing_ips(request_args: RequestArguments) -> bool:
+    """
+    Returns: Whether the IPs are collapsed to ranges or CIDRs in the output format.
+    """
+    return request_args.out_format in [FORMAT_TEXT, FORMAT_CSV] and request_args.collapse_ips != DONT_COLLAPSE
+
+
+def count_formatted_values(iocs: list, request_args: RequestArguments) -> int:
+    """
+    Counts the values the IoCs add to the output format, without formatting them (apart from PAN-OS URLs).
+    IPs which are collapsed to ranges or CIDRs are counted as single values.
+    Returns: The number of values in the output format.
+    """
+    if request_args.out_format in [FORMAT_MWG, FORMAT_JSON, FORMAT_XSOAR_JSON]:
+        return len(iocs)
+
+    if request_args.out_format == FORMAT_PANOSURL:
+        _, values_count = panos_url_formatting(iocs, request_args.drop_invalids, request_args.strip_port)
+        return values_count
+
+    if request_args.out_format == FORMAT_PROXYSG:
+        return sum(1 for ioc in iocs if ioc.get('indicator_type') in ['URL', 'Domain', 'DomainGlob'] and ioc.get('value'))
+
+    return sum(1 for ioc in iocs if ioc.get('value'))
+
+
 def ip_groups_to_cidrs(ip_range_groups: list):
     """Collapse ip groups list to CIDRs
 
@@ -538,12 +625,12 @@ def get_outbound_ioc_values(on_demand, request_args: RequestArguments,
 
     last_update = last_update_data.get('last_run')
     last_query = last_update_data.get('last_query')
-    current_iocs = last_update_data.get('current_iocs')
+    current_ioc_ids = last_update_data.get('current_ioc_ids')
 
     # on_demand ignores cache
     if on_demand:
         if request_args.is_request_change(last_update_data):
-            values_str = get_ioc_values_str_from_context(request_args=request_args, iocs=current_iocs)
+            values_str = get_ioc_values_str_from_context(request_args=request_args, ioc_ids=current_ioc_ids)
 
         else:
             values_str = get_ioc_values_str_from_context(request_args=request_args)
@@ -563,18 +650,24 @@ def get_outbound_ioc_values(on_demand, request_args: RequestArguments,
     return values_str
 
 
-def get_ioc_values_str_from_context(request_args: RequestArguments, iocs=None) -> str:
+def get_ioc_values_str_from_context(request_args: RequestArguments, ioc_ids=None) -> str:
     """
     Extracts output values from cache
+    If the IDs of the IoCs of the last update are given, they are formatted again by the request arguments, and the
+    output is cached with the request arguments it was created by
     """
-    if iocs:
-        if request_args.offset > len(iocs):
+    if ioc_ids:
+        if request_args.offset > len(ioc_ids):
             return ''
 
-        iocs = iocs[request_args.offset: request_args.limit + request_args.offset]
-        returned_dict, _ = create_values_for_returned_dict(iocs, request_args=request_args)
+        iocs = find_indicators_by_ids(ioc_ids[request_args.offset: request_args.limit + request_args.offset])
+        returned_dict: dict = {}
+        if iocs:
+            returned_dict, _ = create_values_for_returned_dict(iocs, request_args=request_args)
+        set_output_mimetype(returned_dict, request_args)
         current_cache = get_integration_context()
         current_cache['last_output'] = returned_dict
+        current_cache.update(get_request_args_context(request_args))
         set_integration_context(current_cache)
 
     else:
@@ -180,7 +180,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='text', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             for ioc in iocs_json:
@@ -193,7 +193,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='XSOAR json', limit=39)
             ei_vals = ei.refresh_outbound_context(request_args)
             assert isinstance(ei_vals, str)
@@ -205,7 +205,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='XSOAR csv', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_csv.txt', 'r') as iocs_out_f:
@@ -218,7 +218,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='XSOAR json-seq', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_json_seq.txt', 'r') as iocs_out_f:
@@ -230,7 +230,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_url_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='json', limit=2)
             ei_vals = ei.refresh_outbound_context(request_args)
             ei_vals = json.loads(ei_vals)
@@ -243,7 +243,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='json-seq', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_json_seq_old.txt', 'r') as iocs_out_f:
@@ -256,7 +256,7 @@ class TestHelperFunctions:
         import ExportIndicators as ei
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', return_value=iocs_json)
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = ei.RequestArguments(query='', out_format='csv', limit=38)
             ei_vals = ei.refresh_outbound_context(request_args)
             with open('ExportIndicators_test/TestHelperFunctions/iocs_out_csv_old.txt', 'r') as iocs_out_f:
@@ -278,6 +278,86 @@ class TestHelperFunctions:
             ei_vals = ei.find_indicators_with_limit(indicator_searcher)
             assert len(ei_vals) == limit
 
+    def test_find_indicators_to_format_single_pass(self, mocker):
+        """
+        Given:
+            - Search pages of 5 indicators, where every other indicator has no value
+        When:
+            - Finding the indicators to format with offset 3 and list size 4
+        Then:
+            - Ensure the pages are searched once, up to the page where the output reaches the list size
+            - Ensure the indicators are taken from the offset until they add 4 values to the output
+        """
+        import ExportIndicators as ei
+        iocs = [{'value': f'1.1.1.{i}' if i % 2 == 0 else '', 'indicator_type': 'IP'} for i in range(20)]
+        search_indicators = mocker.patch.object(ei.IndicatorsSearcher, 'search_indicators_by_version', side_effect=[
+            {'iocs': iocs[i:i + 5]} for i in range(0, 20, 5)
+        ])
+        request_args = ei.RequestArguments(query='', out_format='text', limit=4, offset=3)
+        found_iocs = ei.find_indicators_to_format(ei.IndicatorsSearcher(size=5), request_args)
+
+        assert search_indicators.call_count == 3
+        assert found_iocs == iocs[3:11]
+        assert ei.create_values_for_returned_dict(found_iocs, request_args)[0][ei.CTX_VALUES_KEY] == \
+            '1.1.1.4\n1.1.1.6\n1.1.1.8\n1.1.1.10'
+
+    def test_find_indicators_to_format_collapse_ips(self, mocker):
+        """
+        Given:
+            - Search pages of consecutive IPs, which collapse to a single range
+        When:
+            - Finding the indicators to format collapsed to ranges with list size 2
+        Then:
+            - Ensure indicators are taken until the collapsed output reaches the list size
+        """
+        import ExportIndicators as ei
+        iocs = [{'value': f'1.1.1.{i}', 'indicator_type': 'IP'} for i in range(1, 5)] + \
+               [{'value': 'demisto.com', 'indicator_type': 'Domain'}, {'value': '2.2.2.2', 'indicator_type': 'IP'}]
+        mocker.patch.object(ei.IndicatorsSearcher, 'search_indicators_by_version', side_effect=[
+            {'iocs': iocs[:2]}, {'iocs': iocs[2:4]}, {'iocs': iocs[4:]}
+        ])
+        request_args = ei.RequestArguments(query='', out_format='text', limit=2, collapse_ips=ei.COLLAPSE_TO_RANGES)
+        found_iocs = ei.find_indicators_to_format(ei.IndicatorsSearcher(size=2), request_args)
+
+        assert found_iocs == iocs[:5]
+        assert ei.create_values_for_returned_dict(found_iocs, request_args)[0][ei.CTX_VALUES_KEY] == \
+            'demisto.com\n1.1.1.1-1.1.1.4'
+
+    def test_refresh_outbound_context_on_demand(self, mocker):
+        """
+        Given:
+            - On demand mode
+        When:
+            - Updating the outbound context, and then requesting the list in a different format
+        Then:
+            - Ensure the indicators are kept in the integration context by their IDs only
+            - Ensure the indicators of the last update are found by their IDs for the changed request, and not by a
+              new search of the query
+            - Ensure the output is cached along with the request arguments it was created by
+        """
+        import ExportIndicators as ei
+        with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
+            iocs_json = json.loads(iocs_json_f.read())
+        mocker.patch.object(ei, 'find_indicators_pages', side_effect=lambda _: [iocs_json])
+        integration_context: dict = {}
+        mocker.patch.object(ei, 'get_integration_context', side_effect=lambda: integration_context)
+        mocker.patch.object(ei, 'set_integration_context', side_effect=integration_context.update)
+
+        ei.refresh_outbound_context(ei.RequestArguments(query='type:IP', out_format='text', limit=38), on_demand=True)
+        assert 'current_iocs' not in integration_context
+        assert integration_context['current_ioc_ids'] == [ioc['id'] for ioc in iocs_json[:38]]
+
+        find_indicators_pages = mocker.patch.object(ei, 'find_indicators_pages', side_effect=lambda _: [iocs_json])
+        request_args = ei.RequestArguments(query='', out_format='json', limit=38)
+        ei_vals = ei.get_outbound_ioc_values(on_demand=True, request_args=request_args,
+                                             last_update_data=dict(integration_context))
+        assert find_indicators_pages.call_args[0][0]._query.startswith('id:(10914 10919 ')
+        assert len(json.loads(ei_vals)) == 38
+        assert integration_context['last_query'] == 'type:IP'
+        assert integration_context['last_format'] == 'json'
+        assert integration_context['last_output'][ei.CTX_MIMETYPE_KEY] == ei.MIMETYPE_JSON
+        assert not request_args.is_request_change(integration_context)
+
     def test_create_values_for_returned_dict_1(self):
         """Test XSOAR CSV out"""
         from ExportIndicators import create_values_for_returned_dict, FORMAT_XSOAR_CSV, RequestArguments, CTX_VALUES_KEY
@@ -517,7 +597,7 @@ class TestHelperFunctions:
         from ExportIndicators import refresh_outbound_context, RequestArguments
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', side_effect=[iocs_json, []])
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = RequestArguments(query='', out_format='text', sort_field=sort_field, sort_order=sort_order)
             ei_vals = refresh_outbound_context(request_args)
 
@@ -529,7 +609,7 @@ class TestHelperFunctions:
         from ExportIndicators import refresh_outbound_context, RequestArguments
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', side_effect=[iocs_json, []])
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = RequestArguments(query='', out_format='text', sort_field='lastSeen',
                                             sort_order='invalid_sort_order')
             ei_vals = refresh_outbound_context(request_args)
@@ -542,7 +622,7 @@ class TestHelperFunctions:
         from ExportIndicators import refresh_outbound_context, RequestArguments
         with open('ExportIndicators_test/TestHelperFunctions/demisto_iocs.json', 'r') as iocs_json_f:
             iocs_json = json.loads(iocs_json_f.read())
-            mocker.patch.object(ei, 'find_indicators_with_limit', side_effect=[iocs_json, []])
+            mocker.patch.object(ei, 'find_indicators_pages', return_value=[iocs_json])
             request_args = RequestArguments(query='', out_format='text', sort_field='invalid_field_name',
                                             sort_order='asc')
             mocker.patch.object(demisto, 'debug')
@@ -1,3 +1,5 @@
+from typing import Iterator
+
 import urllib3
 
 import demistomock as demisto  # noqa: F401
@@ -95,6 +97,8 @@ ATTRIBUTE_TO_INDICATOR_MAP = {
     'malware-type': ThreatIntel.ObjectsNames.MALWARE,
 }
 
+ATTRIBUTES_PAGE_SIZE = 2000
+
 GALAXY_MAP = {
     'misp-galaxy:mitre-attack-pattern': ThreatIntel.ObjectsNames.ATTACK_PATTERN,
     'misp-galaxy:mitre-malware': ThreatIntel.ObjectsNames.MALWARE,
@@ -322,51 +326,114 @@ def update_indicators_iterator(indicators_iterator: List[Dict[str, Any]],
     return []
 
 
-def fetch_indicators(client: Client,
-                     tags: List[str],
-                     attribute_type: List[str],
-                     query: Optional[str],
-                     tlp_color: Optional[str],
-                     url: Optional[str],
-                     reputation: Optional[str],
-                     limit: int = -1,
-                     is_fetch: bool = True) -> List[Dict]:
+def iter_attributes_pages(client: Client, params_dict: Dict[str, Any], page_size: int) -> Iterator[Dict[str, Any]]:
+    """
+    Gets the attributes matching the query from MISP, page by page.
+    If the query is the same as in the last fetch, only attributes updated after the last fetch are requested.
+    Args:
+        client: Client object
+        params_dict: user's params sent to misp
+        page_size: the number of attributes in each page
+    Returns: Iterator of the responses of MISP for each page
+    """
+    body = dict(params_dict, limit=page_size)
+    last_run = demisto.getLastRun()
+    if last_run and last_run.get('params') == params_dict and last_run.get('timestamp'):
+        body['timestamp'] = int(last_run['timestamp']) + 1
+
+    page = 1
+    while True:
+        response = client.search_query(dict(body, page=page))
+        yield response
+        if len(response.get('response', {}).get('Attribute', [])) < page_size:
+            return
+        page += 1
+
+
+def fetch_indicators_pages(client: Client,
+                           tags: List[str],
+                           attribute_type: List[str],
+                           query: Optional[str],
+                           tlp_color: Optional[str],
+                           url: Optional[str],
+                           reputation: Optional[str],
+                           limit: int = -1,
+                           is_fetch: bool = True) -> Iterator[List[Dict]]:
+    """
+    Fetches the indicators from MISP, page by page, so each page can be handled before the next one is requested.
+    When fetching, the last run is updated with the latest attribute timestamp after the last page.
+    Args:
+        client: Client object
+        tags: List of tags to filter by
+        attribute_type: List of types to filter by
+        query: User's query string, used instead of the tags and the types
+        tlp_color: Traffic Light Protocol color
+        url: Feed URL
+        reputation: string representing reputation of the indicators
+        limit: the maximal number of indicators built from attributes, -1 for no limit
+        is_fetch: flag for wether funciton was called for fetching command or a get
+    Returns: Iterator of the indicators of each page
+    """
     if query:
         params_dict = clean_user_query(query)
     else:
         params_dict = build_params_dict(tags, attribute_type)
 
-    response = client.search_query(params_dict)
-    indicators_iterator = build_indicators_iterator(response, url)
-    added_indicators_iterator = update_indicators_iterator(indicators_iterator, params_dict, is_fetch)
-    indicators = []
+    page_size = min(limit, ATTRIBUTES_PAGE_SIZE) if limit > 0 else ATTRIBUTES_PAGE_SIZE
+    last_timestamp = None
+    for response in iter_attributes_pages(client, params_dict, page_size):
+        indicators_iterator = build_indicators_iterator(response, url)
+        added_indicators_iterator = update_indicators_iterator(indicators_iterator, params_dict, is_fetch)
+        if not added_indicators_iterator:
+            continue
+
+        if limit > 0:
+            added_indicators_iterator = added_indicators_iterator[:limit]
+            limit -= len(added_indicators_iterator)
+
+        page_last_timestamp = added_indicators_iterator[-1]['value']['timestamp']
+        if last_timestamp is None or int(page_last_timestamp) > int(last_timestamp):
+            last_timestamp = page_last_timestamp
+
+        indicators = []
+        for indicator in added_indicators_iterator:
+            value_ = indicator['value']['value']
+            type_ = indicator['type']
+            raw_type = indicator.pop('raw_type')
 
-    if not added_indicators_iterator:
-        return []
+            indicator_obj = build_indicator(value_, type_, indicator, reputation)
 
-    if limit > 0:
-        added_indicators_iterator = added_indicators_iterator[:limit]
+            update_indicator_fields(indicator_obj, tlp_color, raw_type)
+            galaxy_indicators = build_indicators_from_galaxies(indicator_obj, reputation)
+            create_and_add_relationships(indicator_obj, galaxy_indicators)
 
-    if is_fetch:
+            indicators.append(indicator_obj)
+
+        yield indicators
+        if limit == 0:
+            break
+
+    if is_fetch and last_timestamp is not None:
         # fetching command, need to update last run dict
         demisto.setLastRun({
             'params': params_dict,
-            'timestamp': added_indicators_iterator[len(added_indicators_iterator) - 1]['value']['timestamp']
+            'timestamp': last_timestamp
         })
 
-    for indicator in added_indicators_iterator:
-        value_ = indicator['value']['value']
-        type_ = indicator['type']
-        raw_type = indicator.pop('raw_type')
-
-        indicator_obj = build_indicator(value_, type_, indicator, reputation)
-
-        update_indicator_fields(indicator_obj, tlp_color, raw_type)
-        galaxy_indicators = build_indicators_from_galaxies(indicator_obj, reputation)
-        create_and_add_relationships(indicator_obj, galaxy_indicators)
-
-        indicators.append(indicator_obj)
 
+def fetch_indicators(client: Client,
+                     tags: List[str],
+                     attribute_type: List[str],
+                     query: Optional[str],
+                     tlp_color: Optional[str],
+                     url: Optional[str],
+                     reputation: Optional[str],
+                     limit: int = -1,
+                     is_fetch: bool = True) -> List[Dict]:
+    indicators: List[Dict] = []
+    for page_indicators in fetch_indicators_pages(client, tags, attribute_type, query, tlp_color, url, reputation,
+                                                  limit, is_fetch):
+        indicators.extend(page_indicators)
     return indicators
 
 
@@ -536,13 +603,13 @@ def get_attributes_command(client: Client, args: Dict[str, str], params: Dict[st
     )
 
 
-def fetch_attributes_command(client: Client, params: Dict[str, str]) -> List[Dict]:
+def fetch_attributes_command(client: Client, params: Dict[str, str]) -> Iterator[List[Dict]]:
     """
     Wrapper for fetching indicators from the feed to the Indicators tab.
     Args:
         client: Client object with request
         params: demisto.params()
-    Returns: List of indicators.
+    Returns: Iterator of the indicators of each page.
     """
     tlp_color = params.get('tlp_color')
     reputation = params.get('feedReputation')
@@ -550,8 +617,7 @@ def fetch_attributes_command(client: Client, params: Dict[str, str]) -> List[Dic
     attribute_types = argToList(params.get('attribute_types', ''))
     query = params.get('query', None)
 
-    indicators = fetch_indicators(client, tags, attribute_types, query, tlp_color, params.get('url'), reputation)
-    return indicators
+    return fetch_indicators_pages(client, tags, attribute_types, query, tlp_color, params.get('url'), reputation)
 
 
 def main():
@@ -575,9 +641,9 @@ def main():
         elif command == 'misp-feed-get-indicators':
             return_results(get_attributes_command(client, args, params))
         elif command == 'fetch-indicators':
-            indicators = fetch_attributes_command(client, params)
-            for iter_ in batch(indicators, batch_size=2000):
-                demisto.createIndicators(iter_)
+            for indicators in fetch_attributes_command(client, params):
+                for iter_ in batch(indicators, batch_size=2000):
+                    demisto.createIndicators(iter_)
         else:
             raise NotImplementedError(f'Command {command} is not implemented.')
 
@@ -4,7 +4,8 @@ import demistomock as demisto
 
 from CommonServerPython import DemistoException, ThreatIntel
 from FeedMISP import clean_user_query, build_indicators_iterator, \
-    handle_file_type_fields, get_galaxy_indicator_type, build_indicators_from_galaxies, update_indicators_iterator
+    handle_file_type_fields, get_galaxy_indicator_type, build_indicators_from_galaxies, update_indicators_iterator, \
+    fetch_indicators_pages, fetch_indicators, Client
 
 
 def test_build_indicators_iterator_success():
@@ -370,3 +371,63 @@ def test_update_indicators_iterator_indicators_before_timestamp_different_query(
     mocker.patch.object(demisto, 'getLastRun', return_value={'timestamp': '4', 'params': old_query})
     added_indicators_iterator = update_indicators_iterator(indicators_iterator, query, True)
     assert added_indicators_iterator == indicators_iterator
+
+
+def build_attributes_page(timestamps):
+    return {'response': {'Attribute': [
+        {'id': timestamp, 'type': 'domain', 'value': f'domain{timestamp}.com', 'timestamp': str(timestamp)}
+        for timestamp in timestamps
+    ]}}
+
+
+def test_fetch_indicators_pages(mocker):
+    """
+    Given
+        - Last run with the same query and a timestamp, and MISP returning two full pages and a partial one
+    When
+        - Fetching indicators
+    Then
+        - Request the pages with the timestamp cursor, until a page is not full
+        - Return the indicators of each page separately
+        - Update the last run with the latest timestamp only after the last page
+    """
+    mocker.patch('FeedMISP.ATTRIBUTES_PAGE_SIZE', 2)
+    params_dict = {'returnFormat': 'json', 'type': {'OR': ['domain']}, 'tags': {'OR': []}}
+    mocker.patch.object(demisto, 'getLastRun', return_value={'params': params_dict, 'timestamp': '10'})
+    set_last_run = mocker.patch.object(demisto, 'setLastRun')
+    client = Client(base_url='https://misp.com/', verify=False, proxy=False)
+    search_query = mocker.patch.object(client, 'search_query', side_effect=[
+        build_attributes_page([12, 11]), build_attributes_page([14, 13]), build_attributes_page([15])])
+
+    pages = fetch_indicators_pages(client, [], ['domain'], None, None, 'https://misp.com/', None)
+    first_page = next(pages)
+    assert [indicator['value'] for indicator in first_page] == ['domain11.com', 'domain12.com']
+    assert not set_last_run.called
+    assert [len(page) for page in pages] == [2, 1]
+
+    assert [call.args[0] for call in search_query.call_args_list] == [
+        dict(params_dict, limit=2, timestamp=11, page=page) for page in (1, 2, 3)]
+    set_last_run.assert_called_once_with({'params': params_dict, 'timestamp': '15'})
+
+
+def test_fetch_indicators_limit(mocker):
+    """
+    Given
+        - MISP with more attributes than the limit
+    When
+        - Getting indicators with a limit
+    Then
+        - Stop requesting pages once the limit is reached, and do not update the last run
+    """
+    mocker.patch('FeedMISP.ATTRIBUTES_PAGE_SIZE', 2)
+    mocker.patch.object(demisto, 'getLastRun', return_value=None)
+    set_last_run = mocker.patch.object(demisto, 'setLastRun')
+    client = Client(base_url='https://misp.com/', verify=False, proxy=False)
+    search_query = mocker.patch.object(client, 'search_query', side_effect=[
+        build_attributes_page([1, 2]), build_attributes_page([3, 4]), build_attributes_page([5, 6])])
+
+    indicators = fetch_indicators(client, [], [], None, None, 'https://misp.com/', None, limit=3, is_fetch=False)
+
+    assert [indicator['value'] for indicator in indicators] == ['domain1.com', 'domain2.com', 'domain3.com']
+    assert search_query.call_count == 2
+    assert not set_last_run.called
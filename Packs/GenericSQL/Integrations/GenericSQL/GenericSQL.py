@@ -2,7 +2,9 @@ import demistomock as demisto
 from CommonServerPython import *
 from CommonServerUserPython import *
 
-from typing import Any, Tuple, Dict, List, Callable, Optional
+from typing import Any, Tuple, Dict, List, Callable, Optional, IO
+import csv
+import re
 import sqlalchemy
 import pymysql
 import traceback
@@ -23,6 +25,16 @@ pymysql.install_as_MySQLdb()
 
 GLOBAL_CACHE_ATTR = '_generic_sql_engine_cache'
 DEFAULT_POOL_TTL = 600
+FETCH_BATCH_SIZE = 1000
+# the clause which limits the rows of a query, by the dialects which support wrapping a query as a sub query with it
+PAGINATION_CLAUSES = {
+    'MySQL': 'LIMIT {limit} OFFSET {skip}',
+    'PostgreSQL': 'LIMIT {limit} OFFSET {skip}',
+    'Oracle': 'OFFSET {skip} ROWS FETCH NEXT {limit} ROWS ONLY',
+}
+SELECT_QUERY_REGEX = re.compile(r'^\s*select\b', re.IGNORECASE)
+COLUMN_NAME_REGEX = re.compile(r'^[A-Za-z_][\w$]*$')
+DEFAULT_MAX_FETCH = 50
 
 
 class Client:
@@ -130,23 +142,157 @@ class Client:
                                               poolclass=sqlalchemy.pool.NullPool)
         return engine.connect()
 
-    def sql_query_execute_request(self, sql_query: str, bind_vars: Any) -> Tuple[Dict, List]:
+    def _execute(self, sql_query: str, bind_vars: Any, stream: bool = False) -> sqlalchemy.engine.ResultProxy:
         """Execute query in DB via engine
-        :param bind_vars: in case there are names and values - a bind_var dict, in case there are only values - list
         :param sql_query: the SQL query
-        :return: results of query, table headers
+        :param bind_vars: in case there are names and values - a bind_var dict, in case there are only values - list
+        :param stream: whether to read the rows from the server in batches, when the driver supports it
+        :return: the result of the query
         """
+        query: Any = sql_query
         if type(bind_vars) is dict:
-            sql_query = text(sql_query)
+            query = text(sql_query)
+        connection = self.connection.execution_options(stream_results=True) if stream else self.connection
+        return connection.execute(query, bind_vars)
+
+    def build_paged_query(self, sql_query: str, skip: int, limit: int) -> Optional[str]:
+        """
+        Wraps a select query as a sub query, limited to the requested rows by the dialect's LIMIT/OFFSET clause.
+        :param sql_query: the SQL query
+        :param skip: the number of rows to skip
+        :param limit: the maximal number of rows to return
+        :return: the paged query, None if the dialect or the query are not supported
+        """
+        pagination_clause = PAGINATION_CLAUSES.get(self.dialect)
+        sql_query = sql_query.strip().rstrip(';')
+        if not pagination_clause or not SELECT_QUERY_REGEX.match(sql_query) or ';' in sql_query:
+            return None
+        # the query is closed in a new line, in case it ends with a comment
+        pagination = pagination_clause.format(skip=int(skip), limit=int(limit))
+        return f'SELECT * FROM (\n{sql_query}\n) generic_sql_page {pagination}'
 
-        result = self.connection.execute(sql_query, bind_vars)
-        results = result.fetchall()
+    @staticmethod
+    def _fetch_rows(result: sqlalchemy.engine.ResultProxy, skip: int, limit: int) -> List:
+        """
+        Reads the requested rows of a result in batches, without reading the rest of the rows, and closes it.
+        :param result: the result of the query
+        :param skip: the number of rows to skip
+        :param limit: the maximal number of rows to return
+        :return: the rows
+        """
+        rows: List = []
+        try:
+            while skip > 0:
+                skipped_rows = result.fetchmany(min(skip, FETCH_BATCH_SIZE))
+                if not skipped_rows:
+                    return rows
+                skip -= len(skipped_rows)
+            while len(rows) < limit:
+                batch_rows = result.fetchmany(min(limit - len(rows), FETCH_BATCH_SIZE))
+                if not batch_rows:
+                    break
+                rows.extend(batch_rows)
+        finally:
+            result.close()
+        return rows
+
+    def sql_query_execute_request(self, sql_query: str, bind_vars: Any, skip: int = 0,
+                                  limit: Optional[int] = None) -> Tuple[List, List]:
+        """Execute query in DB via engine
+        When a limit is given, only the requested rows are read: select queries are paged by the DB, when the
+        dialect supports it, otherwise the rows are read from the result in batches.
+        :param bind_vars: in case there are names and values - a bind_var dict, in case there are only values - list
+        :param sql_query: the SQL query
+        :param skip: the number of rows to skip
+        :param limit: the maximal number of rows to return, None for all the rows
+        :return: results of query, table headers
+        """
+        results = None
+        if limit is None:
+            results = self._execute(sql_query, bind_vars).fetchall()
+        else:
+            paged_query = self.build_paged_query(sql_query, skip, limit)
+            if paged_query:
+                try:
+                    results = self._execute(paged_query, bind_vars).fetchall()
+                except sqlalchemy.exc.DBAPIError as err:
+                    demisto.debug(f'Failed running the query paged by the DB, reading its rows instead: {err}')
+            if results is None:
+                results = self._fetch_rows(self._execute(sql_query, bind_vars, stream=True), skip, limit)
         headers = []
         if results:
             # if the table isn't empty
             headers = results[0].keys()
         return results, headers
 
+    def build_fetch_query(self, fetch_query: str, fetch_column: str, has_cursor: bool, limit: int) -> str:
+        """
+        Wraps the fetch query as a sub query, to read its rows from the high-water mark of the fetch column on,
+        ordered by the fetch column and limited to the requested number of rows when the dialect supports it.
+        The high-water mark is given as the :cursor bind variable.
+        :param fetch_query: the select query of the rows to fetch
+        :param fetch_column: the column of the high-water mark, an increasing ID or timestamp
+        :param has_cursor: whether there is a high-water mark, False on the first fetch from the beginning
+        :param limit: the maximal number of rows to read
+        :return: the query
+        """
+        if not COLUMN_NAME_REGEX.match(fetch_column):
+            raise ValueError(f'Invalid fetch column name: {fetch_column}')
+        fetch_query = fetch_query.strip().rstrip(';')
+        where_clause = f' WHERE {fetch_column} >= :cursor' if has_cursor else ''
+        top_clause = f'TOP {int(limit)} ' if self.dialect in {'Microsoft SQL Server',
+                                                              'Microsoft SQL Server - MS ODBC Driver'} else ''
+        query = f'SELECT {top_clause}* FROM (\n{fetch_query}\n) generic_sql_fetch{where_clause} ORDER BY {fetch_column}'
+        pagination_clause = PAGINATION_CLAUSES.get(self.dialect)
+        if pagination_clause:
+            query += ' ' + pagination_clause.format(skip=0, limit=int(limit))
+        return query
+
+    def fetch_rows_from_cursor(self, fetch_query: str, fetch_column: str, cursor: Any, limit: int) -> List:
+        """
+        Reads the rows of the fetch query from the high-water mark of the fetch column on, in a bounded batch
+        :param fetch_query: the select query of the rows to fetch
+        :param fetch_column: the column of the high-water mark, an increasing ID or timestamp
+        :param cursor: the high-water mark, None to read from the beginning
+        :param limit: the maximal number of rows to read
+        :return: the rows, ordered by the fetch column
+        """
+        query = self.build_fetch_query(fetch_query, fetch_column, cursor is not None, limit)
+        bind_vars = {'cursor': cursor} if cursor is not None else {}
+        return self._fetch_rows(self._execute(query, bind_vars, stream=True), 0, limit)
+
+    def export_query_results(self, sql_query: str, bind_vars: Any, export_file: IO, export_format: str) -> int:
+        """Execute query in DB via engine and write its rows to a file, reading them in batches
+        :param sql_query: the SQL query
+        :param bind_vars: in case there are names and values - a bind_var dict, in case there are only values - list
+        :param export_file: the text file to write the rows to
+        :param export_format: csv (with a header row) or jsonl (a JSON object in each line)
+        :return: the number of rows written
+        """
+        result = self._execute(sql_query, bind_vars, stream=True)
+        rows_count = 0
+        try:
+            headers = [str(header) for header in result.keys()]
+            csv_writer = None
+            if export_format == 'csv':
+                csv_writer = csv.writer(export_file)
+                csv_writer.writerow(headers)
+            while True:
+                rows = result.fetchmany(FETCH_BATCH_SIZE)
+                if not rows:
+                    break
+                for row in rows:
+                    # converting b'' and datetime objects to readable ones
+                    values = [str(value) for value in row]
+                    if csv_writer:
+                        csv_writer.writerow(values)
+                    else:
+                        export_file.write(json.dumps(dict(zip(headers, values))) + '\n')
+                rows_count += len(rows)
+        finally:
+            result.close()
+        return rows_count
+
 
 def generate_default_port_by_dialect(dialect: str) -> Optional[str]:
     """
@@ -204,12 +350,11 @@ def sql_query_execute(client: Client, args: dict, *_) -> Tuple[str, Dict[str, An
         bind_variables_values = args.get('bind_variables_values', "")
         bind_variables = generate_bind_vars(bind_variables_names, bind_variables_values)
 
-        result, headers = client.sql_query_execute_request(sql_query, bind_variables)
+        result, headers = client.sql_query_execute_request(sql_query, bind_variables, skip, limit)
         # converting an sqlalchemy object to a table
         converted_table = [dict(row) for row in result]
         # converting b'' and datetime objects to readable ones
         table = [{str(key): str(value) for key, value in dictionary.items()} for dictionary in converted_table]
-        table = table[skip:skip + limit]
         human_readable = tableToMarkdown(name="Query result:", t=table, headers=headers,
                                          removeNull=True)
         context = {
@@ -229,6 +374,99 @@ def sql_query_execute(client: Client, args: dict, *_) -> Tuple[str, Dict[str, An
         raise err
 
 
+def sql_export_command(client: Client, args: dict) -> dict:
+    """
+    Executes the sql query and exports all of its rows to a file, reading them in batches
+    :param client: the client object with the db connection
+    :param args: demisto.args() including the sql query and the export format
+    :return: a file entry of the exported rows
+    """
+    sql_query = str(args.get('query'))
+    export_format = args.get('export_format', 'csv').lower()
+    if export_format not in ('csv', 'jsonl'):
+        raise ValueError(f'Unsupported export format: {export_format}. Use csv or jsonl.')
+    file_name = args.get('file_name') or f'query_result.{export_format}'
+    bind_variables = generate_bind_vars(args.get('bind_variables_names', ""), args.get('bind_variables_values', ""))
+
+    file_id = demisto.uniqueFile()
+    with open(f'{demisto.investigation()["id"]}_{file_id}', 'w', newline='', encoding='utf-8') as export_file:
+        rows_count = client.export_query_results(sql_query, bind_variables, export_file, export_format)
+    demisto.debug(f'Exported {rows_count} rows to {file_name}')
+    return {'Contents': '', 'ContentsFormat': formats['text'], 'Type': entryTypes['file'], 'File': file_name,
+            'FileID': file_id}
+
+
+def get_cursor_value(value: Any) -> Any:
+    """
+    Converts a value of the fetch column to be saved in the last run, keeping numbers as is
+    :param value: the value of the fetch column
+    :return: the value to be saved
+    """
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    return str(value)
+
+
+def get_row_id(row: Dict[str, Any], fetch_id_column: Optional[str]) -> str:
+    """
+    Gets an identifier of the row, to avoid fetching it again when other rows have the same fetch column value
+    :param row: the row
+    :param fetch_id_column: a unique column of the rows, if there is one
+    :return: the value of the unique column, otherwise a hash of the row
+    """
+    if fetch_id_column:
+        return str(row[fetch_id_column])
+    return hashlib.sha256(json.dumps(row, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def fetch_incidents(client: Client, params: dict, last_run: dict) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Fetches the rows added after the high-water mark of the fetch column as incidents.
+    Rows are read with >= the high-water mark, so rows with the same value which were not read yet are fetched.
+    The IDs of the rows fetched with the high-water mark value are saved, to skip them in the next fetch.
+    :param client: the client object with the db connection
+    :param params: demisto.params() with the fetch settings
+    :param last_run: the last run, with the high-water mark and the IDs of the rows with its value
+    :return: the incidents and the next run
+    """
+    fetch_query = params.get('fetch_query')
+    fetch_column = params.get('fetch_column')
+    if not fetch_query or not fetch_column:
+        raise ValueError('Fetch query and Fetch column must be set in order to fetch incidents.')
+    fetch_id_column = params.get('fetch_id_column')
+    max_fetch = arg_to_number(params.get('max_fetch')) or DEFAULT_MAX_FETCH
+
+    cursor = last_run.get('cursor', params.get('fetch_start_value') or None)
+    cursor_ids = set(last_run.get('ids', []))
+    # the rows which were fetched with the high-water mark value are read again, so they are added to the batch
+    rows = client.fetch_rows_from_cursor(fetch_query, fetch_column, cursor, max_fetch + len(cursor_ids))
+
+    incidents: List[Dict[str, Any]] = []
+    next_cursor, next_cursor_ids = cursor, set(cursor_ids)
+    for row in rows:
+        # converting b'' and datetime objects to readable ones
+        row_dict = {str(key): str(value) for key, value in dict(row).items()}
+        row_cursor = get_cursor_value(row[fetch_column])
+        row_id = get_row_id(row_dict, fetch_id_column)
+        if row_cursor == cursor and row_id in cursor_ids:
+            continue
+        if len(incidents) >= max_fetch:
+            break
+        incidents.append({
+            'name': f'Generic SQL {fetch_column} {row_dict[fetch_column]}' if not fetch_id_column
+            else f'Generic SQL {fetch_id_column} {row_id}',
+            'rawJSON': json.dumps(row_dict),
+        })
+        if row_cursor != next_cursor:
+            next_cursor, next_cursor_ids = row_cursor, set()
+        next_cursor_ids.add(row_id)
+
+    next_run = {'cursor': next_cursor, 'ids': sorted(next_cursor_ids)} if next_cursor is not None else {}
+    return incidents, next_run
+
+
 # list of loggers we should set to debug when running in debug_mode
 # taken from: https://docs.sqlalchemy.org/en/13/core/engines.html#configuring-logging
 SQL_LOGGERS = [
@@ -262,11 +500,14 @@ def main():
         database = params.get('dbname') or ''  # Use or to make sure we don't have "None" as a database
         ssl_connect = params.get('ssl_connect')
         connect_parameters = params.get('connect_parameters')
+        command = demisto.command()
         use_pool = params.get('use_pool', False)
+        if command == 'fetch-incidents' and 'expiringdict' in sys.modules:
+            # reuse the connection of the previous fetch
+            use_pool = True
         pool_ttl = int(params.get('pool_ttl') or DEFAULT_POOL_TTL)
         if pool_ttl <= 0:
             pool_ttl = DEFAULT_POOL_TTL
-        command = demisto.command()
         LOG(f'Command being called in SQL is: {command}')
         client = Client(dialect=dialect, host=host, username=user, password=password,
                         port=port, database=database, connect_parameters=connect_parameters,
@@ -279,6 +520,12 @@ def main():
         }
         if command in commands:
             return_outputs(*commands[command](client, demisto.args(), command))
+        elif command == 'sql-export':
+            return_results(sql_export_command(client, demisto.args()))
+        elif command == 'fetch-incidents':
+            incidents, next_run = fetch_incidents(client, params, demisto.getLastRun() or {})
+            demisto.setLastRun(next_run)
+            demisto.incidents(incidents)
         else:
             raise NotImplementedError(f'{command} is not an existing Generic SQL command')
     except Exception as err:
@@ -1,9 +1,12 @@
+import json
 import os
 
 import pytest
 import sqlalchemy
 
-from GenericSQL import Client, sql_query_execute, generate_default_port_by_dialect
+import demistomock as demisto
+from GenericSQL import Client, sql_query_execute, generate_default_port_by_dialect, sql_export_command, \
+    fetch_incidents
 
 
 class ResultMock:
@@ -13,6 +16,12 @@ class ResultMock:
     def fetchall(self):
         return []
 
+    def fetchmany(self, size):
+        return []
+
+    def close(self):
+        pass
+
 
 ARGS1 = {
     'query': "select Name from city",
@@ -218,6 +227,7 @@ def test_sql_queries_with_empty_table(mocker):
     """
     mocker.patch.object(Client, '_create_engine_and_connect', return_value=mocker.Mock(spec=sqlalchemy.engine.base.Connection))
     client = Client('sql_dialect', 'server_url', 'username', 'password', 'port', 'database', "", False)
+    mocker.patch.object(client.connection, 'execution_options', return_value=client.connection)
     mocker.patch.object(client.connection, 'execute', return_value=ResultMock())
     result = sql_query_execute(client, ARGS3)
     assert EMPTY_OUTPUT == result[1]  # entry context is found in the 2nd place in the result of the command
@@ -250,3 +260,141 @@ def test_mysql_integration():
      {'arg1': 'value1', 'arg2': 'value2', 'driver': 'ODBC Driver 17 for SQL Server'})])
 def test_parse_connect_parameters(connect_parameters, dialect, expected_response):
     assert Client.parse_connect_parameters(connect_parameters, dialect) == expected_response
+
+
+def create_sqlite_client(mocker, dialect):
+    """Creates a client of the given dialect, connected to an in memory sqlite DB with a table of 100 alerts"""
+    connection = sqlalchemy.create_engine('sqlite://').connect()
+    connection.execute('CREATE TABLE alerts (id INTEGER PRIMARY KEY, name TEXT)')
+    connection.execute('INSERT INTO alerts (id, name) VALUES ' + ', '.join(f"({i}, 'alert {i}')" for i in range(1, 101)))
+    mocker.patch.object(Client, '_create_engine_and_connect', return_value=connection)
+    return Client(dialect, 'server_url', 'username', 'password', 'port', 'database', "", False)
+
+
+@pytest.mark.parametrize('dialect, query, expected', [
+    ('MySQL', 'select * from alerts;', 'SELECT * FROM (\nselect * from alerts\n) generic_sql_page LIMIT 5 OFFSET 10'),
+    ('Oracle', ' SELECT name FROM alerts -- comment',
+     'SELECT * FROM (\nSELECT name FROM alerts -- comment\n) generic_sql_page OFFSET 10 ROWS FETCH NEXT 5 ROWS ONLY'),
+    ('Microsoft SQL Server', 'select * from alerts', None),
+    ('MySQL', 'delete from alerts', None),
+    ('MySQL', 'select * from alerts; delete from alerts', None),
+])
+def test_build_paged_query(mocker, dialect, query, expected):
+    """
+    Given
+    - a query and the dialect of the DB
+    When
+    - building the query paged by the DB
+    Then
+    - wrap select queries with the LIMIT/OFFSET clause of the dialect, and do not wrap other queries or dialects
+    """
+    mocker.patch.object(Client, '_create_engine_and_connect', return_value=mocker.Mock(spec=sqlalchemy.engine.base.Connection))
+    client = Client(dialect, 'server_url', 'username', 'password', 'port', 'database', "", False)
+    assert client.build_paged_query(query, 10, 5) == expected
+
+
+@pytest.mark.parametrize('dialect', ['MySQL', 'Microsoft SQL Server'])
+def test_sql_query_execute_skip_limit(mocker, dialect):
+    """
+    Given
+    - a table of 100 rows, in a DB whose dialect is paged by the DB (MySQL) or not (Microsoft SQL Server)
+    When
+    - running a query with skip and limit
+    Then
+    - return only the requested rows
+    """
+    client = create_sqlite_client(mocker, dialect)
+    _, _, table = sql_query_execute(client, {'query': 'select * from alerts where id > :min_id', 'skip': 10,
+                                             'limit': 5, 'bind_variables_names': 'min_id',
+                                             'bind_variables_values': '50'})
+    assert table == [{'id': str(i), 'name': f'alert {i}'} for i in range(61, 66)]
+
+
+def test_sql_query_execute_request_paged_query_fails(mocker):
+    """
+    Given
+    - a query which fails when paged by the DB
+    When
+    - running the query with skip and limit
+    Then
+    - return the requested rows by reading them from the result of the original query
+    """
+    client = create_sqlite_client(mocker, 'MySQL')
+    mocker.patch.object(client, 'build_paged_query', return_value='select * from missing_table')
+    rows, headers = client.sql_query_execute_request('select * from alerts', [], skip=98, limit=5)
+    assert [row['id'] for row in rows] == [99, 100]
+    assert list(headers) == ['id', 'name']
+
+
+@pytest.mark.parametrize('export_format, expected_lines', [
+    ('csv', ['id,name', '1,alert 1', '2,alert 2']),
+    ('jsonl', [json.dumps({'id': '1', 'name': 'alert 1'}), json.dumps({'id': '2', 'name': 'alert 2'})]),
+])
+def test_sql_export_command(mocker, tmp_path, export_format, expected_lines):
+    """
+    Given
+    - a table of 100 rows
+    When
+    - exporting a query of the table to a file
+    Then
+    - write all of the rows to the file, in the requested format
+    """
+    mocker.patch('GenericSQL.FETCH_BATCH_SIZE', 7)
+    client = create_sqlite_client(mocker, 'MySQL')
+    mocker.patch.object(demisto, 'uniqueFile', return_value='file_id')
+    mocker.patch.object(demisto, 'investigation', return_value={'id': str(tmp_path / 'inv')})
+
+    entry = sql_export_command(client, {'query': 'select * from alerts order by id', 'export_format': export_format})
+
+    assert entry['File'] == f'query_result.{export_format}'
+    with open(f'{tmp_path / "inv"}_file_id') as export_file:
+        lines = export_file.read().splitlines()
+    assert len(lines) == len(expected_lines) + 98
+    assert lines[:len(expected_lines)] == expected_lines
+
+
+@pytest.mark.parametrize('dialect, expected', [
+    ('MySQL', 'SELECT * FROM (\nselect * from alerts\n) generic_sql_fetch WHERE id >= :cursor ORDER BY id LIMIT 10 OFFSET 0'),
+    ('Microsoft SQL Server', 'SELECT TOP 10 * FROM (\nselect * from alerts\n) generic_sql_fetch WHERE id >= :cursor ORDER BY id'),
+])
+def test_build_fetch_query(mocker, dialect, expected):
+    mocker.patch.object(Client, '_create_engine_and_connect', return_value=mocker.Mock(spec=sqlalchemy.engine.base.Connection))
+    client = Client(dialect, 'server_url', 'username', 'password', 'port', 'database', "", False)
+    assert client.build_fetch_query('select * from alerts;', 'id', True, 10) == expected
+    with pytest.raises(ValueError):
+        client.build_fetch_query('select * from alerts', 'id; drop table alerts', True, 10)
+
+
+def test_fetch_incidents(mocker):
+    """
+    Given
+    - a table of alerts, where several alerts have the same creation time
+    When
+    - fetching incidents in batches smaller than the alerts with the same creation time, and adding alerts
+    Then
+    - fetch each alert once, in the order of the creation time
+    - save the last creation time and the IDs of the alerts fetched with it
+    """
+    client = create_sqlite_client(mocker, 'MySQL')
+    client.connection.execute('ALTER TABLE alerts ADD COLUMN created INTEGER')
+    client.connection.execute('UPDATE alerts SET created = (id + 2) / 3')
+    params = {'fetch_query': 'select id, created from alerts where id <= 7', 'fetch_column': 'created',
+              'max_fetch': '2', 'fetch_start_value': '2'}
+
+    incidents, last_run = fetch_incidents(client, params, {})
+    assert [json.loads(incident['rawJSON'])['id'] for incident in incidents] == ['4', '5']
+    assert last_run['cursor'] == 2 and len(last_run['ids']) == 2
+
+    incidents, last_run = fetch_incidents(client, params, last_run)
+    assert [json.loads(incident['rawJSON'])['id'] for incident in incidents] == ['6', '7']
+    assert last_run['cursor'] == 3 and len(last_run['ids']) == 1
+
+    incidents, last_run_after_no_rows = fetch_incidents(client, params, last_run)
+    assert incidents == []
+    assert last_run_after_no_rows == last_run
+
+    params['fetch_query'] = 'select id, created from alerts where id <= 9'
+    params['fetch_id_column'] = 'id'
+    incidents, last_run = fetch_incidents(client, params, {'cursor': 3, 'ids': ['7']})
+    assert [incident['name'] for incident in incidents] == ['Generic SQL id 8', 'Generic SQL id 9']
+    assert last_run == {'cursor': 3, 'ids': ['7', '8', '9']}
@@ -1,8 +1,7 @@
-import concurrent.futures
 import secrets
 from enum import Enum
 from ipaddress import ip_address
-from typing import Tuple, Set, Dict, Callable
+from typing import Tuple, Set, Dict, Callable, Iterator
 
 import pytz
 import urllib3
@@ -21,7 +20,7 @@ FAILURE_SLEEP = 15  # sleep between consecutive failures events fetch
 FETCH_SLEEP = 60  # sleep between fetches
 BATCH_SIZE = 100  # batch size used for offense ip enrichment
 OFF_ENRCH_LIMIT = BATCH_SIZE * 10  # max amount of IPs to enrich per offense
-MAX_WORKERS = 8  # max concurrent workers used for events enriching
+MAX_WORKERS = 8  # max concurrent searches used for events enriching
 DOMAIN_ENRCH_FLG = 'true'  # when set to true, will try to enrich offense and assets with domain names
 RULES_ENRCH_FLG = 'true'  # when set to true, will try to enrich offense with rule names
 MAX_FETCH_EVENT_RETIRES = 3  # max iteration to try search the events of an offense
@@ -69,10 +68,11 @@ MIRROR_DIRECTION: Dict[str, Optional[str]] = {
 MIRRORED_OFFENSES_CTX_KEY = 'mirrored_offenses'
 UPDATED_MIRRORED_OFFENSES_CTX_KEY = 'updated_mirrored_offenses'
 RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY = 'resubmitted_mirrored_offenses'
+MIRRORED_EVENTS_CTX_KEY_PREFIX = 'mirrored_events_'  # followed by the offense ID, holds the offense mirrored events
+MIRRORED_EVENTS_COUNT_KEY = 'mirrored_events_count'
 UTC_TIMEZONE = pytz.timezone('utc')
 ID_QUERY_REGEX = re.compile(r'(?:\s+|^)id((\s)*)>(=?)((\s)*)((\d)+)(?:\s+|$)')
 ASCENDING_ID_ORDER = '+id'
-EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS)
 
 ''' OUTPUT FIELDS REPLACEMENT MAPS '''
 OFFENSE_OLD_NEW_NAMES_MAP = {
@@ -526,6 +526,12 @@ class Client(BaseClient):
             url_suffix=f'/ariel/searches/{search_id}',
         )
 
+    def search_delete(self, search_id: str):
+        return self.http_request(
+            method='DELETE',
+            url_suffix=f'/ariel/searches/{search_id}',
+        )
+
     def search_results_get(self, search_id: str, range_: Optional[str] = None):
         return self.http_request(
             method='GET',
@@ -682,7 +688,7 @@ def safely_update_context_data(func: Callable):
             new_context_data, new_version = get_integration_context_with_version()
             if new_version == version:
                 try:
-                    set_to_integration_context_with_retries(context_data, max_retry_times=1)
+                    set_integration_context_data(context_data, max_retry_times=1)
                     context_was_set = True
                     print_debug_msg(f'Updated integration context after version {version} in retry {retries}.')
                 except Exception as e:
@@ -1218,7 +1224,7 @@ def reset_mirroring_events_variables(mirror_options: str):
         ctx[RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY] = []
 
     print_mirror_events_stats(ctx, "New Long Running Container - After Mirroring Variables Reset")
-    set_to_integration_context_with_retries(encode_context_data(ctx))
+    set_integration_context_data(encode_context_data(ctx))
 
 
 def is_reset_triggered():
@@ -1318,164 +1324,314 @@ def fetch_incidents_command() -> List[Dict]:
     return extract_context_data(ctx).get('samples', [])
 
 
-def create_search_with_retry(client: Client, fetch_mode: str, offense: Dict, event_columns: str, events_limit: int,
-                             max_retries: int = EVENTS_FAILURE_LIMIT) -> Optional[Dict]:
+def create_events_search_query(fetch_mode: str, offense: Dict, event_columns: str, events_limit: int) -> str:
     """
-    Creates a search to retrieve events for an offense.
-    Has retry mechanism, because QRadar service tends to return random errors when
-    it is loaded.
-    Therefore, 'max_retries' retries will be made, to try avoid such cases as much as possible.
+    Creates the query of the search to retrieve events for an offense.
     Args:
-        client (Client): Client to perform the API calls.
         fetch_mode (str): Which enrichment mode was requested.
                           Can be 'Fetch With All Events', 'Fetch Correlation Events Only'
-        offense (Dict): Offense ID to enrich with events.
+        offense (Dict): Offense to enrich with events.
         event_columns (str): Columns of the events to be extracted from query.
         events_limit (int): Maximum number of events to enrich the offense.
-        max_retries (int): Number of retries.
-
 
     Returns:
-        (Dict): If search was created successfully.
-        None: If reset was triggered or number of retries exceeded limit.
+        (str): The AQL query expression of the search.
     """
     additional_where = ''' AND LOGSOURCETYPENAME(devicetype) = 'Custom Rule Engine' ''' \
         if fetch_mode == FetchMode.correlations_events_only.value else ''
     # Decrease 1 minute from start_time to avoid the case where the minute queried of start_time equals end_time.
     offense_start_time = offense['start_time'] - 60 * 1000
     offense_id = offense['id']
-    query_expression = (
+    return (
         f'SELECT {event_columns} FROM events WHERE INOFFENSE({offense_id}) {additional_where} limit {events_limit} '
         f'START {offense_start_time}'
     )
-    num_of_failures = 0
-    while num_of_failures <= max_retries:
+
+
+class OffenseEventsSearch:
+    def __init__(self, offense: Dict, events_limit: int):
+        """
+        The state of the events enrichment of a single offense, scheduled by the EventsSearchScheduler.
+        Args:
+            offense (Dict): Offense to enrich with events.
+            events_limit (int): Maximum number of events to enrich the offense.
+        """
+        self.offense = offense
+        self.min_events_size = min(offense.get('event_count', 0), events_limit)
+        self.search_id: Optional[str] = None
+        self.searches_count = 0
+        self.failures_count = 0
+        self.next_search_time = 0.0
+        self.events: List[Dict] = []
+        self.failure_message = ''
+
+    def to_enriched_offense(self) -> Dict:
+        """
+        Returns:
+            (Dict): The offense enriched with the events of its last search.
+        """
+        failure_message = self.failure_message
+        if failure_message == '' and len(self.events) < self.min_events_size:
+            failure_message = 'Events were probably not indexed in QRadar at the time of the mirror.'
+
+        offense = dict(self.offense, mirroring_events_message=failure_message)
+        if self.events:
+            offense = dict(offense, events=self.events)
+
+        return offense
+
+
+class EventsSearchScheduler:
+    def __init__(self, client: Client, fetch_mode: str, events_columns: str, events_limit: int,
+                 max_concurrent_searches: Optional[int] = None, max_retries: Optional[int] = None,
+                 timeout: Optional[int] = None):
+        """
+        Schedules the Ariel searches used to enrich offenses with events.
+        Searches are created as long as a search slot is free, out of a budget of concurrent searches, and the status
+        of all the active searches is polled in a single loop. Once a search terminates, its events are retrieved and
+        its slot is used for the next search, so a slow search only holds its own slot.
+        Has retry mechanism for events returned by query to QRadar. This is needed because events might not be
+        indexed when performing the search, and QRadar will return less events than expected.
+        Args:
+            client (Client): Client to perform the API calls.
+            fetch_mode (str): Which enrichment mode was requested.
+                              Can be 'Fetch With All Events', 'Fetch Correlation Events Only'
+            events_columns (str): Columns of the events to be extracted from query.
+            events_limit (int): Maximum number of events to enrich the offense.
+            max_concurrent_searches (int): Number of searches to run concurrently. Defaults to MAX_WORKERS.
+            max_retries (int): Number of searches to perform for each offense. Defaults to MAX_FETCH_EVENT_RETIRES.
+            timeout (int): Seconds to enrich all the offenses in. Defaults to DEFAULT_EVENTS_TIMEOUT minutes.
+        """
+        self.client = client
+        self.fetch_mode = fetch_mode
+        self.events_columns = events_columns
+        self.events_limit = events_limit
+        self.max_concurrent_searches = max_concurrent_searches or MAX_WORKERS
+        self.max_retries = max_retries or MAX_FETCH_EVENT_RETIRES
+        self.timeout = timeout or DEFAULT_EVENTS_TIMEOUT * 60
+
+    def iter_enriched_offenses(self, offenses: List[Dict]) -> Iterator[Dict]:
+        """
+        Enriches the offenses with events, yielding each offense as soon as its enrichment is done.
+        Offenses which are not done when the timeout is reached are yielded without events, and their active searches
+        are canceled.
+        Args:
+            offenses (List[Dict]): Offenses to enrich with events.
+
+        Returns:
+            (Iterator[Dict]): The enriched offenses, in the order their enrichment is done.
+        """
+        pending = [OffenseEventsSearch(offense, self.events_limit) for offense in offenses]
+        active: List[OffenseEventsSearch] = []
+        deadline = time.time() + self.timeout
+        last_status_time = time.time()
+        while pending or active:
+            now = time.time()
+            if now >= deadline:
+                break
+
+            for search in [search for search in pending if search.next_search_time <= now]:
+                if len(active) >= self.max_concurrent_searches:
+                    break
+                pending.remove(search)
+                if self.create_search(search):
+                    active.append(search)
+                elif self.is_search_done(search, search_created=False):
+                    yield search.to_enriched_offense()
+                else:
+                    pending.append(search)
+
+            for search in list(active):
+                events = self.poll_search(search)
+                if events is None:
+                    continue
+                active.remove(search)
+                search.events = events
+                if self.is_search_done(search):
+                    yield search.to_enriched_offense()
+                else:
+                    pending.append(search)
+
+            now = time.time()
+            if now - last_status_time >= FETCH_SLEEP:  # print status debug every fetch sleep (or after)
+                print_debug_msg(f'Still fetching events of offenses {[search.offense.get("id") for search in active]}, '
+                                f'{len(pending)} offenses are waiting for a search slot.')
+                last_status_time = now
+            time.sleep(self.get_sleep_time(pending, active, deadline))
+
+        for search in active:
+            self.cancel_search(search)
+        for search in active + pending:
+            print_debug_msg(f'Events enrichment of offense {search.offense.get("id")} did not finish in time.')
+            search.failure_message = search.failure_message or 'Events search did not finish in time.'
+            yield search.to_enriched_offense()
+
+    def create_search(self, search: OffenseEventsSearch) -> bool:
+        """
+        Creates a search to retrieve events for the offense.
+        QRadar service tends to return random errors when it is loaded, so creation is retried after FAILURE_SLEEP
+        seconds, until EVENTS_FAILURE_LIMIT consecutive failures.
+        Args:
+            search (OffenseEventsSearch): The events enrichment of the offense.
+
+        Returns:
+            (bool): Whether the search was created.
+        """
+        offense_id = search.offense['id']
         try:
-            return client.search_create(query_expression=query_expression)
+            query_expression = create_events_search_query(self.fetch_mode, search.offense, self.events_columns,
+                                                          self.events_limit)
+            search.search_id = self.client.search_create(query_expression=query_expression)['search_id']
+            search.failures_count = 0
+            return True
         except Exception:
+            search.failures_count += 1
             print_debug_msg(f'Failed to create search for offense ID: {offense_id}. '
-                            f'Retry number {num_of_failures}/{max_retries}.')
+                            f'Retry number {search.failures_count}/{EVENTS_FAILURE_LIMIT}.')
             print_debug_msg(traceback.format_exc())
-            num_of_failures += 1
-            if num_of_failures == max_retries:
-                print_debug_msg(f'Max retries for creating search for offense: {offense_id}. Returning empty.')
-                break
-            time.sleep(FAILURE_SLEEP)
-    return None
-
-
-def poll_offense_events_with_retry(client: Client, search_id: str, offense_id: int,
-                                   max_retries: int = EVENTS_FAILURE_LIMIT) -> Tuple[List[Dict], str]:
-    """
-    Polls QRadar service for search ID given until status returned is within 'TERMINATING_SEARCH_STATUSES'.
-    Afterwards, performs a call to retrieve the events returned by the search.
-    Has retry mechanism, because QRadar service tends to return random errors when
-    it is loaded.
-    Therefore, 'max_retries' retries will be made, to try avoid such cases as much as possible.
+            search.next_search_time = time.time() + FAILURE_SLEEP
+            return False
 
-    Args:
-        client (Client): Client to perform the API calls.
-        search_id (str): ID of the search to poll for its status.
-        offense_id (int): ID of the offense to enrich with events returned by search. Used for logging purposes here.
-        max_retries (int): Number of retries.
+    def poll_search(self, search: OffenseEventsSearch) -> Optional[List[Dict]]:
+        """
+        Polls the status of the offense search, and retrieves its events once the status is within
+        'TERMINATING_SEARCH_STATUSES'.
+        Args:
+            search (OffenseEventsSearch): The events enrichment of the offense.
 
-    Returns:
-        (List[Dict], str): List of events returned by query. Returns empty list if number of retries exceeded limit,
-                           A failure message in case an error occured.
-    """
-    num_of_failures = 0
-    start_time = time.time()
-    failure_message = ''
-    while num_of_failures <= max_retries:
+        Returns:
+            (Optional[List[Dict]]): The events returned by the search, an empty list if the polling failed
+                                    EVENTS_FAILURE_LIMIT consecutive times, or None if the search is still running.
+        """
+        offense_id = search.offense['id']
         try:
-            search_status_response = client.search_status_get(search_id)
-            query_status = search_status_response.get('status')
+            search_status_response = self.client.search_status_get(search.search_id)  # type: ignore[arg-type]
             # failures are relevant only when consecutive
-            num_of_failures = 0
-            if query_status in TERMINATING_SEARCH_STATUSES:
-                print_debug_msg(f'Getting events for offense {offense_id}')
-                search_results_response = client.search_results_get(search_id)
-                print_debug_msg(f'Http response: {search_results_response.get("http_response", "Not specified - ok")}')
-                events = search_results_response.get('events', [])
-                sanitized_events = sanitize_outputs(events)
-                print_debug_msg(f'Fetched {len(sanitized_events)} events for offense {offense_id}.')
-                return sanitized_events, failure_message
-            elapsed = time.time() - start_time
-            if elapsed >= FETCH_SLEEP:  # print status debug every fetch sleep (or after)
-                print_debug_msg(f'Still fetching offense {offense_id} events, search_id: {search_id}.')
-                start_time = time.time()
-            time.sleep(EVENTS_INTERVAL_SECS)
+            search.failures_count = 0
+            if search_status_response.get('status') not in TERMINATING_SEARCH_STATUSES:
+                return None
+            print_debug_msg(f'Getting events for offense {offense_id}')
+            search_results_response = self.client.search_results_get(search.search_id)  # type: ignore[arg-type]
+            print_debug_msg(f'Http response: {search_results_response.get("http_response", "Not specified - ok")}')
+            events = sanitize_outputs(search_results_response.get('events', []))
+            print_debug_msg(f'Fetched {len(events)} events for offense {offense_id}.')
+            search.failure_message = ''
+            return events
         except Exception as e:
             print_debug_msg(
-                f'Error while fetching offense {offense_id} events, search_id: {search_id}. Error details: {str(e)} \n'
-                f'{traceback.format_exc()}')
-            num_of_failures += 1
-            if num_of_failures < max_retries:
-                time.sleep(FAILURE_SLEEP)
-            else:
-                failure_message = f'{repr(e)} \nSee logs for further details.'
+                f'Error while fetching offense {offense_id} events, search_id: {search.search_id}. '
+                f'Error details: {str(e)} \n{traceback.format_exc()}')
+            search.failures_count += 1
+            if search.failures_count < EVENTS_FAILURE_LIMIT:
+                return None
+            search.failure_message = f'{repr(e)} \nSee logs for further details.'
+            return []
+
+    def is_search_done(self, search: OffenseEventsSearch, search_created: bool = True) -> bool:
+        """
+        Ends the current search of the offense, and checks whether the offense enrichment is done.
+        Otherwise, the next search of the offense is scheduled.
+        Args:
+            search (OffenseEventsSearch): The events enrichment of the offense.
+            search_created (bool): Whether the current search was created, or its creation failed.
 
-    print_debug_msg(f'Could not fetch events for offense ID: {offense_id}, returning empty events array.')
-    return [], failure_message
+        Returns:
+            (bool): Whether the offense enrichment is done.
+        """
+        offense_id = search.offense['id']
+        if not search_created and search.failures_count < EVENTS_FAILURE_LIMIT:
+            return False
+
+        if not search_created:
+            print_debug_msg(f'Max retries for creating search for offense: {offense_id}.')
+        search.search_id = None
+        search.failures_count = 0
+        search.searches_count += 1
+        if search_created and len(search.events) >= search.min_events_size:
+            print_debug_msg(f'Fetched {len(search.events)}/{search.min_events_size} for offense ID {offense_id}')
+            return True
+        if search.searches_count >= self.max_retries:
+            print_debug_msg(f'Reached max retries for offense {offense_id} with failure message '
+                            f'{search.failure_message}')
+            return True
+
+        print_debug_msg(f'Did not fetch enough events. Expected at least {search.min_events_size}. Retrying to fetch '
+                        f'events for offense ID: {offense_id}. Retry number {search.searches_count}/{self.max_retries}')
+        search.next_search_time = time.time() + SLEEP_FETCH_EVENT_RETIRES
+        return False
+
+    def cancel_search(self, search: OffenseEventsSearch):
+        """
+        Deletes the active search of the offense in QRadar, to free the search for other searches.
+        Args:
+            search (OffenseEventsSearch): The events enrichment of the offense.
+        """
+        try:
+            self.client.search_delete(search.search_id)  # type: ignore[arg-type]
+        except Exception as e:
+            print_debug_msg(f'Failed to delete search {search.search_id} of offense {search.offense.get("id")}: {e}')
+
+    def get_sleep_time(self, pending: List[OffenseEventsSearch], active: List[OffenseEventsSearch],
+                       deadline: float) -> float:
+        """
+        Returns:
+            (float): Seconds to sleep until the next active searches poll or the next scheduled search.
+        """
+        now = time.time()
+        if any(search.next_search_time <= now for search in pending) and len(active) < self.max_concurrent_searches:
+            return 0
+        if active:
+            sleep_time = float(EVENTS_INTERVAL_SECS)
+        elif pending:
+            sleep_time = min(search.next_search_time for search in pending) - now
+        else:
+            return 0
+        return max(min(sleep_time, deadline - now), 0)
 
 
-def enrich_offense_with_events(client: Client, offense: Dict, fetch_mode: str, events_columns: str, events_limit: int,
-                               max_retries: int = MAX_FETCH_EVENT_RETIRES):
+def enrich_offenses_with_events(client: Client, offenses: List[Dict], fetch_mode: str, events_columns: str,
+                                events_limit: int,
+                                on_offenses_enriched: Optional[Callable[[List[Dict]], None]] = None) -> List[Dict]:
     """
-    Enriches offense given with events.
-    Has retry mechanism for events returned by query to QRadar. This is needed because events might not be
-    indexed when performing the search, and QRadar will return less events than expected.
-    Retry mechanism here meant to avoid such cases as much as possible
+    Enriches offenses given with events, using a shared budget of concurrent searches.
     Args:
         client (Client): Client to perform the API calls.
-        offense (Dict): Offense to enrich with events.
+        offenses (List[Dict]): Offenses to enrich with events.
         fetch_mode (str): Which enrichment mode was requested.
                           Can be 'Fetch With All Events', 'Fetch Correlation Events Only'
         events_columns (str): Columns of the events to be extracted from query.
         events_limit (int): Maximum number of events to enrich the offense.
-        max_retries (int): Number of retries.
+        on_offenses_enriched (Callable): If given, called with the enriched offenses each time the offenses following
+                                         the ones it was already called with are all enriched, so the offenses are
+                                         handed over in the order of the given offenses, as soon as they are ready.
 
     Returns:
-        (Dict): Enriched offense with events.
-    """
-    failure_message = ''
-    events: List[dict] = []
-    min_events_size = min(offense.get('event_count', 0), events_limit)
-    # decreasing 1 minute from the start_time to avoid the case where the minute queried of start_time equals end_time.
-    for i in range(max_retries):
-        # retry to check if we got all the event (its not an error retry), see docstring
-        search_response = create_search_with_retry(client, fetch_mode, offense, events_columns,
-                                                   events_limit)
-        if not search_response:
-            continue
-
-        offense_id = offense['id']
-        events, failure_message = poll_offense_events_with_retry(client, search_response['search_id'], offense_id)
-        if len(events) >= min_events_size:
-            print_debug_msg(f"Fetched {len(events)}/{min_events_size} for offense ID {offense_id}")
-            break
-        print_debug_msg(f'Did not fetch enough events. Expected at least {min_events_size}. Retrying to fetch events '
-                        f'for offense ID: {offense_id}. Retry number {i}/{max_retries}')
-        if i < max_retries - 1:
-            time.sleep(SLEEP_FETCH_EVENT_RETIRES)
-
-    print_debug_msg(f"Reached max retries for offense {offense.get('id')} with failure message {failure_message}")
-    if failure_message == '' and len(events) < min_events_size:
-        failure_message = 'Events were probably not indexed in QRadar at the time of the mirror.'
-
-    offense = dict(offense, mirroring_events_message=failure_message)
-    if events:
-        offense = dict(offense, events=events)
-
-    return offense
+        (List[Dict]): Enriched offenses with events, in the order of the given offenses.
+    """
+    scheduler = EventsSearchScheduler(client, fetch_mode, events_columns, events_limit)
+    enriched_offenses: Dict[Any, Dict] = {}
+    next_offense_index = 0
+    for enriched_offense in scheduler.iter_enriched_offenses(offenses):
+        enriched_offenses[enriched_offense['id']] = enriched_offense
+        first_offense_index = next_offense_index
+        while next_offense_index < len(offenses) and offenses[next_offense_index]['id'] in enriched_offenses:
+            next_offense_index += 1
+        if on_offenses_enriched and next_offense_index > first_offense_index:
+            on_offenses_enriched([enriched_offenses[offense['id']]
+                                  for offense in offenses[first_offense_index:next_offense_index]])
+    return [enriched_offenses.get(offense['id'], offense) for offense in offenses]
 
 
 def get_incidents_long_running_execution(client: Client, offenses_per_fetch: int, user_query: str, fetch_mode: str,
                                          events_columns: str, events_limit: int, ip_enrich: bool, asset_enrich: bool,
                                          last_highest_id: int, incident_type: Optional[str],
-                                         mirror_direction: Optional[str]) -> Tuple[Optional[List[Dict]], Optional[int]]:
+                                         mirror_direction: Optional[str],
+                                         on_incidents_created: Optional[Callable[[List[Dict], int], None]] = None
+                                         ) -> Tuple[Optional[List[Dict]], Optional[int]]:
     """
     Gets offenses from QRadar service, and transforms them to incidents in a long running execution.
+    When offenses are enriched with events, and on_incidents_created is given, the offenses are transformed to incidents
+    as soon as they and all the offenses with a lower ID are enriched, instead of waiting for all the offenses.
     Args:
         client (Client): Client to perform the API calls.
         offenses_per_fetch (int): Maximum number of offenses to be fetched.
@@ -1491,9 +1647,12 @@ def get_incidents_long_running_execution(client: Client, offenses_per_fetch: int
         last_highest_id (int): The highest ID of all the offenses that have been fetched from QRadar service.
         incident_type (Optional[str]): Incident type.
         mirror_direction (Optional[str]): Whether mirror in is activated or not.
+        on_incidents_created (Callable): Called with each batch of incidents created before all the offenses were
+                                         enriched, and the highest ID of the batch offenses.
 
     Returns:
-        (List[Dict], int): List of the incidents, and the new highest ID for next fetch.
+        (List[Dict], int): List of the incidents which were not passed to on_incidents_created,
+                           and the new highest ID for next fetch.
         (None, None): if reset was triggered
     """
     offense_highest_id = get_minimum_id_to_fetch(last_highest_id, user_query)
@@ -1509,35 +1668,42 @@ def get_incidents_long_running_execution(client: Client, offenses_per_fetch: int
     new_highest_offense_id = raw_offenses[-1].get('id') if raw_offenses else offense_highest_id
     print_debug_msg(f'New highest ID returned from QRadar offenses: {new_highest_offense_id}')
 
-    offenses = []
+    def offenses_to_incidents(offenses: List[Dict]) -> List[Dict]:
+        offenses_with_mirror = [
+            dict(offense, mirror_direction=mirror_direction, mirror_instance=demisto.integrationInstance())
+            for offense in offenses] if mirror_direction else offenses
+        enriched_offenses = enrich_offenses_result(client, offenses_with_mirror, ip_enrich, asset_enrich)
+        final_offenses = sanitize_outputs(enriched_offenses)
+        return create_incidents_from_offenses(final_offenses, incident_type)
+
+    created_offenses_ids: Set[Any] = set()
+    reset_triggered = False
+
+    def create_enriched_offenses_incidents(enriched_offenses: List[Dict]):
+        nonlocal reset_triggered
+        if reset_triggered or not on_incidents_created:
+            return
+        if is_reset_triggered():
+            reset_triggered = True
+            return
+        on_incidents_created(offenses_to_incidents(enriched_offenses), enriched_offenses[-1].get('id'))
+        created_offenses_ids.update(offense['id'] for offense in enriched_offenses)
+
+    offenses: List[Dict] = []
     if fetch_mode != FetchMode.no_events.value:
         try:
-            futures = []
-            for offense in raw_offenses:
-                futures.append(EXECUTOR.submit(
-                    enrich_offense_with_events,
-                    client=client,
-                    offense=offense,
-                    fetch_mode=fetch_mode,
-                    events_columns=events_columns,
-                    events_limit=events_limit,
-                ))
-            offenses = [future.result(timeout=DEFAULT_EVENTS_TIMEOUT * 60) for future in futures]
-        except concurrent.futures.TimeoutError as e:
+            offenses = enrich_offenses_with_events(client, raw_offenses, fetch_mode, events_columns, events_limit,
+                                                   on_offenses_enriched=create_enriched_offenses_incidents)
+        except Exception as e:
             print_debug_msg(
                 f"Error while enriching mirrored offenses with events: {str(e)} \n {traceback.format_exc()}")
             update_missing_offenses_from_raw_offenses(raw_offenses, offenses)
     else:
         offenses = raw_offenses
-    if is_reset_triggered():
+    if reset_triggered or is_reset_triggered():
         return None, None
-    offenses_with_mirror = [
-        dict(offense, mirror_direction=mirror_direction, mirror_instance=demisto.integrationInstance())
-        for offense in offenses] if mirror_direction else offenses
-    enriched_offenses = enrich_offenses_result(client, offenses_with_mirror, ip_enrich, asset_enrich)
-    final_offenses = sanitize_outputs(enriched_offenses)
-    incidents = create_incidents_from_offenses(final_offenses, incident_type)
-    return incidents, new_highest_offense_id
+    offenses = [offense for offense in offenses if offense['id'] not in created_offenses_ids]
+    return offenses_to_incidents(offenses), new_highest_offense_id
 
 
 def update_missing_offenses_from_raw_offenses(raw_offenses: list, offenses: list):
@@ -1591,19 +1757,8 @@ def update_mirrored_events(client: Client,
     updated_offenses = []
     try:
         if len(offenses) > 0:
-            futures = []
-            for offense in offenses:
-                print_debug_msg(f"Updating events in offense: {offense.get('id')}")
-                futures.append(EXECUTOR.submit(
-                    enrich_offense_with_events,
-                    client=client,
-                    offense=offense,
-                    fetch_mode=fetch_mode,
-                    events_columns=events_columns,
-                    events_limit=events_limit,
-                ))
-
-            updated_offenses += [future.result(timeout=DEFAULT_EVENTS_TIMEOUT * 60) for future in futures]
+            print_debug_msg(f"Updating events in offenses: {[offense.get('id') for offense in offenses]}")
+            updated_offenses += enrich_offenses_with_events(client, offenses, fetch_mode, events_columns, events_limit)
 
     except Exception as e:
         print_debug_msg(f"Error while enriching mirrored offenses with events: {str(e)} \n {traceback.format_exc()}")
@@ -1654,7 +1809,8 @@ def print_mirror_events_stats(context_data: dict, stage: str) -> Set[str]:
     if samples:
         sample_length = len(samples[0])
     not_updated_ids = [str(offense.get('id')) for offense in waiting_for_update]
-    stats = [(str(offense.get('id')), len(offense.get('events', []))) for offense in updated]
+    stats = [(str(offense.get('id')), offense.get(MIRRORED_EVENTS_COUNT_KEY, len(offense.get('events', []))))
+             for offense in updated]
     print_debug_msg(f"Mirror Events Stats: {stage}\n Updated Offenses (id, len(events)): {stats}"
                     f"\n Offenses ids waiting for update: {not_updated_ids}"
                     f"\n Resubmitted offenses: {resubmitted_ids}"
@@ -1709,6 +1865,18 @@ def perform_long_running_loop(client: Client, offenses_per_fetch: int, fetch_mod
     is_reset_triggered()
     ctx, ctx_version = get_integration_context_with_version()
     print_debug_msg(f'Starting fetch loop. Fetch mode: {fetch_mode}, Mirror option: {mirror_options}.')
+
+    orig_context_data = extract_context_data(ctx.copy(), include_id=True)
+    context_data = {LAST_FETCH_KEY: orig_context_data.get(LAST_FETCH_KEY, 0)}
+
+    def create_incidents(incidents: List[Dict], highest_id: int):
+        # the highest ID is saved as soon as its incidents are created, it only covers offenses fetched in ID order
+        demisto.createIncidents(incidents)
+        print_debug_msg(f'Saving New Highest ID: {highest_id}')
+        context_data.update({'samples': incidents[:SAMPLE_SIZE], LAST_FETCH_KEY: int(highest_id)})
+        set_integration_context_data({'samples': json_dumps_inner(context_data['samples']),
+                                      LAST_FETCH_KEY: int(highest_id)})
+
     incidents, new_highest_id = get_incidents_long_running_execution(
         client=client,
         offenses_per_fetch=offenses_per_fetch,
@@ -1720,12 +1888,10 @@ def perform_long_running_loop(client: Client, offenses_per_fetch: int, fetch_mod
         asset_enrich=asset_enrich,
         last_highest_id=int(json.loads(ctx.get(LAST_FETCH_KEY, '0'))),
         incident_type=incident_type,
-        mirror_direction=mirror_direction
+        mirror_direction=mirror_direction,
+        on_incidents_created=create_incidents
     )
 
-    orig_context_data = extract_context_data(ctx.copy(), include_id=True)
-    context_data = {LAST_FETCH_KEY: orig_context_data.get(LAST_FETCH_KEY, 0)}
-
     updated_mirrored_offenses = None
     ctx = extract_context_data(ctx)
     if mirror_options == MIRROR_OFFENSE_AND_EVENTS:
@@ -3074,8 +3240,52 @@ def json_dumps_inner(listed_objects: list) -> List[str]:
     return listed_json_dumps
 
 
+def get_events_ctx_key(offense_id: Any) -> str:
+    """Returns the integration context key which holds the mirrored events of the offense.
+
+    Args:
+        offense_id: The offense id.
+
+    Returns: The integration context key of the offense events.
+    """
+    return f'{MIRRORED_EVENTS_CTX_KEY_PREFIX}{offense_id}'
+
+
+def get_offense_events(integration_context: dict, offense: dict) -> List[Dict]:
+    """Decode the mirrored events of an updated offense from the integration context.
+    Events are kept apart from the offense in the integration context, and decoded only when needed.
+
+    Args:
+        integration_context: The integration context, as returned by get_integration_context_with_version.
+        offense: The updated offense, as extracted from the integration context.
+
+    Returns: The mirrored events of the offense.
+    """
+    if 'events' in offense:
+        # Offenses in the previous context data format keep their events.
+        return offense['events']
+    events = integration_context.get(get_events_ctx_key(offense.get('id')))
+    return json.loads(events) if events else []
+
+
+def extract_offenses_state(offenses_state: str) -> list:
+    """Decode the offenses kept in the integration context by their id.
+
+    Args:
+        offenses_state: The JSON encoded offenses, either a mapping from offense id to the offense, or a list of
+                        JSON encoded offenses in the previous context data format.
+
+    Returns: The offenses.
+    """
+    offenses = json.loads(offenses_state)
+    if isinstance(offenses, list):
+        return json_loads_inner(offenses)
+    return list(offenses.values())
+
+
 def extract_context_data(context_data: dict, include_id: bool = False) -> dict:
     """Transform the context data from partially json encoded to fully decoded.
+    The offenses' mirrored events are not decoded, see get_offense_events.
 
     Args:
         context_data: The context data.
@@ -3083,16 +3293,17 @@ def extract_context_data(context_data: dict, include_id: bool = False) -> dict:
 
     Returns: The extracted context data.
     """
-    new_context_data = context_data.copy()
-    new_context_data.pop(LAST_FETCH_KEY, None)
-    if not new_context_data:
-        new_context_data = {}
+    new_context_data = {key: value for key, value in context_data.items()
+                        if key != LAST_FETCH_KEY and not key.startswith(MIRRORED_EVENTS_CTX_KEY_PREFIX)}
+    resubmitted_offenses = json.loads(context_data.get(RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY, '[]'))
+    if isinstance(json.loads(context_data.get(UPDATED_MIRRORED_OFFENSES_CTX_KEY, '{}')), list):
+        # Previous context data format, migrated to the current format on the next update.
+        resubmitted_offenses = json_loads_inner(resubmitted_offenses)
     new_context_data.update({
-        UPDATED_MIRRORED_OFFENSES_CTX_KEY: json_loads_inner(json.loads(
-            context_data.get(UPDATED_MIRRORED_OFFENSES_CTX_KEY, '[]'))),
-        MIRRORED_OFFENSES_CTX_KEY: json_loads_inner(json.loads(context_data.get(MIRRORED_OFFENSES_CTX_KEY, '[]'))),
-        RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: json_loads_inner(json.loads(
-            context_data.get(RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY, '[]'))),
+        UPDATED_MIRRORED_OFFENSES_CTX_KEY: extract_offenses_state(
+            context_data.get(UPDATED_MIRRORED_OFFENSES_CTX_KEY, '{}')),
+        MIRRORED_OFFENSES_CTX_KEY: extract_offenses_state(context_data.get(MIRRORED_OFFENSES_CTX_KEY, '{}')),
+        RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: resubmitted_offenses,
         'samples': json_loads_inner(json.loads(context_data.get('samples', '[]'))),
         'last_mirror_update': json.loads(context_data.get('last_mirror_update', '0'))
     })
@@ -3104,7 +3315,9 @@ def extract_context_data(context_data: dict, include_id: bool = False) -> dict:
 
 def encode_context_data(context_data: dict, include_id: bool = False) -> dict:
     """Transform the context data from a decoded python object form to a partially json encoded form.
-    This is done in order to maintain compatibility with the set_to_integration_context_with_retries command.
+    This is done in order to maintain compatibility with the set_integration_context_data command.
+    Mirrored offenses are kept by their id, and the events of updated offenses are kept in their own key, so only
+    newly updated events are encoded. A None value marks a key to be removed.
 
     Args:
         context_data: The context data in its decoded python object form
@@ -3116,11 +3329,22 @@ def encode_context_data(context_data: dict, include_id: bool = False) -> dict:
     new_context_data.pop('retry_compatible', None)
     new_context_data.pop(LAST_FETCH_KEY, None)
     new_context_data.pop(RESET_KEY, None)
+    updated_offenses = {}
+    for offense in context_data.get(UPDATED_MIRRORED_OFFENSES_CTX_KEY, []):
+        offense_id = str(offense.get('id'))
+        if 'events' in offense:
+            offense = offense.copy()
+            events = offense.pop('events')
+            offense[MIRRORED_EVENTS_COUNT_KEY] = len(events)
+            new_context_data[get_events_ctx_key(offense_id)] = events
+        elif MIRRORED_EVENTS_COUNT_KEY not in offense:
+            new_context_data[get_events_ctx_key(offense_id)] = None
+        updated_offenses[offense_id] = offense
     new_context_data.update({
-        UPDATED_MIRRORED_OFFENSES_CTX_KEY: json_dumps_inner(context_data.get(UPDATED_MIRRORED_OFFENSES_CTX_KEY, [])),
-        MIRRORED_OFFENSES_CTX_KEY: json_dumps_inner(context_data.get(MIRRORED_OFFENSES_CTX_KEY, [])),
-        RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: json_dumps_inner(context_data.get(RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY,
-                                                                                 [])),
+        UPDATED_MIRRORED_OFFENSES_CTX_KEY: updated_offenses,
+        MIRRORED_OFFENSES_CTX_KEY: {str(offense.get('id')): offense
+                                    for offense in context_data.get(MIRRORED_OFFENSES_CTX_KEY, [])},
+        RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: context_data.get(RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY, []),
         'samples': json_dumps_inner(context_data.get('samples', [])),
         'last_mirror_update': str(context_data.get('last_mirror_update', 0))
     })
@@ -3130,6 +3354,39 @@ def encode_context_data(context_data: dict, include_id: bool = False) -> dict:
     return new_context_data
 
 
+def set_integration_context_data(context_data: dict, max_retry_times: int = CONTEXT_UPDATE_RETRY_TIMES) -> None:
+    """Update the integration context with the encoded context data with multiple attempts.
+    Only the keys of the context data are JSON encoded, other keys are kept as is. Events of offenses which are no
+    longer in UPDATED_MIRRORED_OFFENSES_CTX_KEY are removed.
+
+    Args:
+        context_data: The context data in its partially json encoded form, as returned by encode_context_data.
+        max_retry_times: The maximum number of attempts to try.
+
+    raise DemistoException if reached maximum of retries.
+    """
+    for attempt in range(max_retry_times):
+        integration_context, version = get_integration_context_with_version()
+        for key, value in context_data.items():
+            if value is None:
+                integration_context.pop(key, None)
+            else:
+                integration_context[key] = json.dumps(value)
+        if UPDATED_MIRRORED_OFFENSES_CTX_KEY in context_data:
+            updated_offenses_ids = context_data[UPDATED_MIRRORED_OFFENSES_CTX_KEY]
+            for key in [key for key in integration_context if key.startswith(MIRRORED_EVENTS_CTX_KEY_PREFIX)]:
+                if key[len(MIRRORED_EVENTS_CTX_KEY_PREFIX):] not in updated_offenses_ids:
+                    integration_context.pop(key)
+        try:
+            set_integration_context(integration_context, version=version)
+            return
+        except ValueError as e:
+            print_debug_msg(f'Failed updating integration context with version {version}: {str(e)}. '
+                            f'Attempt {attempt + 1}/{max_retry_times}.')
+            time.sleep(secrets.randbelow(100) / 1000)
+    raise DemistoException('Failed updating integration context. Max retry attempts exceeded.')
+
+
 @safely_update_context_data
 def remove_offense_from_context_data(context_data: dict, version: Any, offense_id: str,
                                      offense_to_remove: str) -> Tuple[dict, Any, dict]:
@@ -3245,8 +3502,8 @@ def get_remote_data_command(client: Client, params: Dict[str, Any], args: Dict)
 
         if evented_offense:
             demisto.debug(f"Mirror Events: Offense {offense.get('id')} events were updated, updating incident.")
-            if evented_offense[0].get('events'):
-                offense['events'] = evented_offense[0].get('events')
+            if events := get_offense_events(raw_context, evented_offense[0]):
+                offense['events'] = events
                 failure_message = evented_offense[0].get('mirroring_events_message', '')
                 demisto.debug(f"Mirror Events: Offense {offense.get('id')} now has {len(offense.get('events'))} "
                               f"fetched events. Mirror message: {failure_message}")
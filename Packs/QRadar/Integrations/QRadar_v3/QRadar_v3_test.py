@@ -1,11 +1,10 @@
 """
     QRadar v3 integration for Cortex XSOAR - Unit Tests file
 """
-import concurrent.futures
 import io
 import json
 from datetime import datetime
-from typing import Dict, Callable
+from typing import Dict, Callable, Set
 
 import QRadar_v3  # import module separately for mocker
 import pytest
@@ -13,11 +12,12 @@ import pytz
 from QRadar_v3 import USECS_ENTRIES, OFFENSE_OLD_NEW_NAMES_MAP, MINIMUM_API_VERSION, REFERENCE_SETS_OLD_NEW_MAP, \
     Client, ASSET_PROPERTIES_NAME_MAP, FetchMode, \
     FULL_ASSET_PROPERTIES_NAMES_MAP, EntryType, EntryFormat, MIRROR_OFFENSE_AND_EVENTS, LAST_FETCH_KEY, \
-    MIRRORED_OFFENSES_CTX_KEY, UPDATED_MIRRORED_OFFENSES_CTX_KEY, RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY
+    MIRRORED_OFFENSES_CTX_KEY, UPDATED_MIRRORED_OFFENSES_CTX_KEY, RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY, \
+    MIRRORED_EVENTS_COUNT_KEY
 from QRadar_v3 import get_time_parameter, add_iso_entries_to_dict, build_final_outputs, build_headers, \
     get_offense_types, get_offense_closing_reasons, get_domain_names, get_rules_names, enrich_assets_results, \
-    get_offense_addresses, get_minimum_id_to_fetch, poll_offense_events_with_retry, sanitize_outputs, \
-    create_search_with_retry, enrich_offense_with_events, enrich_offense_with_assets, get_offense_enrichment, \
+    get_offense_addresses, get_minimum_id_to_fetch, sanitize_outputs, create_events_search_query, \
+    EventsSearchScheduler, OffenseEventsSearch, enrich_offenses_with_events, enrich_offense_with_assets, get_offense_enrichment, \
     add_iso_entries_to_asset, create_single_asset_for_offense_enrichment, create_incidents_from_offenses, \
     qradar_offenses_list_command, qradar_offense_update_command, qradar_closing_reasons_list_command, \
     qradar_offense_notes_list_command, qradar_offense_notes_create_command, qradar_rules_list_command, \
@@ -30,7 +30,7 @@ from QRadar_v3 import get_time_parameter, add_iso_entries_to_dict, build_final_o
     flatten_nested_geolocation_values, get_modified_remote_data_command, get_remote_data_command, is_valid_ip, \
     qradar_ips_source_get_command, qradar_ips_local_destination_get_command, update_mirrored_events, \
     encode_context_data, extract_context_data, change_ctx_to_be_compatible_with_retry, clear_integration_ctx, \
-    reset_mirroring_events_variables, perform_long_running_loop
+    reset_mirroring_events_variables, perform_long_running_loop, get_offense_events, set_integration_context_data
 
 from CommonServerPython import DemistoException, set_integration_context, CommandResults, \
     GetModifiedRemoteDataResponse, GetRemoteDataResponse, get_integration_context
@@ -38,6 +38,7 @@ from CommonServerPython import set_to_integration_context_with_retries
 
 QRadar_v3.FAILURE_SLEEP = 0
 QRadar_v3.SLEEP_FETCH_EVENT_RETIRES = 0
+QRadar_v3.EVENTS_INTERVAL_SECS = 0
 
 client = Client(
     server='https://192.168.0.1',
@@ -346,10 +347,15 @@ def test_create_single_asset_for_offense_enrichment():
                            None,
                            None,
                            None,
-                           ([], "DemistoException('error occurred', None) \nSee logs for further details."))
+                           ([], "DemistoException('error occurred', None) \nSee logs for further details.")),
+                          (None,
+                           command_test_data['search_create']['response'],
+                           None,
+                           '19e90792-1a17-403b-ae5b-d0e60740b95e',
+                           (None, ''))
                           ])
-def test_poll_offense_events_with_retry(requests_mock, status_exception, status_response, results_response, search_id,
-                                        expected):
+def test_events_search_scheduler_poll_search(requests_mock, status_exception, status_response, results_response,
+                                             search_id, expected):
     """
     Given:
      - Client to perform API calls.
@@ -357,11 +363,13 @@ def test_poll_offense_events_with_retry(requests_mock, status_exception, status_
 
     When:
      - Case a: QRadar returns a valid and terminated results to the search.
-     - Case b: Error occurred in request to QRadar during poll.
+     - Case b: Error occurred in request to QRadar during poll, for the last allowed time.
+     - Case c: The search is still running in QRadar.
 
     Then:
      - Case a: Ensure that expected events are returned.
-     - Case b: Ensure that None is returned.
+     - Case b: Ensure that empty list is returned, and failure message is set.
+     - Case c: Ensure that None is returned.
     """
     if status_exception:
         requests_mock.get(
@@ -377,47 +385,31 @@ def test_poll_offense_events_with_retry(requests_mock, status_exception, status_
         f'{client.server}/api/ariel/searches/{search_id}/results',
         json=results_response
     )
-    assert poll_offense_events_with_retry(client, search_id, 1, 1) == expected
+    scheduler = EventsSearchScheduler(client, 'Fetch With All Events', event_columns_default_value, 20)
+    search = OffenseEventsSearch(command_test_data['offenses_list']['response'][0], 20)
+    search.search_id = search_id
+    search.failures_count = QRadar_v3.EVENTS_FAILURE_LIMIT - 1 if status_exception else 0
+    assert (scheduler.poll_search(search), search.failure_message) == expected
 
 
-@pytest.mark.parametrize('search_exception, fetch_mode, query_expression, search_response',
-                         [(None, 'Fetch With All Events', command_test_data['all_events_query'],
-                           command_test_data['search_create']['response']),
-                          (DemistoException('error occurred'),
-                           'Fetch With All Events', command_test_data['all_events_query'],
-                           None),
-                          (None, 'Fetch Correlation Events Only', command_test_data['correlation_events_query'],
-                           command_test_data['search_create']['response']),
-                          (DemistoException('error occurred'),
-                           'Fetch Correlation Events Only', command_test_data['correlation_events_query'],
-                           None)
+@pytest.mark.parametrize('fetch_mode, query_expression',
+                         [('Fetch With All Events', command_test_data['all_events_query']),
+                          ('Fetch Correlation Events Only', command_test_data['correlation_events_query'])
                           ])
-def test_create_search_with_retry(mocker, search_exception, fetch_mode, query_expression, search_response):
+def test_create_events_search_query(fetch_mode, query_expression):
     """
     Given:
-     - Client to perform API calls.
-     - Query for creating search in QRadar service.
+     - Offense to enrich with events.
     When:
-     - Case a: QRadar manages to create search, fetch_mode is all events.
-     - Case b: Error occurred in request to QRadar search creation, fetch_mode is all events.
-     - Case c: QRadar manages to create search, fetch_mode is correlation events only.
-     - Case d: Error occurred in request to QRadar search creation, fetch_mode is correlation events only.
+     - Case a: fetch_mode is all events.
+     - Case b: fetch_mode is correlation events only.
 
     Then:
-     - Case a: Ensure that QRadar service response is returned.
-     - Case b: Ensure that None is returned.
-     - Case c: Ensure that QRadar service response is returned.
-     - Case d: Ensure that None is returned.
+     - Case a: Ensure the query expression of the search is as expected.
+     - Case b: Ensure additional where clause is added to the query expression.
     """
-    set_to_integration_context_with_retries(dict())
-    if search_exception:
-        mocker.patch.object(client, "search_create", side_effect=[search_exception])
-    else:
-        mocker.patch.object(client, "search_create", return_value=search_response)
-    assert create_search_with_retry(client, fetch_mode=fetch_mode,
-                                    offense=command_test_data['offenses_list']['response'][0],
-                                    event_columns=event_columns_default_value, events_limit=20,
-                                    max_retries=1) == search_response
+    assert create_events_search_query(fetch_mode, command_test_data['offenses_list']['response'][0],
+                                      event_columns_default_value, 20) == query_expression
 
 
 @pytest.mark.parametrize(
@@ -425,58 +417,58 @@ def test_create_search_with_retry(mocker, search_exception, fetch_mode, query_ex
     [
         # success cases
         (command_test_data['offenses_list']['response'][0],
-         'correlations_events_only',
+         'Fetch Correlation Events Only',
          command_test_data['search_create']['response'],
-         (sanitize_outputs(command_test_data['search_results_get']['response']['events']), ''),
+         command_test_data['search_results_get']['response']['events'],
          3
          ),
         (command_test_data['offenses_list']['response'][0],
-         'correlations_events_only',
+         'Fetch Correlation Events Only',
          command_test_data['search_create']['response'],
-         (sanitize_outputs(command_test_data['search_results_get']['response']['events'][:1]), ''),
+         command_test_data['search_results_get']['response']['events'][:1],
          1
          ),
         (command_test_data['offenses_list']['response'][0],
-         'all_events',
+         'Fetch With All Events',
          command_test_data['search_create']['response'],
-         (sanitize_outputs(command_test_data['search_results_get']['response']['events']), ''),
+         command_test_data['search_results_get']['response']['events'],
          3
          ),
         (command_test_data['offenses_list']['response'][0],
-         'all_events',
+         'Fetch With All Events',
          command_test_data['search_create']['response'],
-         (sanitize_outputs(command_test_data['search_results_get']['response']['events'][:1]), ''),
+         command_test_data['search_results_get']['response']['events'][:1],
          1
          ),
 
         # failure cases
         (command_test_data['offenses_list']['response'][0],
-         'correlations_events_only',
+         'Fetch Correlation Events Only',
          None,
          None,
          3
          ),
         (command_test_data['offenses_list']['response'][0],
-         'correlations_events_only',
+         'Fetch Correlation Events Only',
          command_test_data['search_create']['response'],
-         (sanitize_outputs(command_test_data['search_results_get']['response']['events'][:1]), ''),
+         [],
          3
          ),
         (command_test_data['offenses_list']['response'][0],
-         'all_events',
+         'Fetch With All Events',
          None,
          None,
          3
          ),
         (command_test_data['offenses_list']['response'][0],
-         'all_events',
+         'Fetch With All Events',
          command_test_data['search_create']['response'],
-         (sanitize_outputs(command_test_data['search_results_get']['response']['events'][:1]), ''),
+         [],
          3
          ),
     ])
-def test_enrich_offense_with_events(mocker, offense: Dict, fetch_mode, mock_search_response: Dict,
-                                    poll_events_response, events_limit):
+def test_enrich_offenses_with_events(mocker, offense: Dict, fetch_mode, mock_search_response: Dict,
+                                     poll_events_response, events_limit):
     """
     Given:
      - Offense to enrich with events.
@@ -486,11 +478,9 @@ def test_enrich_offense_with_events(mocker, offense: Dict, fetch_mode, mock_sear
     Success cases:
      - Case a: Fetch mode is 'correlations_events_only', number of events returned equals to event count, lower than
                'events_limit'.
-     - Case b: Fetch mode is 'correlations_events_only', number of events returned is lower than event count, but equals
-               to 'events_limit'.
+     - Case b: Fetch mode is 'correlations_events_only', number of events returned equals to 'events_limit'.
      - Case c: Fetch mode is 'all_events', number of events returned equals to event count, lower than 'events_limit'.
-     - Case d: Fetch mode is 'all_events', number of events returned is lower than event count, but equals
-               to 'events_limit'.
+     - Case d: Fetch mode is 'all_events', number of events returned equals to 'events_limit'.
      Failure cases:
      - Case a: Fetch mode is 'correlations_events_only', fails to enrich offense (fails to create search).
      - Case b: Fetch mode is 'correlations_events_only', fails to enrich offense (not enough events).
@@ -500,35 +490,181 @@ def test_enrich_offense_with_events(mocker, offense: Dict, fetch_mode, mock_sear
 
     Then:
         For success cases:
-        - Ensure additional where clause is added to the query if fetch mode is 'correlations_events_only'.
         - Ensure expected events are returned.
-        - Ensure expected count of events are returned.
-        - Ensure poll events is queried with the expected search ID.
+        - Ensure the search is created with the expected query expression.
+        - Ensure the search status and results are queried with the expected search ID.
         For failure cases:
-        - Ensure additional where clause is added to the query if fetch mode is 'correlations_events_only'.
         - Ensure empty list of events are returned.
-        - Ensure poll events is queried with the expected search ID, if search ID succeeded.
+        - Ensure the search is retried the expected number of times.
     """
-    poll_events = poll_events_response[0] if poll_events_response else None
-    if poll_events and len(poll_events) >= min(events_limit, offense.get('event_count')):
-        events = poll_events[:min(events_limit, len(poll_events))] if poll_events else []
-        expected_offense = dict(offense, events=events,
+    if poll_events_response and len(poll_events_response) >= min(events_limit, offense.get('event_count')):
+        expected_offense = dict(offense, events=sanitize_outputs(poll_events_response),
                                 mirroring_events_message='')
     else:
         expected_offense = dict(offense,
                                 mirroring_events_message='Events were probably not indexed in QRadar at the time '
                                                          'of the mirror.')
 
-    mocker.patch.object(QRadar_v3, "create_search_with_retry", return_value=mock_search_response)
-    poll_events_mock = mocker.patch.object(QRadar_v3, "poll_offense_events_with_retry",
-                                           return_value=poll_events_response)
+    if mock_search_response:
+        search_create_mock = mocker.patch.object(client, 'search_create', return_value=mock_search_response)
+    else:
+        search_create_mock = mocker.patch.object(client, 'search_create',
+                                                 side_effect=DemistoException('error occurred'))
+    status_mock = mocker.patch.object(client, 'search_status_get',
+                                      return_value=command_test_data['search_status_get']['response'])
+    results_mock = mocker.patch.object(client, 'search_results_get', return_value={'events': poll_events_response})
 
-    enriched_offense = enrich_offense_with_events(client, offense, fetch_mode, event_columns_default_value,
-                                                  events_limit=events_limit, max_retries=1)
+    enriched_offenses = enrich_offenses_with_events(client, [offense], fetch_mode, event_columns_default_value,
+                                                    events_limit=events_limit)
 
+    assert enriched_offenses == [expected_offense]
     if mock_search_response:
-        assert poll_events_mock.call_args[0][1] == mock_search_response['search_id']
-    assert enriched_offense == expected_offense
+        search_id = mock_search_response['search_id']
+        assert search_create_mock.call_args.kwargs['query_expression'] == create_events_search_query(
+            fetch_mode, offense, event_columns_default_value, events_limit)
+        assert status_mock.call_args[0][0] == search_id
+        assert results_mock.call_args[0][0] == search_id
+        expected_searches = 1 if 'events' in expected_offense else QRadar_v3.MAX_FETCH_EVENT_RETIRES
+        assert search_create_mock.call_count == expected_searches
+    else:
+        assert search_create_mock.call_count == QRadar_v3.MAX_FETCH_EVENT_RETIRES * QRadar_v3.EVENTS_FAILURE_LIMIT
+        status_mock.assert_not_called()
+
+
+def test_events_search_scheduler_concurrent_searches(mocker):
+    """
+    Given:
+     - Offenses to enrich with events.
+     - Budget of 2 concurrent searches.
+
+    When:
+     - Enriching the offenses with events, where each search is running until polled twice.
+
+    Then:
+     - Ensure there are never more than 2 active searches.
+     - Ensure all active searches are polled in the same loop.
+     - Ensure all the offenses are enriched, in their original order.
+    """
+    offenses = [{'id': offense_id, 'event_count': 1, 'start_time': 1613399111536} for offense_id in range(5)]
+    active_searches: Set[str] = set()
+    max_active_searches = 0
+    polls_count: Dict[str, int] = {}
+
+    def search_create(query_expression):
+        nonlocal max_active_searches
+        search_id = query_expression.split('INOFFENSE(')[1].split(')')[0]
+        active_searches.add(search_id)
+        max_active_searches = max(max_active_searches, len(active_searches))
+        return {'search_id': search_id}
+
+    def search_status_get(search_id):
+        polls_count[search_id] = polls_count.get(search_id, 0) + 1
+        return {'status': 'COMPLETED' if polls_count[search_id] >= 2 else 'EXECUTE'}
+
+    def search_results_get(search_id):
+        active_searches.remove(search_id)
+        return {'events': [{'offense': search_id}]}
+
+    mocker.patch.object(client, 'search_create', side_effect=search_create)
+    mocker.patch.object(client, 'search_status_get', side_effect=search_status_get)
+    mocker.patch.object(client, 'search_results_get', side_effect=search_results_get)
+    sleep_mock = mocker.patch.object(QRadar_v3.time, 'sleep')
+    scheduler = EventsSearchScheduler(client, 'Fetch With All Events', '*', 5, max_concurrent_searches=2)
+
+    enriched_offenses = list(scheduler.iter_enriched_offenses(offenses))
+
+    assert max_active_searches == 2
+    assert sorted(offense['id'] for offense in enriched_offenses) == list(range(5))
+    assert all(offense['events'] == [{'offense': str(offense['id'])}] for offense in enriched_offenses)
+    # 5 searches which are polled twice each, 2 at a time.
+    assert sleep_mock.call_count == 6
+
+
+def test_events_search_scheduler_timeout(mocker):
+    """
+    Given:
+     - Offense to enrich with events, which its search never terminates.
+
+    When:
+     - The events enrichment timeout is reached.
+
+    Then:
+     - Ensure the active search is deleted.
+     - Ensure the offense is returned without events.
+    """
+    offense = {'id': 1, 'event_count': 1, 'start_time': 1613399111536}
+    mocker.patch.object(client, 'search_create', return_value={'search_id': '123'})
+    mocker.patch.object(client, 'search_status_get', return_value={'status': 'EXECUTE'})
+    delete_mock = mocker.patch.object(client, 'search_delete')
+    mocker.patch.object(QRadar_v3.time, 'time', side_effect=[0, 0, 0, 0, 0, 20, 20])
+    mocker.patch.object(QRadar_v3.time, 'sleep')
+    scheduler = EventsSearchScheduler(client, 'Fetch With All Events', '*', 5, timeout=10)
+
+    assert list(scheduler.iter_enriched_offenses([offense])) == [
+        dict(offense, mirroring_events_message='Events search did not finish in time.')]
+    delete_mock.assert_called_once_with('123')
+
+
+def test_enrich_offenses_with_events_in_order_prefixes(mocker):
+    """
+    Given:
+     - Offenses whose events enrichment finishes out of the offenses ID order.
+
+    When:
+     - Enriching the offenses with events.
+
+    Then:
+     - Ensure each offense is handed over once all the offenses before it are enriched, in ID order.
+     - Ensure all the enriched offenses are returned in ID order.
+    """
+    offenses = [{'id': offense_id} for offense_id in range(1, 5)]
+    mocker.patch.object(EventsSearchScheduler, 'iter_enriched_offenses',
+                        return_value=iter([dict(offenses[i], events=[]) for i in (1, 0, 3, 2)]))
+    prefixes = []
+
+    enriched_offenses = enrich_offenses_with_events(client, offenses, 'Fetch With All Events', '*', 5,
+                                                    on_offenses_enriched=prefixes.append)
+
+    assert [[offense['id'] for offense in prefix] for prefix in prefixes] == [[1, 2], [3, 4]]
+    assert enriched_offenses == [dict(offense, events=[]) for offense in offenses]
+
+
+def test_perform_long_running_loop_saves_highest_id_of_created_prefixes(mocker):
+    """
+    Given:
+     - Offenses to fetch with events, whose enrichment finishes in two in-order batches.
+
+    When:
+     - Performing the long running loop.
+
+    Then:
+     - Ensure the incidents of each batch are created as soon as the batch is enriched.
+     - Ensure the last fetch ID is saved after each batch, and is not rolled back at the end of the loop.
+    """
+    set_integration_context({})
+    offenses = [{'id': offense_id, 'start_time': 1613399111536} for offense_id in range(6, 10)]
+    mocker.patch.object(client, 'offenses_list', return_value=offenses)
+    mocker.patch.object(QRadar_v3, 'enrich_offenses_result', side_effect=lambda _client, offenses_, *_: offenses_)
+    saved_ids = []
+
+    def enrich_offenses_with_events_mock(*args, on_offenses_enriched=None):
+        on_offenses_enriched(offenses[:2])
+        saved_ids.append(get_integration_context().get(LAST_FETCH_KEY))
+        on_offenses_enriched(offenses[2:])
+        return offenses
+
+    mocker.patch.object(QRadar_v3, 'enrich_offenses_with_events', side_effect=enrich_offenses_with_events_mock)
+    create_incidents_mock = mocker.patch.object(QRadar_v3.demisto, 'createIncidents')
+
+    perform_long_running_loop(client=client, offenses_per_fetch=4, fetch_mode='Fetch With All Events',
+                              mirror_options='', user_query='', events_columns='*', events_limit=3,
+                              ip_enrich=False, asset_enrich=False, incident_type=None, mirror_direction=None)
+
+    assert saved_ids == ['7']
+    assert [[json.loads(incident['rawJSON'])['id'] for incident in call_args[0][0]]
+            for call_args in create_incidents_mock.call_args_list] == [[6, 7], [8, 9]]
+    assert get_integration_context()[LAST_FETCH_KEY] == '9'
+    set_integration_context({})
 
 
 def test_create_incidents_from_offenses():
@@ -1085,19 +1221,9 @@ def test_ip_commands(mocker, command_func: Callable[[Client, Dict], CommandResul
     assert results.raw_response == expected_command_results.raw_response
 
 
-class MockResults:
-    def __init__(self, value):
-        self.value = value
-
-    def result(self, timeout=None):
-        return self.value
-
-
 @pytest.mark.parametrize('offenses, context_data',
                          # One offense with one event.
                          [({'ids': [{'id': '1', 'last_persisted_time': 2}],
-                            'as_results': [MockResults({'id': '1', 'last_persisted_time': 2,
-                                                        'events': [{'event_id': '2'}]})],
                             'with_events': [{'id': '1', 'last_persisted_time': 2,
                                              'events': [{'event_id': '2'}]}]},
                            {'before_offenses_ids': {LAST_FETCH_KEY: 0},
@@ -1115,8 +1241,6 @@ class MockResults:
                                                       MIRRORED_OFFENSES_CTX_KEY: []}]}),
                           # One offense with two events.
                           ({'ids': [{'id': '1', 'last_persisted_time': 2}],
-                            'as_results': [MockResults({'id': '1', 'last_persisted_time': 2,
-                                                        'events': [{'event_id': '2'}, {'event_id': '3'}]})],
                             'with_events': [{'id': '1', 'last_persisted_time': 2,
                                              'events': [{'event_id': '2'}, {'event_id': '3'}]}]},
                            {'before_offenses_ids': {LAST_FETCH_KEY: 0},
@@ -1136,10 +1260,6 @@ class MockResults:
                           # Two offenses with one event.
                           ({'ids': [{'id': '1', 'last_persisted_time': 2},
                                     {'id': '11', 'last_persisted_time': 3}],
-                            'as_results': [MockResults({'id': '1', 'last_persisted_time': 2,
-                                                        'events': [{'event_id': '2'}, {'event_id': '3'}]}),
-                                           MockResults({'id': '11', 'last_persisted_time': 3,
-                                                        'events': [{'event_id': '22'}, {'event_id': '33'}]})],
                             'with_events': [{'id': '1', 'last_persisted_time': 2,
                                              'events': [{'event_id': '2'}, {'event_id': '3'}]},
                                             {'id': '11', 'last_persisted_time': 3,
@@ -1198,13 +1318,13 @@ def test_mirroring_offenses_with_events(mocker, offenses, context_data):
     mocker.patch.object(client, 'offenses_list', return_value=offenses.get('ids'))
     mocker.patch.object(QRadar_v3, 'get_integration_context_with_version', return_value=(set_context_data_as_json(
         context_data.get('before_offenses_ids')), 666))
-    mocker.patch.object(QRadar_v3, 'set_to_integration_context_with_retries')
+    mocker.patch.object(QRadar_v3, 'set_integration_context')
     get_modified_remote_data_command(client, {'mirror_options': MIRROR_OFFENSE_AND_EVENTS}, {"lastUpdate": "0"})
-    QRadar_v3.set_to_integration_context_with_retries.assert_called_once_with(encode_context_data(
-        context_data.get('with_offenses_ids')), max_retry_times=1)
+    QRadar_v3.set_integration_context.assert_called_once_with(set_context_data_as_json(
+        context_data.get('with_offenses_ids')), version=666)
 
     # Transfer that list to the long running docker and update the events.
-    mocker.patch.object(concurrent.futures.ThreadPoolExecutor, 'submit', side_effect=offenses.get('as_results'))
+    mocker.patch.object(QRadar_v3, 'enrich_offenses_with_events', return_value=offenses.get('with_events'))
     updated_mirrored_offenses = update_mirrored_events(client=client,
                                                        fetch_mode=FetchMode.correlations_events_only.value,
                                                        events_columns='',
@@ -1220,13 +1340,13 @@ def test_mirroring_offenses_with_events(mocker, offenses, context_data):
             context_data.get('with_events')[offense_index]), 666))
         mocker.patch.object(client, 'offenses_list', return_value=offense)
         mocker.patch.object(QRadar_v3, 'enrich_offenses_result', return_value=offense)
-        mocker.patch.object(QRadar_v3, 'set_to_integration_context_with_retries')
+        mocker.patch.object(QRadar_v3, 'set_integration_context')
         result = get_remote_data_command(client, {'mirror_options': MIRROR_OFFENSE_AND_EVENTS},
                                          {'id': offense.get('id'), 'lastUpdate': 1})
 
         # Make sure the final offense has it's updated events
-        QRadar_v3.set_to_integration_context_with_retries.assert_called_once_with(
-            encode_context_data(context_data.get('with_updated_removed')[offense_index]), max_retry_times=1)
+        QRadar_v3.set_integration_context.assert_called_once_with(
+            set_context_data_as_json(context_data.get('with_updated_removed')[offense_index]), version=666)
         assert result.mirrored_object.get('events', '')
 
         updated_result_events = result.mirrored_object.get('events')
@@ -1236,10 +1356,7 @@ def test_mirroring_offenses_with_events(mocker, offenses, context_data):
 
 def set_context_data_as_json(context_data, include_id=False):
     new_context_data = encode_context_data(context_data, include_id=include_id)
-    for key in new_context_data.keys():
-        new_context_data[key] = json.dumps(new_context_data[key])
-
-    return new_context_data
+    return {key: json.dumps(value) for key, value in new_context_data.items() if value is not None}
 
 
 @pytest.mark.parametrize('offenses, context_data',
@@ -1372,13 +1489,13 @@ def test_mirroring_with_events_resubmit_exhausted_offenses(mocker, offenses, con
     mocker.patch.object(client, 'offenses_list', return_value=offenses.get('new_offenses'))
     mocker.patch.object(QRadar_v3, 'get_integration_context_with_version', return_value=(set_context_data_as_json(
         context_data.get('get_modified_input')), 666))
-    mocker.patch.object(QRadar_v3, 'set_to_integration_context_with_retries')
+    mocker.patch.object(QRadar_v3, 'set_integration_context')
     mocker.patch.object(QRadar_v3, 'GetModifiedRemoteDataResponse')
 
     get_modified_remote_data_command(client, {'mirror_options': MIRROR_OFFENSE_AND_EVENTS}, {"lastUpdate": "0"})
 
-    QRadar_v3.set_to_integration_context_with_retries.assert_called_once_with(encode_context_data(
-        context_data.get('get_modified_output')), max_retry_times=1)
+    QRadar_v3.set_integration_context.assert_called_once_with(set_context_data_as_json(
+        context_data.get('get_modified_output')), version=666)
     assert set(QRadar_v3.GetModifiedRemoteDataResponse.call_args.args[0]) == set(offenses.get('to_update'))
     assert len(QRadar_v3.GetModifiedRemoteDataResponse.call_args.args[0]) == len(offenses.get('to_update'))
 
@@ -1391,13 +1508,13 @@ def test_mirroring_with_events_resubmit_exhausted_offenses(mocker, offenses, con
             context_input_for_get_remote_data), 666))
         mocker.patch.object(client, 'offenses_list', return_value=offense)
         mocker.patch.object(QRadar_v3, 'enrich_offenses_result', return_value=offense)
-        mocker.patch.object(QRadar_v3, 'set_to_integration_context_with_retries')
+        mocker.patch.object(QRadar_v3, 'set_integration_context')
         get_remote_data_command(client, {'mirror_options': MIRROR_OFFENSE_AND_EVENTS},
                                 {'id': offense.get('id'), 'lastUpdate': 1})
 
         # Make sure the final offense has it's updated events
-        QRadar_v3.set_to_integration_context_with_retries.assert_called_once_with(
-            encode_context_data(context_data.get('after_get_remote_data')[offense_index]), max_retry_times=1)
+        QRadar_v3.set_integration_context.assert_called_once_with(
+            set_context_data_as_json(context_data.get('after_get_remote_data')[offense_index]), version=666)
 
         context_input_for_get_remote_data = context_data.get('after_get_remote_data')[offense_index]
 
@@ -1514,26 +1631,26 @@ def test_mirroring_with_events_remove_resubmitted_offenses(mocker, offenses, con
     mocker.patch.object(client, 'offenses_list', return_value=offenses.get('new_offenses'))
     mocker.patch.object(QRadar_v3, 'get_integration_context_with_version',
                         return_value=(set_context_data_as_json(context_data.get('get_modified_input')), 666))
-    mocker.patch.object(QRadar_v3, 'set_to_integration_context_with_retries')
+    mocker.patch.object(QRadar_v3, 'set_integration_context')
     mocker.patch.object(QRadar_v3, 'GetModifiedRemoteDataResponse')
 
     get_modified_remote_data_command(client, {'mirror_options': MIRROR_OFFENSE_AND_EVENTS}, {"lastUpdate": "0"})
 
-    QRadar_v3.set_to_integration_context_with_retries.assert_called_once_with(encode_context_data(
-        context_data.get('get_modified_output')), max_retry_times=1)
+    QRadar_v3.set_integration_context.assert_called_once_with(set_context_data_as_json(
+        context_data.get('get_modified_output')), version=666)
     assert set(QRadar_v3.GetModifiedRemoteDataResponse.call_args.args[0]) == set(offenses.get('to_update'))
     assert len(QRadar_v3.GetModifiedRemoteDataResponse.call_args.args[0]) == len(offenses.get('to_update'))
 
     mocker.patch.object(client, 'offenses_list', return_value=offenses.get('newer_offenses'))
     mocker.patch.object(QRadar_v3, 'get_integration_context_with_version', return_value=(set_context_data_as_json(
         context_data.get('get_modified_output')), 666))
-    mocker.patch.object(QRadar_v3, 'set_to_integration_context_with_retries')
+    mocker.patch.object(QRadar_v3, 'set_integration_context')
     mocker.patch.object(QRadar_v3, 'GetModifiedRemoteDataResponse')
 
     get_modified_remote_data_command(client, {'mirror_options': MIRROR_OFFENSE_AND_EVENTS}, {"lastUpdate": "0"})
 
-    QRadar_v3.set_to_integration_context_with_retries.assert_called_once_with(encode_context_data(
-        context_data.get('clean_get_modified_output')), max_retry_times=1)
+    QRadar_v3.set_integration_context.assert_called_once_with(set_context_data_as_json(
+        context_data.get('clean_get_modified_output')), version=666)
     assert set(QRadar_v3.GetModifiedRemoteDataResponse.call_args.args[0]) == set(offenses.get('clean_to_update'))
     assert len(QRadar_v3.GetModifiedRemoteDataResponse.call_args.args[0]) == len(offenses.get('clean_to_update'))
 
@@ -1552,8 +1669,109 @@ def test_mirroring_with_events_remove_resubmitted_offenses(mocker, offenses, con
      MIRRORED_OFFENSES_CTX_KEY: [],
      RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: ['1', '11']}])
 def test_extract_decode_encode(context_data):
-    assert extract_context_data(set_context_data_as_json(context_data, include_id=True),
-                                include_id=True) == context_data
+    """
+    Given:
+        Context data with updated offenses and their events.
+
+    When:
+        Encoding the context data and extracting it back.
+
+    Then:
+        Ensure the context data is extracted as is, except the events of the updated offenses.
+        Ensure the events of the updated offenses are decoded by get_offense_events.
+    """
+    integration_context = set_context_data_as_json(context_data, include_id=True)
+    extracted_context_data = extract_context_data(integration_context, include_id=True)
+
+    updated_offenses = context_data[UPDATED_MIRRORED_OFFENSES_CTX_KEY]
+    extracted_updated_offenses = [
+        {'id': offense['id'], 'last_persisted_time': offense['last_persisted_time'],
+         MIRRORED_EVENTS_COUNT_KEY: len(offense['events'])} for offense in updated_offenses]
+    assert extracted_context_data == dict(context_data, **{UPDATED_MIRRORED_OFFENSES_CTX_KEY:
+                                                           extracted_updated_offenses})
+    for offense, extracted_offense in zip(updated_offenses, extracted_context_data[UPDATED_MIRRORED_OFFENSES_CTX_KEY]):
+        assert get_offense_events(integration_context, extracted_offense) == offense['events']
+
+
+def test_extract_previous_context_data_format():
+    """
+    Given:
+        Context data in the previous format, where offenses are JSON encoded inside JSON encoded lists.
+
+    When:
+        Extracting the context data, and encoding it back.
+
+    Then:
+        Ensure the offenses and their events are extracted.
+        Ensure the encoded context data is in the current format, keyed by offense id, with events kept apart.
+    """
+    updated_offenses = [{'id': '1', 'last_persisted_time': 2, 'events': [{'event_id': '2'}, {'event_id': '3'}]}]
+    mirrored_offenses = [{'id': '11', 'last_persisted_time': 3}]
+    integration_context = {
+        LAST_FETCH_KEY: '5',
+        'samples': '[]',
+        'last_mirror_update': '"10"',
+        UPDATED_MIRRORED_OFFENSES_CTX_KEY: json.dumps([json.dumps(offense) for offense in updated_offenses]),
+        MIRRORED_OFFENSES_CTX_KEY: json.dumps([json.dumps(offense) for offense in mirrored_offenses]),
+        RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: json.dumps([json.dumps('1')]),
+    }
+
+    context_data = extract_context_data(integration_context, include_id=True)
+
+    assert context_data == {LAST_FETCH_KEY: 5, 'samples': [], 'last_mirror_update': '10',
+                            UPDATED_MIRRORED_OFFENSES_CTX_KEY: updated_offenses,
+                            MIRRORED_OFFENSES_CTX_KEY: mirrored_offenses,
+                            RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: ['1']}
+    assert get_offense_events(integration_context, context_data[UPDATED_MIRRORED_OFFENSES_CTX_KEY][0]) == \
+        updated_offenses[0]['events']
+    assert encode_context_data(context_data) == {
+        'samples': [], 'last_mirror_update': '10',
+        UPDATED_MIRRORED_OFFENSES_CTX_KEY: {'1': {'id': '1', 'last_persisted_time': 2, MIRRORED_EVENTS_COUNT_KEY: 2}},
+        MIRRORED_OFFENSES_CTX_KEY: {'11': {'id': '11', 'last_persisted_time': 3}},
+        RESUBMITTED_MIRRORED_OFFENSES_CTX_KEY: ['1'],
+        'mirrored_events_1': [{'event_id': '2'}, {'event_id': '3'}]}
+
+
+def test_set_integration_context_data(mocker):
+    """
+    Given:
+        Integration context with events of offenses 1 and 11.
+
+    When:
+        Updating the context data, where offense 1 was removed, offense 11 is unchanged and offense 12 was updated.
+
+    Then:
+        Ensure only the events of offense 12 are added, and the events of offense 1 are removed.
+        Ensure the events of offense 11 are not encoded again.
+    """
+    integration_context = {
+        LAST_FETCH_KEY: '5',
+        UPDATED_MIRRORED_OFFENSES_CTX_KEY: json.dumps({
+            '1': {'id': '1', MIRRORED_EVENTS_COUNT_KEY: 1},
+            '11': {'id': '11', MIRRORED_EVENTS_COUNT_KEY: 1}}),
+        'mirrored_events_1': '[{"event_id": "1"}]',
+        'mirrored_events_11': '[{"event_id": "11"}]'
+    }
+    mocker.patch.object(QRadar_v3, 'get_integration_context_with_version', return_value=(integration_context, 3))
+    mocker.patch.object(QRadar_v3, 'set_integration_context')
+    context_data = extract_context_data(integration_context)
+    context_data[UPDATED_MIRRORED_OFFENSES_CTX_KEY] = [
+        context_data[UPDATED_MIRRORED_OFFENSES_CTX_KEY][1],
+        {'id': '12', 'events': [{'event_id': '12'}]}
+    ]
+
+    set_integration_context_data(encode_context_data(context_data))
+
+    new_integration_context = QRadar_v3.set_integration_context.call_args[0][0]
+    assert QRadar_v3.set_integration_context.call_args.kwargs == {'version': 3}
+    assert {key: value for key, value in new_integration_context.items() if key.startswith('mirrored_events_')} == {
+        'mirrored_events_11': '[{"event_id": "11"}]',
+        'mirrored_events_12': '[{"event_id": "12"}]'
+    }
+    assert json.loads(new_integration_context[UPDATED_MIRRORED_OFFENSES_CTX_KEY]) == {
+        '11': {'id': '11', MIRRORED_EVENTS_COUNT_KEY: 1},
+        '12': {'id': '12', MIRRORED_EVENTS_COUNT_KEY: 1}}
+    assert new_integration_context[LAST_FETCH_KEY] == '5'
 
 
 @pytest.mark.parametrize('context_data, retry_compatible', [
@@ -1882,8 +2100,7 @@ def test_integration_context_during_run(test_case_data, mocker):
                                            first_loop_offenses]
         mocker.patch.object(client, 'offenses_list', return_value=first_loop_offenses)
         mocker.patch.object(QRadar_v3, 'enrich_offenses_result', return_value=first_loop_offenses)
-        enrich_mock = mocker.patch.object(QRadar_v3, 'enrich_offense_with_events')
-        enrich_mock.side_effect = first_loop_offenses_with_events
+        mocker.patch.object(QRadar_v3, 'enrich_offenses_with_events', return_value=first_loop_offenses_with_events)
         expected_ctx_first_loop = ctx_test_data['context_data_first_loop_default'].copy()
     else:
         mocker.patch.object(client, 'offenses_list', return_value=[])
@@ -1916,8 +2133,7 @@ def test_integration_context_during_run(test_case_data, mocker):
                                             second_loop_offenses]
         mocker.patch.object(client, 'offenses_list', return_value=second_loop_offenses)
         mocker.patch.object(QRadar_v3, 'enrich_offenses_result', return_value=second_loop_offenses)
-        enrich_mock = mocker.patch.object(QRadar_v3, 'enrich_offense_with_events')
-        enrich_mock.side_effect = second_loop_offenses_with_events
+        mocker.patch.object(QRadar_v3, 'enrich_offenses_with_events', return_value=second_loop_offenses_with_events)
         expected_ctx_second_loop = ctx_test_data['context_data_second_loop_default'].copy()
     else:
         mocker.patch.object(client, 'offenses_list', return_value=[])
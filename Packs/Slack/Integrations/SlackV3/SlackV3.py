@@ -52,6 +52,7 @@ OBJECTS_TO_KEYS = {
     'users': 'id'
 }
 SYNC_CONTEXT = True
+DIRECTORY_REFRESH_SECONDS = 60
 
 ''' GLOBALS '''
 
@@ -74,6 +75,7 @@ MAX_LIMIT_TIME: int
 PAGINATED_COUNT: int
 ENABLE_DM: bool
 PERMITTED_NOTIFICATION_TYPES: List[str]
+DIRECTORY: Optional['SlackDirectory'] = None
 
 
 ''' HELPER FUNCTIONS '''
@@ -118,6 +120,95 @@ def get_current_utc_time() -> datetime:
     return datetime.utcnow()
 
 
+class SlackDirectory:
+    """
+    An in-memory index of the Slack users and conversations, kept by the long-running process.
+    Users are indexed by ID and by their lowercase name, email and real name, and conversations by ID and by their
+    lowercase name, so lookups don't decode and scan the integration context.
+    The index is refreshed from the integration context every DIRECTORY_REFRESH_SECONDS, and on each refresh one more
+    page of the workspace users is indexed by following the users.list cursor.
+    """
+
+    def __init__(self):
+        self.users_by_id: Dict[str, dict] = {}
+        self.users_by_key: Dict[str, dict] = {}
+        self.conversations_by_id: Dict[str, dict] = {}
+        self.conversations_by_name: Dict[str, dict] = {}
+        self.users_cursor = ''
+        self.last_refresh: Optional[datetime] = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_user_keys(user: dict) -> List[str]:
+        keys = [user.get('name', ''), user.get('profile', {}).get('email', ''), user.get('real_name', '')]
+        return [key.lower() for key in keys if key]
+
+    def add_user(self, user: dict):
+        if not isinstance(user, dict) or not user.get('id'):
+            return
+        with self.lock:
+            previous_user = self.users_by_id.get(user['id'])
+            if previous_user:
+                for key in self.get_user_keys(previous_user):
+                    if self.users_by_key.get(key) is previous_user:
+                        del self.users_by_key[key]
+            self.users_by_id[user['id']] = user
+            for key in self.get_user_keys(user):
+                self.users_by_key.setdefault(key, user)
+
+    def add_conversation(self, conversation: dict):
+        if not isinstance(conversation, dict) or not conversation.get('id'):
+            return
+        with self.lock:
+            self.conversations_by_id[conversation['id']] = conversation
+            if conversation.get('name'):
+                self.conversations_by_name.setdefault(conversation['name'].lower(), conversation)
+
+    def get_user(self, user_id: str) -> dict:
+        return self.users_by_id.get(user_id, {})
+
+    def find_user(self, user_to_search: str) -> dict:
+        return self.users_by_key.get(user_to_search.lower(), {})
+
+    def get_conversation(self, conversation_id: str) -> dict:
+        return self.conversations_by_id.get(conversation_id, {})
+
+    def find_conversation(self, conversation_name: str) -> dict:
+        return self.conversations_by_name.get(conversation_name.lower(), {})
+
+    def load_from_context(self, integration_context: dict):
+        """
+        Indexes the users and conversations stored in the integration context.
+        """
+        for user in json.loads(integration_context.get('users') or '[]'):
+            self.add_user(user)
+        for conversation in json.loads(integration_context.get('conversations') or '[]'):
+            self.add_conversation(conversation)
+
+    def index_users_page(self):
+        """
+        Indexes the next page of the workspace users, starting over when the last page was reached.
+        """
+        body = {'limit': PAGINATED_COUNT}
+        if self.users_cursor:
+            body['cursor'] = self.users_cursor
+        response = send_slack_request_sync(CLIENT, 'users.list', http_verb='GET', body=body)
+        for user in response.get('members', []) if response else []:
+            self.add_user(user)
+        self.users_cursor = response.get('response_metadata', {}).get('next_cursor', '') if response else ''
+
+    def refresh(self, force: bool = False):
+        """
+        Refreshes the directory if DIRECTORY_REFRESH_SECONDS passed since the last refresh.
+        """
+        now = get_current_utc_time()
+        if not force and self.last_refresh and (now - self.last_refresh).total_seconds() < DIRECTORY_REFRESH_SECONDS:
+            return
+        self.last_refresh = now
+        self.load_from_context(get_integration_context(SYNC_CONTEXT))
+        self.index_users_page()
+
+
 def get_user_by_name(user_to_search: str, add_to_context: bool = True) -> dict:
     """
     Gets a slack user by a user name
@@ -132,6 +223,11 @@ def get_user_by_name(user_to_search: str, add_to_context: bool = True) -> dict:
 
     user: dict = {}
     users: list = []
+    if DIRECTORY:
+        user = DIRECTORY.find_user(user_to_search)
+        if user:
+            return user
+
     integration_context = get_integration_context(SYNC_CONTEXT)
 
     user_to_search = user_to_search.lower()
@@ -171,6 +267,8 @@ def get_user_by_name(user_to_search: str, add_to_context: bool = True) -> dict:
         else:
             return {}
 
+    if DIRECTORY:
+        DIRECTORY.add_user(user)
     return user
 
 
@@ -346,9 +444,17 @@ async def get_slack_name(slack_id: str, client: AsyncWebClient) -> str:
     if not slack_id:
         return ''
 
-    integration_context = get_integration_context(SYNC_CONTEXT)
     prefix = slack_id[0]
     slack_name = ''
+    if DIRECTORY:
+        if prefix in ['C', 'D', 'G']:
+            slack_name = DIRECTORY.get_conversation(slack_id.split('|')[0]).get('name', '')
+        elif prefix == 'U':
+            slack_name = DIRECTORY.get_user(slack_id).get('name', '')
+        if slack_name:
+            return slack_name
+
+    integration_context = get_integration_context(SYNC_CONTEXT)
 
     if prefix in ['C', 'D', 'G']:
         slack_id = slack_id.split('|')[0]
@@ -360,6 +466,8 @@ async def get_slack_name(slack_id: str, client: AsyncWebClient) -> str:
                 conversation = conversations[0]
         if not conversation:
             conversation = await client.conversations_info(channel=slack_id)  # type: ignore
+        if DIRECTORY:
+            DIRECTORY.add_conversation(conversation)
         slack_name = conversation.get('name', '')
     elif prefix == 'U':
         user: dict = {}
@@ -369,6 +477,8 @@ async def get_slack_name(slack_id: str, client: AsyncWebClient) -> str:
                 user = users[0]
         if not user:
             user = await client.users_info(user=slack_id)  # type: ignore
+        if DIRECTORY:
+            DIRECTORY.add_user(user)
 
         slack_name = user.get('name', '')
 
@@ -596,6 +706,8 @@ async def long_running_loop():
     while True:
         error = ''
         try:
+            if DIRECTORY:
+                DIRECTORY.refresh()
             check_for_mirrors()
             check_for_unanswered_questions()
         except requests.exceptions.ConnectionError as e:
@@ -1162,6 +1274,11 @@ async def get_user_by_id_async(client: AsyncWebClient, user_id: str) -> dict:
     """
     user: dict = {}
     users: list = []
+    if DIRECTORY:
+        user = DIRECTORY.get_user(user_id)
+        if user:
+            return user
+
     integration_context = get_integration_context(SYNC_CONTEXT)
     if integration_context.get('users'):
         users = json.loads(integration_context['users'])
@@ -1177,6 +1294,8 @@ async def get_user_by_id_async(client: AsyncWebClient, user_id: str) -> dict:
             'user', {})
         users.append(user)
         set_to_integration_context_with_retries({'users': users}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+        if DIRECTORY:
+            DIRECTORY.add_user(user)
 
     return user
 
@@ -1256,6 +1375,11 @@ def get_conversation_by_name(conversation_name: str) -> dict:
     Returns:
         The slack conversation
     """
+    if DIRECTORY:
+        conversation = DIRECTORY.find_conversation(conversation_name)
+        if conversation:
+            return conversation
+
     integration_context = get_integration_context(SYNC_CONTEXT)
 
     conversation_to_search = conversation_name.lower()
@@ -1306,6 +1430,8 @@ def get_conversation_by_name(conversation_name: str) -> dict:
         else:
             conversations = [conversation]
         set_to_integration_context_with_retries({'conversations': conversations}, OBJECTS_TO_KEYS, SYNC_CONTEXT)
+        if DIRECTORY:
+            DIRECTORY.add_conversation(conversation)
     return conversation
 
 
@@ -2054,6 +2180,8 @@ def long_running_main():
     """
     Starts the long running thread.
     """
+    global DIRECTORY
+    DIRECTORY = SlackDirectory()
     try:
         asyncio.run(start_listening(), debug=True)
     except Exception as e:
@@ -467,6 +467,105 @@ def test_get_user_by_name(mocker):
     assert slack_sdk.WebClient.api_call.call_count == 3
 
 
+def test_slack_directory_refresh(mocker):
+    """
+    Given:
+        - Users and conversations in the integration context, and a workspace with two pages of users.
+    When:
+        - Refreshing the directory of the long-running process several times.
+    Then:
+        - Users are found by ID, name, email and real name, and conversations by ID and name.
+        - Each refresh indexes the next page of users, and the integration context is read only on refresh.
+    """
+    import SlackV3
+    from SlackV3 import SlackDirectory
+
+    new_user = {'name': 'perikles', 'real_name': 'Perikles', 'profile': {'email': 'perikles@acropoli.com'},
+                'id': 'U012B3CUI'}
+
+    def api_call(method: str, http_verb: str = 'POST', file: str = None, params=None, json=None, data=None):
+        if params.get('cursor'):
+            return {'members': [new_user], 'response_metadata': {'next_cursor': ''}}
+        return {'members': js.loads(USERS), 'response_metadata': {'next_cursor': 'dXNlcjpVMEc5V0ZYTlo='}}
+
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(slack_sdk.WebClient, 'api_call', side_effect=api_call)
+    mocker.patch.object(SlackV3, 'get_current_utc_time', side_effect=[
+        datetime.datetime(2021, 1, 1, 0, 0, 0),
+        datetime.datetime(2021, 1, 1, 0, 0, 30),
+        datetime.datetime(2021, 1, 1, 0, 1, 1),
+    ])
+    directory = SlackDirectory()
+
+    directory.refresh()
+    assert directory.find_user('Spengler')['id'] == 'U012A3CDE'
+    assert directory.find_user('glenda@south.oz.coven')['id'] == 'U07QCRPA4'
+    assert directory.find_user('glinda southgood')['id'] == 'U07QCRPA4'
+    assert directory.get_user('U07QCRPA4')['name'] == 'glinda'
+    assert directory.find_conversation('General')['id'] == 'C012AB3CD'
+    assert directory.get_conversation('C061EG9T2')['name'] == 'random'
+    assert directory.find_user('perikles') == {}
+    assert directory.users_cursor == 'dXNlcjpVMEc5V0ZYTlo='
+
+    directory.refresh()
+    assert slack_sdk.WebClient.api_call.call_count == 1
+    assert demisto.getIntegrationContext.call_count == 1
+
+    directory.refresh()
+    assert slack_sdk.WebClient.api_call.call_count == 2
+    assert directory.find_user('perikles@acropoli.com')['id'] == 'U012B3CUI'
+    assert directory.users_cursor == ''
+
+
+def test_slack_directory_renamed_user():
+    """
+    Given:
+        - A user in the directory.
+    When:
+        - Adding the user again after it was renamed.
+    Then:
+        - The user is found by its new name and not by its old name.
+    """
+    from SlackV3 import SlackDirectory
+
+    directory = SlackDirectory()
+    directory.add_user({'id': 'U1', 'name': 'old', 'profile': {'email': 'user@example.com'}})
+    directory.add_user({'id': 'U1', 'name': 'new', 'profile': {'email': 'user@example.com'}})
+
+    assert directory.find_user('old') == {}
+    assert directory.find_user('new')['id'] == 'U1'
+    assert directory.find_user('user@example.com')['name'] == 'new'
+
+
+@pytest.mark.asyncio
+async def test_lookups_with_directory(mocker):
+    """
+    Given:
+        - The directory of the long-running process, with the integration context users and conversations.
+    When:
+        - Looking up users and conversations by name and ID.
+    Then:
+        - The lookups are served from the directory without reading the integration context.
+    """
+    import SlackV3
+    from SlackV3 import SlackDirectory, get_user_by_name, get_slack_name, get_conversation_by_name
+
+    directory = SlackDirectory()
+    directory.load_from_context(get_integration_context())
+    mocker.patch.object(SlackV3, 'DIRECTORY', directory)
+    mocker.patch.object(demisto, 'getIntegrationContext', side_effect=get_integration_context)
+    mocker.patch.object(slack_sdk.WebClient, 'api_call')
+    socket_client = AsyncMock()
+
+    assert get_user_by_name('spengler@ghostbusters.example.com')['id'] == 'U012A3CDE'
+    assert await get_slack_name('U07QCRPA4', socket_client) == 'glinda'
+    assert await get_slack_name('C061EG9T2', socket_client) == 'random'
+    assert get_conversation_by_name('general')['id'] == 'C012AB3CD'
+    assert demisto.getIntegrationContext.call_count == 0
+    assert slack_sdk.WebClient.api_call.call_count == 0
+    assert socket_client.call_count == 0
+
+
 def test_get_user_by_name_paging(mocker):
     from SlackV3 import get_user_by_name
     # Set
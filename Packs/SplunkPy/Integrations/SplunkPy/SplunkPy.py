@@ -17,6 +17,7 @@ import requests
 import urllib3
 import io
 import re
+import threading
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -64,6 +65,7 @@ NOTABLE = 'notable'
 ENRICHMENTS = 'enrichments'
 MAX_HANDLE_NOTABLES = 20
 MAX_SUBMIT_NOTABLES = 30
+ENRICHMENT_NOTABLE_ID = 'xsoar_enrichment_notable_id'
 CACHE = 'cache'
 STATUS = 'status'
 DATA = 'data'
@@ -667,6 +669,18 @@ def drilldown_enrichment(service, notable_data, num_enrichment_events):
     return job
 
 
+def get_identity_query_part(notable_data):
+    return get_fields_query_part(
+        notable_data=notable_data, prefix="identity", fields=["user", "src_user"], add_backslash=True
+    )
+
+
+def get_asset_query_part(notable_data):
+    return get_fields_query_part(
+        notable_data=notable_data, prefix="asset", fields=["src", "dest", "src_ip", "dst_ip"]
+    )
+
+
 def identity_enrichment(service, notable_data, num_enrichment_events):
     """ Performs an identity enrichment.
 
@@ -680,9 +694,7 @@ def identity_enrichment(service, notable_data, num_enrichment_events):
     """
     job = None
     error_msg = "Failed submitting identity enrichment request to Splunk for notable {}".format(notable_data[EVENT_ID])
-    users = get_fields_query_part(
-        notable_data=notable_data, prefix="identity", fields=["user", "src_user"], add_backslash=True
-    )
+    users = get_identity_query_part(notable_data)
 
     if users:
         kwargs = {"count": num_enrichment_events, "exec_mode": "normal"}
@@ -711,9 +723,7 @@ def asset_enrichment(service, notable_data, num_enrichment_events):
     """
     job = None
     error_msg = "Failed submitting asset enrichment request to Splunk for notable {}".format(notable_data[EVENT_ID])
-    assets = get_fields_query_part(
-        notable_data=notable_data, prefix="asset", fields=["src", "dest", "src_ip", "dst_ip"]
-    )
+    assets = get_asset_query_part(notable_data)
 
     if assets:
         kwargs = {"count": num_enrichment_events, "exec_mode": "normal"}
@@ -730,6 +740,134 @@ def asset_enrichment(service, notable_data, num_enrichment_events):
     return job
 
 
+def build_batch_enrichment_query(enrichment_type, notables_query_parts):
+    """ Builds a single Splunk query that performs an asset/identity lookup for several notables.
+    Every lookup row is tagged with the event ID of the notable it was looked up for, in the
+    ENRICHMENT_NOTABLE_ID field, so the results of the job can be split back between the notables.
+
+    Args:
+        enrichment_type (str): The enrichment type, Asset or Identity.
+        notables_query_parts (list): Pairs of notable event ID and the notable's lookup query part.
+
+    Returns (str): The batched query
+
+    """
+    query = []
+    for event_id, query_part in notables_query_parts:
+        if enrichment_type == ASSET_ENRICHMENT:
+            query.append('| inputlookup append=T asset_lookup_by_str where {0} '
+                         '| inputlookup append=t asset_lookup_by_cidr where {0}'.format(query_part))
+        else:
+            query.append('| inputlookup append=T identity_lookup_expanded where {}'.format(query_part))
+        query.append('| eval {0}=coalesce({0}, "{1}")'.format(ENRICHMENT_NOTABLE_ID, event_id.replace('"', '\\"')))
+    if enrichment_type == ASSET_ENRICHMENT:
+        query.append('| rename _key as asset_id | stats values(*) as * by {}, asset_id'.format(ENRICHMENT_NOTABLE_ID))
+    return ' '.join(query)
+
+
+def batch_enrichment(service, enrichment_type, notables, num_enrichment_events):
+    """ Performs an asset/identity enrichment for several notables with a single Splunk job.
+
+    Args:
+        service (splunklib.client.Service): Splunk service object
+        enrichment_type (str): The enrichment type, Asset or Identity.
+        notables (list): The notables to enrich.
+        num_enrichment_events (int): The maximal number of events to return per enrichment type of a notable.
+
+    Returns (dict): The Splunk Job of each notable ID, None for notables with nothing to look up
+
+    """
+    get_query_part = get_asset_query_part if enrichment_type == ASSET_ENRICHMENT else get_identity_query_part
+    notables_query_parts = []
+    for notable in notables:
+        query_part = get_query_part(notable.data)
+        if query_part:
+            notables_query_parts.append((notable.id, query_part))
+        else:
+            demisto.debug('No {} values were found in notable {}.'.format(enrichment_type.lower(), notable.id))
+
+    job = None
+    if notables_query_parts:
+        kwargs = {"count": num_enrichment_events * len(notables_query_parts), "exec_mode": "normal"}
+        query = build_batch_enrichment_query(enrichment_type, notables_query_parts)
+        demisto.debug("{} query for {} notables: {}".format(enrichment_type, len(notables_query_parts), query))
+        try:
+            job = service.jobs.create(query, **kwargs)
+        except Exception as e:
+            demisto.error("Caught an exception in batch_enrichment function: {}".format(str(e)))
+
+    submitted_ids = set(event_id for event_id, _ in notables_query_parts)
+    return {notable.id: job if notable.id in submitted_ids else None for notable in notables}
+
+
+def submit_batch_enrichments(service, notables, num_enrichment_events):
+    """ Submits one asset job and one identity job covering all the given notables that still need them.
+
+    Returns (dict): For each enabled batched enrichment type, the Splunk Job of each notable ID
+
+    """
+    batched_jobs = {}
+    for enrichment_type, index in ((ASSET_ENRICHMENT, 1), (IDENTITY_ENRICHMENT, 2)):
+        if enrichment_type in ENABLED_ENRICHMENTS:
+            pending_notables = [notable for notable in notables if not notable.get_submitted_enrichments()[index]]
+            if pending_notables:
+                batched_jobs[enrichment_type] = batch_enrichment(service, enrichment_type, pending_notables,
+                                                                 num_enrichment_events)
+    return batched_jobs
+
+
+def poll_enrichment_jobs(service, job_ids, concurrency):
+    """ Checks the status of several enrichment jobs in parallel and retrieves the results of the ready ones.
+
+    Args:
+        service (splunklib.client.Service): Splunk service object
+        job_ids (set): The Splunk job IDs to poll.
+        concurrency (int): The maximal number of jobs to poll at the same time.
+
+    Returns (dict): For each job ID, the list of its results if it is ready, None if it is not ready yet,
+     or the exception that was raised while polling it
+
+    """
+    jobs_results = {}  # type: Dict[str, Any]
+    pending_job_ids = iter(list(job_ids))
+    lock = threading.Lock()
+
+    def poll_jobs():
+        while True:
+            with lock:
+                job_id = next(pending_job_ids, None)
+            if job_id is None:
+                return
+            try:
+                job = client.Job(service=service, sid=job_id)
+                jobs_results[job_id] = list(results.ResultsReader(job.results(count=0))) if job.is_ready() else None
+            except Exception as e:
+                jobs_results[job_id] = e
+
+    threads = [threading.Thread(target=poll_jobs) for _ in range(min(max(concurrency, 1), len(job_ids)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return jobs_results
+
+
+def get_notable_enrichment_data(job_results, notable_id, num_enrichment_events):
+    """ Returns the results of an enrichment job that belong to the given notable.
+    Results of batched jobs are tagged with the notable's event ID, untagged results belong to every notable.
+    """
+    data = []
+    for item in job_results:
+        if isinstance(item, dict) and ENRICHMENT_NOTABLE_ID in item:
+            if item[ENRICHMENT_NOTABLE_ID] != notable_id:
+                continue
+            item = item.copy()
+            del item[ENRICHMENT_NOTABLE_ID]
+        data.append(item)
+    return data[:num_enrichment_events] if num_enrichment_events else data
+
+
 def handle_submitted_notables(service, incidents, cache_object):
     """ Handles submitted notables. For each submitted notable, tries to retrieve its results, if results aren't ready,
      it moves to the next submitted notable.
@@ -742,12 +880,22 @@ def handle_submitted_notables(service, incidents, cache_object):
     """
     handled_notables = []
     enrichment_timeout = arg_to_number(str(demisto.params().get('enrichment_timeout', '5')))
+    num_enrichment_events = arg_to_number(str(demisto.params().get('num_enrichment_events', '20')))
+    concurrency = arg_to_number(str(demisto.params().get('enrichment_concurrency', '5')))
     notables = cache_object.submitted_notables
     total = len(notables)
     demisto.debug("Trying to handle {}/{} open enrichments".format(len(notables[:MAX_HANDLE_NOTABLES]), total))
 
-    for notable in notables[:MAX_HANDLE_NOTABLES]:
-        task_status = handle_submitted_notable(service, notable, enrichment_timeout)
+    notables_to_handle = [(notable, notable.is_enrichment_process_exceeding_timeout(enrichment_timeout))
+                          for notable in notables[:MAX_HANDLE_NOTABLES]]
+    # Notables enriched by the same batched job share its ID, so each job is polled once.
+    job_ids = set(enrichment.id for notable, exceeded_timeout in notables_to_handle if not exceeded_timeout
+                  for enrichment in notable.enrichments if enrichment.status == Enrichment.IN_PROGRESS)
+    jobs_results = poll_enrichment_jobs(service, job_ids, concurrency)
+
+    for notable, exceeded_timeout in notables_to_handle:
+        task_status = handle_submitted_notable(notable, exceeded_timeout, enrichment_timeout, jobs_results,
+                                               num_enrichment_events)
         if task_status:
             incidents.append(notable.to_incident())
             handled_notables.append(notable)
@@ -758,13 +906,15 @@ def handle_submitted_notables(service, incidents, cache_object):
         demisto.debug("Handled {}/{} notables.".format(len(handled_notables), total))
 
 
-def handle_submitted_notable(service, notable, enrichment_timeout):
+def handle_submitted_notable(notable, exceeded_timeout, enrichment_timeout, jobs_results, num_enrichment_events):
     """ Handles submitted notable. If enrichment process timeout has reached, creates an incident.
 
     Args:
-        service (splunklib.client.Service): Splunk service object
         notable (Notable): The notable
+        exceeded_timeout (bool): Whether the notable's enrichment process has exceeded the timeout
         enrichment_timeout (int): The timeout for the enrichment process
+        jobs_results (dict): The polled enrichment jobs, as returned by poll_enrichment_jobs
+        num_enrichment_events (int): The maximal number of events to keep per enrichment type.
 
     Returns:
         notable_status (str): The status of the notable
@@ -772,21 +922,20 @@ def handle_submitted_notable(service, notable, enrichment_timeout):
     """
     task_status = False
 
-    if not notable.is_enrichment_process_exceeding_timeout(enrichment_timeout):
+    if not exceeded_timeout:
         demisto.debug("Trying to handle open enrichment {}".format(notable.id))
         for enrichment in notable.enrichments:
             if enrichment.status == Enrichment.IN_PROGRESS:
-                try:
-                    job = client.Job(service=service, sid=enrichment.id)
-                    if job.is_ready():
-                        demisto.debug('Handling open {} enrichment for notable {}'.format(enrichment.type, notable.id))
-                        for item in results.ResultsReader(job.results()):
-                            enrichment.data.append(item)
-                        enrichment.status = Enrichment.SUCCESSFUL
-                except Exception as e:
+                job_results = jobs_results.get(enrichment.id)
+                if isinstance(job_results, Exception):
                     demisto.error("Caught an exception while retrieving {} enrichment results for notable {}: "
-                                  "{}".format(enrichment.type, notable.id, str(e)))
+                                  "{}".format(enrichment.type, notable.id, str(job_results)))
                     enrichment.status = Enrichment.FAILED
+                elif job_results is not None:
+                    demisto.debug('Handling open {} enrichment for notable {}'.format(enrichment.type, notable.id))
+                    enrichment.data.extend(get_notable_enrichment_data(job_results, notable.id,
+                                                                       num_enrichment_events))
+                    enrichment.status = Enrichment.SUCCESSFUL
 
         if notable.handled():
             task_status = True
@@ -818,8 +967,9 @@ def submit_notables(service, incidents, cache_object):
     if notables:
         demisto.debug('Enriching {}/{} fetched notables'.format(len(notables[:MAX_SUBMIT_NOTABLES]), total))
 
+    batched_jobs = submit_batch_enrichments(service, notables[:MAX_SUBMIT_NOTABLES], num_enrichment_events)
     for notable in notables[:MAX_SUBMIT_NOTABLES]:
-        task_status = submit_notable(service, notable, num_enrichment_events)
+        task_status = submit_notable(service, notable, num_enrichment_events, batched_jobs)
         if task_status:
             cache_object.submitted_notables.append(notable)
             submitted_notables.append(notable)
@@ -839,7 +989,7 @@ def submit_notables(service, incidents, cache_object):
                       'enrichment.'.format(len(failed_notables), [notable.id for notable in failed_notables]))
 
 
-def submit_notable(service, notable, num_enrichment_events):
+def submit_notable(service, notable, num_enrichment_events, batched_jobs=None):
     """ Submits fetched notable to Splunk for an Enrichment. Three enrichments possible: Drilldown, Asset & Identity.
      If all enrichment type executions were unsuccessful, creates a regular incident, Otherwise updates the
      integration context for the next fetch to handle the submitted notable.
@@ -848,6 +998,7 @@ def submit_notable(service, notable, num_enrichment_events):
         service (splunklib.client.Service): Splunk service object
         notable (Notable): The notable.
         num_enrichment_events (int): The maximal number of events to return per enrichment type.
+        batched_jobs (dict): The asset and identity jobs already submitted for the notable by submit_batch_enrichments.
 
     Returns:
         task_status (bool): True if any of the enrichment's succeeded to be submitted to Splunk, False otherwise
@@ -858,11 +1009,18 @@ def submit_notable(service, notable, num_enrichment_events):
     if DRILLDOWN_ENRICHMENT in ENABLED_ENRICHMENTS and not submitted_drilldown:
         job = drilldown_enrichment(service, notable.data, num_enrichment_events)
         notable.enrichments.append(Enrichment.from_job(DRILLDOWN_ENRICHMENT, job))
+    batched_jobs = batched_jobs or {}
     if ASSET_ENRICHMENT in ENABLED_ENRICHMENTS and not submitted_asset:
-        job = asset_enrichment(service, notable.data, num_enrichment_events)
+        if ASSET_ENRICHMENT in batched_jobs:
+            job = batched_jobs[ASSET_ENRICHMENT].get(notable.id)
+        else:
+            job = asset_enrichment(service, notable.data, num_enrichment_events)
         notable.enrichments.append(Enrichment.from_job(ASSET_ENRICHMENT, job))
     if IDENTITY_ENRICHMENT in ENABLED_ENRICHMENTS and not submitted_identity:
-        job = identity_enrichment(service, notable.data, num_enrichment_events)
+        if IDENTITY_ENRICHMENT in batched_jobs:
+            job = batched_jobs[IDENTITY_ENRICHMENT].get(notable.id)
+        else:
+            job = identity_enrichment(service, notable.data, num_enrichment_events)
         notable.enrichments.append(Enrichment.from_job(IDENTITY_ENRICHMENT, job))
 
     return notable.submitted()
@@ -1659,11 +1817,61 @@ def get_current_results_batch(search_job, batch_size, results_offset):
     return results_batch
 
 
-def parse_batch_of_results(current_batch_of_results, max_results_to_add, app):
+def get_json_results_batch(search_job, batch_size, results_offset):
+    results_batch = search_job.results(count=batch_size, offset=results_offset, output_mode='json')
+    return json.loads(results_batch.read())
+
+
+def iter_json_results_items(json_batch_of_results):
+    """Yields the messages and results of a JSON results page in the order the XML results reader yields them."""
+    for message in json_batch_of_results.get('messages') or []:
+        yield results.Message(message.get('type'), message.get('text', ''))
+    for item in json_batch_of_results.get('results') or []:
+        yield item
+
+
+def iter_json_results_pages(search_job, batch_size, num_of_results, max_concurrent_pages):
+    """Fetches the JSON results pages of a finished search job, up to max_concurrent_pages at a time.
+
+    Pages are yielded in offset order, and the next window of pages is only requested once the
+    caller asks for it, so a caller that stops iterating does not fetch the remaining pages.
+    """
+    offsets = list(range(0, num_of_results, batch_size))
+    for window_start in range(0, len(offsets), max_concurrent_pages):
+        window = offsets[window_start:window_start + max_concurrent_pages]
+        pages = [None] * len(window)  # type: List[Any]
+        errors = [None] * len(window)  # type: List[Any]
+
+        def fetch_page(index, offset):
+            try:
+                pages[index] = get_json_results_batch(search_job, batch_size, offset)
+            except Exception as error:
+                errors[index] = error
+
+        threads = [threading.Thread(target=fetch_page, args=(index, offset)) for index, offset in enumerate(window)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for page, error in zip(pages, errors):
+            if error is not None:
+                raise error
+            yield iter_json_results_items(page)
+
+
+def iter_xml_results_pages(search_job, batch_size):
+    results_offset = 0
+    while True:
+        current_batch_of_results = get_current_results_batch(search_job, batch_size, results_offset)
+        yield results.ResultsReader(io.BufferedReader(ResponseReaderWrapper(current_batch_of_results)))
+        results_offset += batch_size
+
+
+def parse_results_items(results_items, max_results_to_add, app):
     parsed_batch_results = []
     batch_dbot_scores = []
-    results_reader = results.ResultsReader(io.BufferedReader(ResponseReaderWrapper(current_batch_of_results)))
-    for item in results_reader:
+    for item in results_items:
         if isinstance(item, results.Message):
             if "Error in" in item.message:
                 raise ValueError(item.message)
@@ -1697,20 +1905,28 @@ def splunk_search_command(service):
         results_limit = float("inf")
     batch_size = int(demisto.args().get("batch_limit", 25000))
 
-    results_offset = 0
+    if demisto.args().get("output_mode", "xml") == "json":
+        max_concurrent_pages = int(demisto.args().get("max_concurrent_pages", 4))
+        # Pages past the event limit can never be added to the results, so they are not requested at all.
+        results_pages = iter_json_results_pages(search_job, batch_size,
+                                                int(min(float(num_of_results_from_query), results_limit)),
+                                                max_concurrent_pages)
+    else:
+        results_pages = iter_xml_results_pages(search_job, batch_size)
+
     total_parsed_results = []  # type: List[Dict[str,Any]]
     dbot_scores = []  # type: List[Dict[str,Any]]
 
     while len(total_parsed_results) < int(num_of_results_from_query) and len(total_parsed_results) < results_limit:
-        current_batch_of_results = get_current_results_batch(search_job, batch_size, results_offset)
+        current_batch_items = next(results_pages, None)
+        if current_batch_items is None:
+            break
         max_results_to_add = results_limit - len(total_parsed_results)
-        parsed_batch_results, batch_dbot_scores = parse_batch_of_results(current_batch_of_results, max_results_to_add,
-                                                                         search_kwargs.get('app', ''))
+        parsed_batch_results, batch_dbot_scores = parse_results_items(current_batch_items, max_results_to_add,
+                                                                      search_kwargs.get('app', ''))
         total_parsed_results.extend(parsed_batch_results)
         dbot_scores.extend(batch_dbot_scores)
 
-        results_offset += batch_size
-
     entry_context = create_entry_context(args, total_parsed_results, dbot_scores)
     human_readable = build_search_human_readable(args, total_parsed_results)
 
@@ -573,6 +573,115 @@ def test_is_enrichment_exceeding_timeout(drilldown_creation_time, asset_creation
     assert notable.is_enrichment_process_exceeding_timeout(enrichment_timeout) is output
 
 
+def test_build_batch_enrichment_query():
+    """
+    Given:
+    - Asset and identity query parts of two notables
+
+    When:
+    - build_batch_enrichment_query is called
+
+    Then:
+    - A single query is built, where each notable's lookup rows are tagged with its event ID
+    """
+    asset_query = splunk.build_batch_enrichment_query(splunk.ASSET_ENRICHMENT, [('n1', 'asset="a"'),
+                                                                                ('n2', 'asset="b"')])
+    assert asset_query == '| inputlookup append=T asset_lookup_by_str where asset="a" ' \
+                          '| inputlookup append=t asset_lookup_by_cidr where asset="a" ' \
+                          '| eval xsoar_enrichment_notable_id=coalesce(xsoar_enrichment_notable_id, "n1") ' \
+                          '| inputlookup append=T asset_lookup_by_str where asset="b" ' \
+                          '| inputlookup append=t asset_lookup_by_cidr where asset="b" ' \
+                          '| eval xsoar_enrichment_notable_id=coalesce(xsoar_enrichment_notable_id, "n2") ' \
+                          '| rename _key as asset_id | stats values(*) as * by xsoar_enrichment_notable_id, asset_id'
+    identity_query = splunk.build_batch_enrichment_query(splunk.IDENTITY_ENRICHMENT, [('n1', 'identity="u"')])
+    assert identity_query == '| inputlookup append=T identity_lookup_expanded where identity="u" ' \
+                             '| eval xsoar_enrichment_notable_id=coalesce(xsoar_enrichment_notable_id, "n1")'
+
+
+def test_submit_notables_batches_asset_and_identity_enrichments(mocker):
+    """
+    Scenario: Asset and identity lookups of several notables are submitted as one Splunk job per enrichment type.
+
+    Given:
+    - Three notables with assets, where only two of them have users
+
+    When:
+    - submit_notables is called
+
+    Then:
+    - Only one asset job and one identity job are created
+    - The notables share the jobs, and the notable without users fails its identity enrichment
+    """
+    mocker.patch.object(splunk, 'ENABLED_ENRICHMENTS', [splunk.ASSET_ENRICHMENT, splunk.IDENTITY_ENRICHMENT])
+    mocker.patch.object(demisto, 'params', return_value={})
+    service = mocker.MagicMock()
+    service.jobs.create.side_effect = [{'sid': 'asset_sid'}, {'sid': 'identity_sid'}]
+    notables = [splunk.Notable({splunk.EVENT_ID: 'n1', 'src': '1.1.1.1', 'user': 'u1'}),
+                splunk.Notable({splunk.EVENT_ID: 'n2', 'dest': '2.2.2.2', 'user': 'u2'}),
+                splunk.Notable({splunk.EVENT_ID: 'n3', 'src': '3.3.3.3'})]
+    cache_object = splunk.Cache(not_yet_submitted_notables=notables)
+    incidents = []
+
+    splunk.submit_notables(service, incidents, cache_object)
+
+    assert service.jobs.create.call_count == 2
+    assert not incidents
+    assert cache_object.submitted_notables == notables
+    assert [[(e.type, e.id, e.status) for e in notable.enrichments] for notable in notables] == [
+        [(splunk.ASSET_ENRICHMENT, 'asset_sid', splunk.Enrichment.IN_PROGRESS),
+         (splunk.IDENTITY_ENRICHMENT, 'identity_sid', splunk.Enrichment.IN_PROGRESS)],
+        [(splunk.ASSET_ENRICHMENT, 'asset_sid', splunk.Enrichment.IN_PROGRESS),
+         (splunk.IDENTITY_ENRICHMENT, 'identity_sid', splunk.Enrichment.IN_PROGRESS)],
+        [(splunk.ASSET_ENRICHMENT, 'asset_sid', splunk.Enrichment.IN_PROGRESS),
+         (splunk.IDENTITY_ENRICHMENT, None, splunk.Enrichment.FAILED)],
+    ]
+
+
+def test_handle_submitted_notables_polls_each_job_once(mocker):
+    """
+    Scenario: Notables that share a batched enrichment job are handled from a single poll of the job.
+
+    Given:
+    - Two submitted notables sharing a ready asset job, whose results are tagged with the notables' event IDs
+    - A drilldown job of the first notable that is not ready yet
+
+    When:
+    - handle_submitted_notables is called
+
+    Then:
+    - Each job is polled once
+    - Each notable gets only its own asset results, without the tag field
+    - Only the second notable, whose enrichments are all handled, becomes an incident
+    """
+    mocker.patch.object(splunk, 'ENABLED_ENRICHMENTS', [splunk.DRILLDOWN_ENRICHMENT, splunk.ASSET_ENRICHMENT])
+    mocker.patch.object(demisto, 'params', return_value={'enrichment_concurrency': '2'})
+    jobs = {'asset_sid': mocker.MagicMock(), 'drilldown_sid': mocker.MagicMock()}
+    jobs['asset_sid'].is_ready.return_value = True
+    jobs['asset_sid'].results.return_value = [
+        {splunk.ENRICHMENT_NOTABLE_ID: 'n1', 'asset': 'a1'},
+        {splunk.ENRICHMENT_NOTABLE_ID: 'n2', 'asset': 'a2'},
+    ]
+    jobs['drilldown_sid'].is_ready.return_value = False
+    job_mock = mocker.patch('SplunkPy.client.Job', side_effect=lambda service, sid: jobs[sid])
+    mocker.patch('SplunkPy.results.ResultsReader', side_effect=lambda job_results: job_results)
+    notable_1 = splunk.Notable({splunk.EVENT_ID: 'n1'}, enrichments=[
+        splunk.Enrichment(splunk.DRILLDOWN_ENRICHMENT, enrichment_id='drilldown_sid'),
+        splunk.Enrichment(splunk.ASSET_ENRICHMENT, enrichment_id='asset_sid')])
+    notable_2 = splunk.Notable({splunk.EVENT_ID: 'n2'}, enrichments=[
+        splunk.Enrichment(splunk.DRILLDOWN_ENRICHMENT, status=splunk.Enrichment.FAILED),
+        splunk.Enrichment(splunk.ASSET_ENRICHMENT, enrichment_id='asset_sid')])
+    cache_object = splunk.Cache(submitted_notables=[notable_1, notable_2])
+    incidents = []
+
+    splunk.handle_submitted_notables(mocker.MagicMock(), incidents, cache_object)
+
+    assert sorted(call[1]['sid'] for call in job_mock.call_args_list) == ['asset_sid', 'drilldown_sid']
+    assert notable_1.enrichments[1].data == [{'asset': 'a1'}]
+    assert notable_2.enrichments[1].data == [{'asset': 'a2'}]
+    assert len(incidents) == 1
+    assert cache_object.submitted_notables == [notable_1]
+
+
 INCIDENT_1 = {'name': 'incident1', 'rawJSON': json.dumps({})}
 INCIDENT_2 = {'name': 'incident2', 'rawJSON': json.dumps({})}
 
@@ -1075,6 +1184,88 @@ def test_build_search_human_readable(mocker):
     assert headers == expected_headers
 
 
+SEARCH_RESULTS = [{'host': 'host{}'.format(i), '_raw': 'event {}'.format(i)} for i in range(7)]
+
+
+class SearchJobMock:
+    def __init__(self, search_results, messages=()):
+        self.search_results = search_results
+        self.messages = list(messages)
+        self.requested_offsets = []
+
+    def __getitem__(self, item):
+        return str(len(self.search_results)) if item == 'resultCount' else None
+
+    def results(self, count, offset, output_mode='xml'):
+        import io
+        self.requested_offsets.append(offset)
+        page = self.search_results[offset:offset + count]
+        if output_mode == 'json':
+            return io.BytesIO(json.dumps({
+                'messages': [{'type': msg_type, 'text': text} for msg_type, text in self.messages],
+                'results': page
+            }).encode('utf-8'))
+        xml_messages = ''.join('<msg type="{}">{}</msg>'.format(msg_type, text) for msg_type, text in self.messages)
+        xml_results = ''.join(
+            '<result offset="{}">{}</result>'.format(
+                offset + i,
+                ''.join('<field k="{}"><value><text>{}</text></value></field>'.format(k, v) for k, v in item.items()))
+            for i, item in enumerate(page))
+        return io.BytesIO('<?xml version="1.0" encoding="UTF-8"?><results preview="0">'
+                          '<messages>{}</messages>{}</results>'.format(xml_messages, xml_results).encode('utf-8'))
+
+
+@pytest.mark.parametrize('event_limit, expected_count', [('0', 7), ('5', 5), ('100', 7)])
+def test_splunk_search_json_output_mode(mocker, event_limit, expected_count):
+    """
+    Given:
+        A search job with 7 results and a batch_limit of 2
+
+    When:
+        running splunk-search with output_mode=json and with the default xml output mode
+
+    Then:
+        Both modes return the same results in the same order, limited to event_limit,
+        and the json mode only requests the pages needed to reach event_limit
+    """
+    service = mocker.MagicMock()
+    outputs = {}
+    for output_mode in ('xml', 'json'):
+        search_job = SearchJobMock(SEARCH_RESULTS)
+        service.jobs.create.return_value = search_job
+        mocker.patch.object(demisto, 'args', return_value={
+            'query': 'index=main', 'event_limit': event_limit, 'batch_limit': '2',
+            'output_mode': output_mode, 'max_concurrent_pages': '2'
+        })
+        results_mock = mocker.patch.object(demisto, 'results')
+        splunk.splunk_search_command(service)
+        outputs[output_mode] = results_mock.call_args[0][0]
+        if output_mode == 'json':
+            assert sorted(search_job.requested_offsets) == list(range(0, expected_count, 2))
+
+    assert len(outputs['json']['Contents']) == expected_count
+    assert outputs['json']['Contents'] == [dict(item) for item in outputs['xml']['Contents']]
+    assert outputs['json']['EntryContext'] == outputs['xml']['EntryContext']
+
+
+def test_splunk_search_json_output_mode_error_message(mocker):
+    """
+    Given:
+        A search job whose JSON results contain an "Error in" message
+
+    When:
+        running splunk-search with output_mode=json
+
+    Then:
+        A ValueError is raised, as with the xml output mode
+    """
+    service = mocker.MagicMock()
+    service.jobs.create.return_value = SearchJobMock(SEARCH_RESULTS, messages=[('FATAL', 'Error in search')])
+    mocker.patch.object(demisto, 'args', return_value={'query': 'index=main', 'output_mode': 'json'})
+    with pytest.raises(ValueError, match='Error in search'):
+        splunk.splunk_search_command(service)
+
+
 @pytest.mark.parametrize(
     argnames='credentials',
     argvalues=[{'username': 'test', 'password': 'test'}, {'splunkToken': 'token', 'password': 'test'}]
@@ -3,9 +3,11 @@ from CommonServerPython import *
 from flask import Flask, request, make_response, Response, stream_with_context
 from gevent.pywsgi import WSGIServer
 from urllib.parse import urlparse, ParseResult
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, mkdtemp
+from shutil import rmtree
+from collections import OrderedDict
 from base64 import b64decode
-from typing import Callable, List, Generator
+from typing import Callable, List, Generator, Tuple, Union
 from ssl import SSLContext, SSLError, PROTOCOL_TLSv1_2
 from multiprocessing import Process
 from werkzeug.datastructures import Headers
@@ -18,6 +20,7 @@ from libtaxii.messages_11 import (
     CollectionInformation,
     CollectionInformationResponse,
     PollRequest,
+    PollFulfillmentRequest,
     PollingServiceInstance,
     ServiceInstance,
     ContentBlock,
@@ -27,6 +30,7 @@ from libtaxii.constants import (
     MSG_COLLECTION_INFORMATION_REQUEST,
     MSG_DISCOVERY_REQUEST,
     MSG_POLL_REQUEST,
+    MSG_POLL_FULFILLMENT_REQUEST,
     SVC_DISCOVERY,
     SVC_COLLECTION_MANAGEMENT,
     SVC_POLL,
@@ -35,7 +39,9 @@ from libtaxii.constants import (
 from cybox.core import Observable
 from requests.utils import requote_uri
 
+import base64
 import functools
+import hashlib
 import stix.core
 import stix.indicator
 import stix.extensions.marking.ais
@@ -56,6 +62,8 @@ import pytz
 ''' GLOBAL VARIABLES '''
 INTEGRATION_NAME: str = 'TAXII Server'
 PAGE_SIZE = 200
+STIX_CACHE_SIZE = 10000
+STIX_CACHE_DISK_SIZE = 100000
 APP: Flask = Flask('demisto-taxii')
 NAMESPACE_URI = 'https://www.paloaltonetworks.com/cortex'
 NAMESPACE = 'cortex'
@@ -76,12 +84,116 @@ class Handler:
         demisto.info(message)
 
 
+''' STIX CACHE '''
+
+
+class STIXCache:
+    def __init__(self, max_size: int, disk_path: Optional[str] = None, max_disk_size: int = STIX_CACHE_DISK_SIZE):
+        """
+        LRU cache of indicators serialized to TAXII content blocks, so unchanged indicators are not serialized
+        again on every poll. An entry is kept by the indicator ID along with the indicator modification time,
+        so a modified indicator misses the cache and its entry is replaced.
+        Args:
+            max_size: The maximum number of content blocks to keep in memory.
+            disk_path: The directory to keep content blocks evicted from memory in. No disk tier if not set.
+            max_disk_size: The maximum number of content blocks to keep on disk, the least recently used are removed.
+        """
+        self.max_size = max_size
+        self.disk_path = disk_path
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+        self._disk_entries: OrderedDict = OrderedDict()
+
+    def get(self, indicator_id: str, modified: str) -> Optional[str]:
+        """
+        Get the cached content block of an indicator.
+        Args:
+            indicator_id: The indicator ID.
+            modified: The indicator modification time.
+
+        Returns:
+            The content block XML string, or None if the indicator version is not cached.
+        """
+        entry = self._entries.get(indicator_id)
+        if entry is not None:
+            self._entries.move_to_end(indicator_id)
+        elif self.disk_path:
+            entry = self._read_from_disk(indicator_id)
+            if entry is not None:
+                self._add_entry(indicator_id, entry)
+
+        if entry is None or entry[0] != modified:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[1]
+
+    def set(self, indicator_id: str, modified: str, content_xml: str):
+        """
+        Cache the content block of an indicator.
+        Args:
+            indicator_id: The indicator ID.
+            modified: The indicator modification time.
+            content_xml: The content block XML string.
+        """
+        self._entries.pop(indicator_id, None)
+        self._add_entry(indicator_id, (modified, content_xml, False))
+
+    def _add_entry(self, indicator_id: str, entry: Tuple[str, str, bool]):
+        """
+        Add an entry to the memory tier. The entry is (modification time, content block, whether it is on disk),
+        so entries read from the disk tier are not written again when they are evicted.
+        """
+        self._entries[indicator_id] = entry
+        while len(self._entries) > self.max_size:
+            evicted_id, evicted_entry = self._entries.popitem(last=False)
+            if self.disk_path and not evicted_entry[2]:
+                self._write_to_disk(evicted_id, evicted_entry)
+
+    def _get_disk_entry_path(self, indicator_id: str) -> str:
+        return os.path.join(str(self.disk_path), hashlib.sha256(indicator_id.encode('utf-8')).hexdigest())
+
+    def _read_from_disk(self, indicator_id: str) -> Optional[Tuple[str, str, bool]]:
+        if indicator_id not in self._disk_entries:
+            return None
+        try:
+            with open(self._get_disk_entry_path(indicator_id), 'r', encoding='utf-8') as entry_file:
+                modified, content_xml = entry_file.read().split('\n', 1)
+        except (OSError, ValueError):
+            self._disk_entries.pop(indicator_id, None)
+            return None
+        self._disk_entries.move_to_end(indicator_id)
+        return modified, content_xml, True
+
+    def _write_to_disk(self, indicator_id: str, entry: Tuple[str, str, bool]):
+        entry_path = self._get_disk_entry_path(indicator_id)
+        try:
+            with open(f'{entry_path}.tmp', 'w', encoding='utf-8') as entry_file:
+                entry_file.write(f'{entry[0]}\n{entry[1]}')
+            os.replace(f'{entry_path}.tmp', entry_path)
+        except OSError as e:
+            demisto.debug(f'Failed writing the STIX cache entry of indicator {indicator_id} to disk: {e}')
+            return
+        self._disk_entries[indicator_id] = None
+        self._disk_entries.move_to_end(indicator_id)
+        while len(self._disk_entries) > self.max_disk_size:
+            evicted_id, _ = self._disk_entries.popitem(last=False)
+            try:
+                os.remove(self._get_disk_entry_path(evicted_id))
+            except OSError as e:
+                demisto.debug(f'Failed removing the STIX cache entry of indicator {evicted_id} from disk: {e}')
+
+
 ''' TAXII Server '''
 
 
 class TAXIIServer:
     def __init__(self, url_scheme: str, host: str, port: int, collections: dict, certificate: str, private_key: str,
-                 http_server: bool, credentials: dict, service_address: Optional[str] = None):
+                 http_server: bool, credentials: dict, service_address: Optional[str] = None,
+                 result_part_size: int = 0, stix_cache: Optional[STIXCache] = None):
         """
         Class for a TAXII Server configuration.
         Args:
@@ -93,6 +205,9 @@ class TAXIIServer:
             private_key: The private key for SSL.
             http_server: Whether to use HTTP server (not SSL).
             credentials: The user credentials.
+            service_address: The TAXII service URL address.
+            result_part_size: The maximum number of indicators in a poll response part (0 for no limit).
+            stix_cache: The cache of indicators serialized to STIX, if enabled.
         """
         self.url_scheme = url_scheme
         self.host = host
@@ -102,6 +217,9 @@ class TAXIIServer:
         self.private_key = private_key
         self.http_server = http_server
         self.service_address = service_address
+        # parts are searched page by page, so the part size is rounded up to a whole number of pages
+        self.result_part_size = -(-result_part_size // PAGE_SIZE) * PAGE_SIZE if result_part_size > 0 else 0
+        self.stix_cache = stix_cache
         self.auth = None
         if credentials:
             self.auth = (credentials.get('identifier', ''), credentials.get('password', ''))
@@ -197,28 +315,38 @@ class TAXIIServer:
 
         return collection_info_response
 
-    def get_poll_response(self, taxii_message: PollRequest) -> Response:
+    def get_poll_response(self, taxii_message: Union[PollRequest, PollFulfillmentRequest]) -> Response:
         """
-        Handle poll request.
+        Handle poll request and poll fulfillment request.
         Args:
-            taxii_message: The poll request message.
+            taxii_message: The poll request message, or the poll fulfillment request message of a partial result.
 
         Returns:
             The poll response.
         """
-        if taxii_message.message_type != MSG_POLL_REQUEST:
-            raise ValueError('Invalid message, invalid Message Type')
-
         taxii_feeds = list(self.collections.keys())
         collection_name = taxii_message.collection_name
-        exclusive_begin_time = taxii_message.exclusive_begin_timestamp_label
-        inclusive_end_time = taxii_message.inclusive_end_timestamp_label
+
+        if taxii_message.message_type == MSG_POLL_REQUEST:
+            exclusive_begin_time = taxii_message.exclusive_begin_timestamp_label
+            inclusive_end_time = taxii_message.inclusive_end_timestamp_label
+            result_part_number = 1
+        elif taxii_message.message_type == MSG_POLL_FULFILLMENT_REQUEST:
+            result_collection_name, exclusive_begin_time, inclusive_end_time = decode_result_id(taxii_message.result_id)
+            if result_collection_name != collection_name:
+                raise ValueError('Invalid message, result ID does not match the collection')
+            result_part_number = int(taxii_message.result_part_number)
+            if result_part_number < 1:
+                raise ValueError('Invalid message, invalid result part number')
+        else:
+            raise ValueError('Invalid message, invalid Message Type')
 
         return self.stream_stix_data_feed(taxii_feeds, taxii_message.message_id, collection_name,
-                                          exclusive_begin_time, inclusive_end_time)
+                                          exclusive_begin_time, inclusive_end_time, result_part_number)
 
     def stream_stix_data_feed(self, taxii_feeds: list, message_id: str, collection_name: str,
-                              exclusive_begin_time: datetime, inclusive_end_time: datetime) -> Response:
+                              exclusive_begin_time: Optional[datetime], inclusive_end_time: Optional[datetime],
+                              result_part_number: int = 1) -> Response:
         """
         Get the indicator query results in STIX data feed format.
         Args:
@@ -227,6 +355,7 @@ class TAXIIServer:
             collection_name: The collection name to get the indicator query from.
             exclusive_begin_time: The query exclusive begin time.
             inclusive_end_time: The query inclusive end time.
+            result_part_number: The result part to stream, when the results are split to parts.
 
         Returns:
             Stream of STIX indicator data feed.
@@ -237,21 +366,39 @@ class TAXIIServer:
         if not inclusive_end_time:
             inclusive_end_time = datetime.utcnow().replace(tzinfo=pytz.utc)
 
+        result_part_size = self.result_part_size
+        indicator_query = self.collections[str(collection_name)]
+        search_indicators = find_indicators_by_time_frame(
+            indicator_query, exclusive_begin_time, inclusive_end_time,
+            page=(result_part_number - 1) * result_part_size // PAGE_SIZE,
+            limit=result_part_size or None
+        )
+
         def yield_response() -> Generator:
             """
 
-            Streams the STIX indicators as XML string.
+            Streams the STIX indicators as XML string, one indicators page at a time.
 
             """
+            indicator_pages = iter(search_indicators)
+            # the first page is searched before the opening tag, as the total is needed to tell if more parts exist
+            indicators_page = next(indicator_pages, None)
+            total = search_indicators.total or 0
+            more = bool(result_part_size) and total > result_part_number * result_part_size
+
             # yield the opening tag of the Poll Response
             response = '<taxii_11:Poll_Response xmlns:taxii="http://taxii.mitre.org/messages/taxii_xml_binding-1"' \
                        ' xmlns:taxii_11="http://taxii.mitre.org/messages/taxii_xml_binding-1.1" ' \
                        'xmlns:tdq="http://taxii.mitre.org/query/taxii_default_query-1"' \
                        f' message_id="{generate_message_id()}"' \
                        f' in_response_to="{message_id}"' \
-                       f' collection_name="{collection_name}" more="false" result_part_number="1"> ' \
-                       f'<taxii_11:Inclusive_End_Timestamp>{inclusive_end_time.isoformat()}' \
-                       '</taxii_11:Inclusive_End_Timestamp>'
+                       f' collection_name="{collection_name}" more="{str(more).lower()}"'
+            if more or result_part_number > 1:
+                result_id = encode_result_id(collection_name, exclusive_begin_time, inclusive_end_time)
+                response += f' result_id="{result_id}"'
+            response += f' result_part_number="{result_part_number}"> ' \
+                        f'<taxii_11:Inclusive_End_Timestamp>{inclusive_end_time.isoformat()}' \
+                        '</taxii_11:Inclusive_End_Timestamp>'
 
             if exclusive_begin_time is not None:
                 response += (f'<taxii_11:Exclusive_Begin_Timestamp>{exclusive_begin_time.isoformat()}'
@@ -260,20 +407,9 @@ class TAXIIServer:
             yield response
 
             # yield the content blocks
-            indicator_query = self.collections[str(collection_name)]
-
-            for indicator in find_indicators_by_time_frame(indicator_query, exclusive_begin_time, inclusive_end_time):
-                try:
-                    stix_xml_indicator = get_stix_indicator(indicator).to_xml(ns_dict={NAMESPACE_URI: NAMESPACE})
-                    content_block = ContentBlock(
-                        content_binding=CB_STIX_XML_11,
-                        content=stix_xml_indicator
-                    )
-
-                    content_xml = content_block.to_xml().decode('utf-8')
-                    yield f'{content_xml}\n'
-                except Exception as e:
-                    handle_long_running_error(f'Failed parsing indicator to STIX: {e}')
+            while indicators_page is not None:
+                yield get_content_blocks(indicators_page.get('iocs') or [], self.stix_cache)
+                indicators_page = next(indicator_pages, None)
 
             # yield the closing tag
 
@@ -614,6 +750,90 @@ def get_stix_indicator(indicator: dict) -> stix.core.STIXPackage:
 ''' HELPER FUNCTIONS '''
 
 
+def get_content_block(indicator: dict, stix_cache: Optional[STIXCache] = None) -> str:
+    """
+    Convert a Demisto indicator to a TAXII content block, using the serialization cache if given.
+    Args:
+        indicator: The Demisto indicator.
+        stix_cache: The STIX serialization cache.
+
+    Returns:
+        The STIX indicator content block as XML string.
+    """
+    indicator_id = indicator.get('id')
+    modified = indicator.get('modified')
+    is_cacheable = stix_cache is not None and indicator_id and modified
+    if is_cacheable:
+        content_xml = stix_cache.get(indicator_id, modified)  # type: ignore[union-attr]
+        if content_xml is not None:
+            return content_xml
+
+    stix_xml_indicator = get_stix_indicator(indicator).to_xml(ns_dict={NAMESPACE_URI: NAMESPACE})
+    content_block = ContentBlock(
+        content_binding=CB_STIX_XML_11,
+        content=stix_xml_indicator
+    )
+    content_xml = f'{content_block.to_xml().decode("utf-8")}\n'
+
+    if is_cacheable:
+        stix_cache.set(indicator_id, modified, content_xml)  # type: ignore[union-attr]
+
+    return content_xml
+
+
+def get_content_blocks(indicators: list, stix_cache: Optional[STIXCache] = None) -> str:
+    """
+    Convert Demisto indicators to TAXII content blocks.
+    Args:
+        indicators: The Demisto indicators.
+        stix_cache: The STIX serialization cache.
+
+    Returns:
+        The STIX indicators content blocks as XML string.
+    """
+    content_blocks = []
+    for indicator in indicators:
+        try:
+            content_blocks.append(get_content_block(indicator, stix_cache))
+        except Exception as e:
+            handle_long_running_error(f'Failed parsing indicator to STIX: {e}')
+
+    return ''.join(content_blocks)
+
+
+def encode_result_id(collection_name: str, begin_time: Optional[datetime], end_time: datetime) -> str:
+    """
+    Encode the poll query of a partial result to a result ID, so the server keeps no state between result parts.
+    Args:
+        collection_name: The polled collection name.
+        begin_time: The exclusive begin time.
+        end_time: The inclusive end time.
+
+    Returns:
+        The result ID.
+    """
+    result_set = [collection_name, begin_time.isoformat() if begin_time else None, end_time.isoformat()]
+    return base64.urlsafe_b64encode(json.dumps(result_set).encode('utf-8')).decode('utf-8')
+
+
+def decode_result_id(result_id: str) -> Tuple[str, Optional[datetime], datetime]:
+    """
+    Decode a result ID to the poll query of the partial result.
+    Args:
+        result_id: The result ID.
+
+    Returns:
+        The polled collection name, the exclusive begin time and the inclusive end time.
+    """
+    try:
+        collection_name, begin_time, end_time = json.loads(base64.urlsafe_b64decode(result_id.encode('utf-8')))
+        return (collection_name,
+                datetime.fromisoformat(begin_time) if begin_time else None,
+                datetime.fromisoformat(end_time))
+    except Exception:
+        raise ValueError('Invalid message, unknown result ID')
+
+
 def get_calling_context():
     return demisto.callingContext.get('context', {})  # type: ignore[attr-defined]
 
@@ -722,16 +942,19 @@ def get_collections(params: dict = demisto.params()) -> dict:
     return collections
 
 
-def find_indicators_by_time_frame(indicator_query: str, begin_time: datetime, end_time: datetime) -> list:
+def find_indicators_by_time_frame(indicator_query: str, begin_time: Optional[datetime], end_time: Optional[datetime],
+                                  page: int = 0, limit: Optional[int] = None) -> IndicatorsSearcher:
     """
     Find indicators according to a query and begin time/end time.
     Args:
         indicator_query: The indicator query.
         begin_time: The exclusive begin time.
         end_time: The inclusive end time.
+        page: The page to start the search from.
+        limit: The maximum number of indicators to find.
 
     Returns:
-        Indicator query results from Demisto.
+        Indicators searcher which iterates the query results pages from Demisto.
     """
 
     if indicator_query:
@@ -749,29 +972,21 @@ def find_indicators_by_time_frame(indicator_query: str, begin_time: datetime, en
         indicator_query += f'sourcetimestamp:<="{tz_end_time}"'
     demisto.info(f'Querying indicators by: {indicator_query}')
 
-    return find_indicators_loop(indicator_query)
+    return find_indicators_loop(indicator_query, page=page, limit=limit)
 
 
-def find_indicators_loop(indicator_query: str):
+def find_indicators_loop(indicator_query: str, page: int = 0, limit: Optional[int] = None) -> IndicatorsSearcher:
     """
     Find indicators in a loop according to a query.
     Args:
         indicator_query: The indicator query.
+        page: The page to start the search from.
+        limit: The maximum number of indicators to find.
 
     Returns:
-        Indicator query results from Demisto.
+        Indicators searcher which searches a page of the query results from Demisto on every iteration.
     """
-    iocs: List[dict] = []
-    total_fetched = 0
-    last_found_len = PAGE_SIZE
-    search_indicators = IndicatorsSearcher()
-
-    while last_found_len == PAGE_SIZE:
-        fetched_iocs = search_indicators.search_indicators_by_version(query=indicator_query, size=PAGE_SIZE).get('iocs')
-        iocs.extend(fetched_iocs)
-        last_found_len = len(fetched_iocs)
-        total_fetched += last_found_len
-    return iocs
+    return IndicatorsSearcher(page=page, query=indicator_query, size=PAGE_SIZE, limit=limit)
 
 
 def taxii_make_response(taxii_message: TAXIIMessage):
@@ -940,8 +1155,18 @@ def main():
         scheme = 'https'
 
     service_address = params.get('service_address')
-    SERVER = TAXIIServer(scheme, str(host_name), port, collections,
-                         certificate, private_key, http_server, credentials, service_address)
+    result_part_size = arg_to_number(params.get('result_part_size'), arg_name='result_part_size') or 0
+    stix_cache_size = arg_to_number(params.get('stix_cache_size', STIX_CACHE_SIZE), arg_name='stix_cache_size')
+    stix_cache_disk_size = arg_to_number(params.get('stix_cache_disk_size', STIX_CACHE_DISK_SIZE),
+                                         arg_name='stix_cache_disk_size') or STIX_CACHE_DISK_SIZE
+    stix_cache = None
+    stix_cache_path = None
+    if stix_cache_size:
+        stix_cache_path = mkdtemp(prefix='taxii-stix-cache-') if argToBoolean(params.get('stix_cache_on_disk', False)) \
+            else None
+        stix_cache = STIXCache(stix_cache_size, stix_cache_path, stix_cache_disk_size)
+    SERVER = TAXIIServer(scheme, str(host_name), port, collections, certificate, private_key, http_server,
+                         credentials, service_address, result_part_size, stix_cache)
 
     demisto.debug(f'Command being called is {command}')
     commands = {
@@ -957,6 +1182,9 @@ def main():
     except Exception as e:
         err_msg = f'Error in {INTEGRATION_NAME} Integration [{e}]'
         return_error(err_msg)
+    finally:
+        if stix_cache_path:
+            rmtree(stix_cache_path, ignore_errors=True)
 
 
 if __name__ in ['__main__', '__builtin__', 'builtins']:
@@ -372,7 +372,7 @@ def test_find_indicators_by_time_frame(mocker):
     import pytz
     from TAXIIServer import find_indicators_by_time_frame
 
-    def find_indicators(indicator_query):
+    def find_indicators(indicator_query, page, limit):
         if indicator_query == INDICATOR_QUERY:
             return 'yep'
         return 'nope'
@@ -395,16 +395,67 @@ def test_find_indicators_loop(mocker):
     from TAXIIServer import find_indicators_loop
 
     # Set
-    mocker.patch.object(demisto, 'searchIndicators', return_value=json.loads(IP_INDICATORS))
+    mocker.patch.object(demisto, 'searchIndicators', side_effect=[json.loads(IP_INDICATORS), {'iocs': [], 'total': 1}])
 
     # Arrange
-    indicators = find_indicators_loop('q')
+    indicators = [ioc for page in find_indicators_loop('q') for ioc in page['iocs']]
 
     # Assert
     assert len(indicators) == 1
     assert indicators[0]['value'] == '52.218.100.20'
 
 
+def test_stream_stix_data_feed__result_parts(mocker):
+    """
+    Given:
+        - A collection of 450 indicators and a result part size of 300 (rounded up to 400)
+
+    When:
+        - Polling the collection and then fulfilling the second result part by the returned result ID
+
+    Then:
+        - Ensure the indicators are searched page by page from the page of each part
+        - Ensure the first part has more results and a result ID, and the second part is the last one
+    """
+    import re
+    import TAXIIServer
+    from libtaxii.messages_11 import PollFulfillmentRequest
+
+    indicator = json.loads(IP_INDICATORS)['iocs'][0]
+
+    def search_indicators(page=0, size=100, **kwargs):
+        start = page * size
+        return {'iocs': [indicator] * max(min(size, 450 - start), 0), 'total': 450}
+
+    search_mock = mocker.patch.object(demisto, 'searchIndicators', side_effect=search_indicators)
+    mocker.patch.object(demisto, 'demistoVersion', return_value={'version': '6.0.0'})
+    mocker.patch.object(demisto, 'info')
+    mocker.patch('TAXIIServer.get_content_blocks', side_effect=lambda iocs, stix_cache: f'{len(iocs)},')
+    taxii_server = TAXIIServer.TAXIIServer(
+        url_scheme='http', host='host', port=9000, collections={'Feed': 'type:IP'},
+        certificate='', private_key='', http_server=False, credentials={}, result_part_size=300
+    )
+
+    with TAXIIServer.APP.test_request_context():
+        first_part = ''.join(taxii_server.stream_stix_data_feed(['Feed'], '1', 'Feed', None, None).response)
+
+    assert search_mock.call_count == 2
+    assert 'more="true"' in first_part
+    assert 'result_part_number="1"' in first_part
+    assert '>200,200,</taxii_11:Poll_Response>' in first_part
+
+    search_mock.reset_mock()
+    result_id = re.search('result_id="([^"]+)"', first_part).group(1)
+    fulfillment_request = PollFulfillmentRequest('2', collection_name='Feed', result_id=result_id, result_part_number=2)
+    with TAXIIServer.APP.test_request_context():
+        second_part = ''.join(taxii_server.get_poll_response(fulfillment_request).response)
+
+    assert search_mock.call_args_list[0][1]['page'] == 2
+    assert 'more="false"' in second_part
+    assert f'result_id="{result_id}" result_part_number="2"' in second_part
+    assert '>50,</taxii_11:Poll_Response>' in second_part
+
+
 @pytest.mark.parametrize('indicator',
                          [json.loads(IP_INDICATORS)['iocs'][0], json.loads(URL_INDICATORS)['iocs'][0],
                           json.loads(EMAIL_INDICATORS)['iocs'][0], json.loads(CIDR_INDICATORS)['iocs'][0],
@@ -451,3 +502,66 @@ def test_get_url(mocker, request_headers, url_scheme, expected):
     if request_headers:
         mocker.patch('TAXIIServer.get_calling_context', return_value={'IntegrationInstance': 'eyy'})
     assert taxii_server.get_url(request_headers) == expected
+
+
+def test_stix_cache(mocker, tmp_path):
+    """
+    Given:
+        - A STIX cache of a single entry in memory with a disk tier
+
+    When:
+        - Converting indicators to content blocks, then again after one of them was modified
+
+    Then:
+        - Ensure unchanged indicators are served from the memory or the disk tier without serializing them again
+        - Ensure a modified indicator is serialized again
+    """
+    import TAXIIServer
+    from TAXIIServer import STIXCache, get_content_blocks
+
+    ip_indicator = json.loads(IP_INDICATORS)['iocs'][0]
+    domain_indicator = json.loads(DOMAIN_INDICATORS)['iocs'][0]
+    stix_cache = STIXCache(max_size=1, disk_path=str(tmp_path))
+    get_stix_indicator = mocker.spy(TAXIIServer, 'get_stix_indicator')
+
+    content_blocks = get_content_blocks([ip_indicator, domain_indicator], stix_cache)
+    assert get_stix_indicator.call_count == 2
+    assert len(list(tmp_path.iterdir())) == 1
+
+    assert get_content_blocks([ip_indicator, domain_indicator], stix_cache) == content_blocks
+    assert get_stix_indicator.call_count == 2
+    assert stix_cache.hits == 2
+
+    modified_ip_indicator = dict(ip_indicator, modified='2020-02-20T17:45:07.468975+02:00')
+    get_content_blocks([modified_ip_indicator], stix_cache)
+    assert get_stix_indicator.call_count == 3
+
+
+def test_stix_cache_disk_size(mocker, tmp_path):
+    """
+    Given:
+        - A STIX cache of a single entry in memory with a disk tier of a single entry
+
+    When:
+        - Converting three indicators to content blocks, then the first one again
+
+    Then:
+        - Ensure only the most recently evicted entry is kept on disk
+        - Ensure the entry removed from disk is serialized again
+    """
+    import TAXIIServer
+    from TAXIIServer import STIXCache, get_content_blocks
+
+    ip_indicator = json.loads(IP_INDICATORS)['iocs'][0]
+    domain_indicator = json.loads(DOMAIN_INDICATORS)['iocs'][0]
+    indicators = [ip_indicator, domain_indicator, dict(ip_indicator, id='1', value='1.1.1.1')]
+    stix_cache = STIXCache(max_size=1, disk_path=str(tmp_path), max_disk_size=1)
+    get_stix_indicator = mocker.spy(TAXIIServer, 'get_stix_indicator')
+
+    get_content_blocks(indicators, stix_cache)
+    assert get_stix_indicator.call_count == 3
+    assert len(list(tmp_path.iterdir())) == 1
+
+    get_content_blocks(indicators[:1], stix_cache)
+    assert get_stix_indicator.call_count == 4
+    assert len(list(tmp_path.iterdir())) == 1